@@ -0,0 +1,132 @@
+import os
+import time
+from aiohttp import web
+from discord.ext import commands
+from Utils.metrics import REGISTRY
+
+COMMANDS = REGISTRY.counter('discordbot_commands', 'Slash commands run, after checks and cooldowns', ('command',))
+COMMAND_ERRORS = REGISTRY.counter(
+    'discordbot_command_errors', 'Slash commands that ended in an error, cooldowns included', ('command', 'error')
+)
+COMMAND_SECONDS = REGISTRY.histogram('discordbot_command_seconds', 'Time to run a slash command', ('command',))
+
+
+class Metrics(commands.Cog):
+    """Serves every REGISTRY metric on http://METRICS_HOST:METRICS_PORT/metrics for Prometheus to scrape"""
+
+    REQUIRED_INTENTS = ('guilds',)
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.host = os.getenv('METRICS_HOST', '127.0.0.1')
+        # Every cluster process gets its own port, counting up from METRICS_PORT. 0 turns the endpoint off
+        port = int(os.getenv('METRICS_PORT', 9108))
+        self.port = port + (getattr(bot, 'cluster_id', None) or 0) if port else 0
+        self.runner = None
+        self._children = {}  # command name -> (COMMANDS child, COMMAND_SECONDS child)
+        self._error_children = {}  # (command name, error type) -> COMMAND_ERRORS child
+
+        # Called inline around every command, unlike the listeners which run as separate tasks.
+        # The hooks they replace are put back on unload
+        self._previous_hooks = (bot._before_invoke, bot._after_invoke)
+        bot.before_invoke(self._before_command)
+        bot.after_invoke(self._after_command)
+
+        REGISTRY.gauge_callback('discordbot_guilds', 'Guilds this process serves', lambda: len(bot.guilds))
+        REGISTRY.gauge_callback(
+            'discordbot_gateway_latency_seconds', 'Heartbeat latency of each gateway shard',
+            self._shard_latencies, ('shard',)
+        )
+        REGISTRY.gauge_callback('discordbot_voice_clients', 'Connected voice clients', lambda: len(bot.voice_clients))
+        REGISTRY.gauge_callback(
+            'discordbot_music_queue_length', 'Songs waiting in music queues, summed and in the longest one',
+            self._queue_lengths, ('stat',)
+        )
+        REGISTRY.counter_callback(
+            'discordbot_cache_lookups', 'Lookups in the bot\'s in-memory caches', self._cache_lookups, ('cache', 'result')
+        )
+
+    async def _before_command(self, ctx):
+        ctx.metrics_started = time.perf_counter()
+
+    async def _after_command(self, ctx):
+        name = ctx.command.qualified_name
+        children = self._children.get(name)
+        if children is None:
+            children = self._children[name] = (COMMANDS.labels(name), COMMAND_SECONDS.labels(name))
+        counter, histogram = children
+        counter.inc()
+        histogram.observe(time.perf_counter() - ctx.metrics_started)
+
+    @commands.Cog.listener()
+    async def on_application_command_error(self, ctx, error):
+        error = getattr(error, 'original', error)
+        key = (ctx.command.qualified_name, type(error).__name__)
+        counter = self._error_children.get(key)
+        if counter is None:
+            counter = self._error_children[key] = COMMAND_ERRORS.labels(*key)
+        counter.inc()
+
+    def _shard_latencies(self):
+        latencies = getattr(self.bot, 'latencies', None) or [(0, self.bot.latency)]
+        return [((shard_id,), latency) for shard_id, latency in latencies]
+
+    def _queue_lengths(self):
+        music = self.bot.get_cog('MusicPlayer')
+        lengths = [len(state.queue) for state in music.states.values()] if music else []
+        return [(('total',), sum(lengths)), (('max',), max(lengths, default=0))]
+
+    def _cache_lookups(self):
+        samples = []
+        music = self.bot.get_cog('MusicPlayer')
+        if music:
+            stats = music.cache.stats()
+            for cache in ('queries', 'songs'):
+                samples += [((f"music_{cache}", result), stats[cache][result]) for result in ('hits', 'misses')]
+            samples += [
+                (('music_stream_urls', 'hits'), stats['stream_hits']),
+                (('music_stream_urls', 'misses'), stats['stream_misses']),
+            ]
+        gemini = self.bot.get_cog('GeminiCog')
+        if gemini:
+            stats = gemini.answers.stats()
+            samples += [(('askbot_answers', result), stats[result]) for result in ('hits', 'misses')]
+        return samples
+
+    async def _serve(self, request):
+        return web.Response(
+            body=REGISTRY.render().encode(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
+
+    async def warmup(self):
+        """Starts the /metrics endpoint"""
+        if not self.port or self.runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get('/metrics', self._serve)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        try:
+            await web.TCPSite(self.runner, self.host, self.port).start()
+        except OSError as e:
+            print(f"Metrics endpoint not started on {self.host}:{self.port}: {e}")
+            await self.runner.cleanup()
+            self.runner = None
+
+    def cog_unload(self):
+        # Only our own hooks, one set after this cog loaded stays in place
+        previous_before, previous_after = self._previous_hooks
+        if self.bot._before_invoke == self._before_command:
+            self.bot._before_invoke = previous_before
+        if self.bot._after_invoke == self._after_command:
+            self.bot._after_invoke = previous_after
+        for name in ('discordbot_guilds', 'discordbot_gateway_latency_seconds', 'discordbot_voice_clients',
+                     'discordbot_music_queue_length', 'discordbot_cache_lookups'):
+            REGISTRY.unregister(name)
+        if self.runner is not None:
+            self.bot.loop.create_task(self.runner.cleanup())
+            self.runner = None
+
+
+def setup(bot):
+    bot.add_cog(Metrics(bot))
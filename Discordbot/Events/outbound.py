@@ -0,0 +1,41 @@
+import discord
+from discord.ext import commands
+from discord.commands import slash_command
+from Utils.outbound import get_scheduler
+
+
+class Outbound(commands.Cog):
+    REQUIRED_INTENTS = ('guilds',)
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.scheduler = get_scheduler()
+
+    @slash_command(name="outboundstats", description="Shows how bot messages are being batched and rate limited")
+    @commands.is_owner()
+    async def outboundstats(self, ctx):
+        stats = self.scheduler.stats()
+
+        embed = discord.Embed(
+            title="📬 Outbound Messages",
+            color=discord.Color.blue()
+        )
+        embed.add_field(
+            name="Messages",
+            value=(
+                f"Sent: {stats['messages']} | Requests: {stats['requests']} | Merged: {stats['merged']} | "
+                f"Failed: {stats['failed']}"
+            ),
+            inline=False
+        )
+        embed.add_field(
+            name="Rate limits",
+            value=f"Throttled: {stats['throttled']} | Queued: {stats['queued']} | Routes: {stats['routes']}",
+            inline=False
+        )
+
+        await ctx.respond(embed=embed, ephemeral=True)
+
+
+def setup(bot):
+    bot.add_cog(Outbound(bot))
@@ -0,0 +1,74 @@
+import os
+import discord
+from discord.ext import commands
+from discord.commands import slash_command, Option
+from Utils.loop_monitor import LoopMonitor
+
+
+class Watchdog(commands.Cog):
+    REQUIRED_INTENTS = ('guilds',)
+
+    def __init__(self, bot):
+        self.bot = bot
+        # A stall is anything that keeps the loop from running other tasks for LOOP_STALL_THRESHOLD seconds
+        self.monitor = LoopMonitor(
+            interval=float(os.getenv('LOOP_SAMPLE_INTERVAL', 0.1)),
+            threshold=float(os.getenv('LOOP_STALL_THRESHOLD', 0.25))
+        )
+
+    async def warmup(self):
+        """Starts sampling as soon as the gateway connects"""
+        self.monitor.start()
+
+    def cog_unload(self):
+        self.monitor.stop()
+
+    @slash_command(name="loopstats", description="Shows event loop lag and the code that stalled it")
+    @commands.is_owner()
+    async def loopstats(
+        self,
+        ctx,
+        stacks: bool = Option(description="Include the stack of the worst stall", required=False, default=False)
+    ):
+        stats = self.monitor.stats()
+
+        embed = discord.Embed(
+            title="🐢 Event Loop",
+            color=discord.Color.blue()
+        )
+        embed.add_field(
+            name="Lag (last 10 minutes)",
+            value=(
+                f"p50: {stats['p50'] * 1000:.0f}ms | p90: {stats['p90'] * 1000:.0f}ms | "
+                f"p99: {stats['p99'] * 1000:.0f}ms | Max: {stats['max'] * 1000:.0f}ms | Samples: {stats['samples']}"
+            ),
+            inline=False
+        )
+        embed.add_field(
+            name="Stalls",
+            value=f"Over {stats['threshold'] * 1000:.0f}ms: {stats['stalls']} | Stacks captured: {stats['captured']}",
+            inline=False
+        )
+
+        offenders = self.monitor.worst_offenders()
+        if offenders:
+            embed.add_field(
+                name="Worst offenders",
+                value="\n".join(
+                    f"`{o.where}` {o.stalls}x, {o.total * 1000:.0f}ms total, worst {o.worst * 1000:.0f}ms"
+                    + (f" ({o.task})" if o.task else "")
+                    for o in offenders
+                )[:1024],
+                inline=False
+            )
+            if stacks and offenders[0].stack:
+                # Embed fields hold 1024 characters, the innermost frames are at the end
+                embed.add_field(name="Stack", value=f"```{offenders[0].stack[-1000:]}```", inline=False)
+        else:
+            embed.add_field(name="Worst offenders", value="No stalls recorded.", inline=False)
+
+        await ctx.respond(embed=embed, ephemeral=True)
+
+
+def setup(bot):
+    bot.add_cog(Watchdog(bot))
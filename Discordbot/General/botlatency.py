@@ -1,17 +1,36 @@
-import discord
-from discord.ext import commands
-from discord.commands import slash_command
-
-class latencychecker(commands.Cog):
-    def __init__ (self,bot):
-        self.bot = bot
-
-    @slash_command(name="ping", description="Checks the bot's latency")
-    @commands.cooldown(1,5, commands.BucketType.user)
-    async def latency(self, ctx):
-        latency_ms = round(self.bot.latency * 1000)  
-        await ctx.respond(f"Latency is: {latency_ms}ms")
-
-
-def setup(bot):
-    bot.add_cog(latencychecker(bot)) 
+import discord
+from discord.ext import commands
+from discord.commands import slash_command
+
+class latencychecker(commands.Cog):
+    REQUIRED_INTENTS = ('guilds',)
+
+    def __init__ (self,bot):
+        self.bot = bot
+
+    @slash_command(name="ping", description="Checks the bot's latency")
+    @commands.cooldown(1,5, commands.BucketType.user)
+    async def latency(self, ctx):
+        latency_ms = round(self.bot.latency * 1000)  
+        shard_latencies = getattr(self.bot, 'latencies', [])
+        if len(shard_latencies) <= 1:
+            await ctx.respond(f"Latency is: {latency_ms}ms")
+            return
+
+        # bot.latency is the average, per-shard numbers show which gateway connection is slow
+        shard_id = ctx.guild.shard_id if ctx.guild else None
+        shown = shard_latencies
+        if len(shown) > 20:
+            # Too many to list in one message: the slowest ten, plus this server's shard
+            shown = sorted(shard_latencies, key=lambda item: item[1], reverse=True)[:10]
+            shown += [item for item in shard_latencies if item[0] == shard_id and item not in shown]
+        lines = [
+            # A shard that has not heartbeated yet reports inf
+            f"Shard {shard}: {latency * 1000:.0f}ms" + (" (this server)" if shard == shard_id else "")
+            for shard, latency in shown
+        ]
+        await ctx.respond(f"Latency is: {latency_ms}ms average\n" + "\n".join(lines))
+
+
+def setup(bot):
+    bot.add_cog(latencychecker(bot)) 
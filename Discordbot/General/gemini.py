@@ -1,83 +1,261 @@
-import os
-from discord.ext import commands
-from discord.commands import slash_command, Option
-import google.generativeai as genai
-from dotenv import load_dotenv
-
-load_dotenv()
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-
-
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in environment variables")
-
-genai.configure(api_key=GEMINI_API_KEY)
-
-class GeminiCog(commands.Cog):
-    def __init__(self, bot):
-        self.bot = bot
-        self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
-    
-    @slash_command(name="askbot", description="Ask the bot any question")
-    @commands.cooldown(1, 5, commands.BucketType.user)
-    async def askbot(
-        self, 
-        ctx, 
-        question: str = Option(description="Your question for the bot")
-    ):
-       
-        if len(question) > 500:
-            await ctx.respond("Your question is too long. Please keep it under 500 characters.")
-            return
-        
-        await ctx.defer()
-        
-        try:
-            response = self.model.generate_content(question)
-            
-           
-            if hasattr(response, 'prompt_feedback') and response.prompt_feedback.block_reason:
-                await ctx.respond("Your question was blocked due to safety filters.")
-                return
-            
-          
-            if not response or not hasattr(response, 'text'):
-                await ctx.respond("Sorry, I couldn't generate a response.")
-                return
-            
-            response_text = response.text
-            
-        
-            if not response_text.strip():
-                await ctx.respond("The response was empty. Try rephrasing your question.")
-                return
-            
-            
-            chunks = [response_text[i:i + 1900] for i in range(0, len(response_text), 1900)]
-            
-           
-            await ctx.respond(chunks[0])
-            
-          
-            for chunk in chunks[1:]:
-                await ctx.followup.send(chunk)
-                
-        except Exception as e:
-           
-            print(f"Error in askbot command: {type(e).__name__}: {e}")
-            await ctx.respond("An error occurred while processing your request. Please try again later.")
-    
-    @askbot.error
-    async def askbot_error(self, ctx, error):
-        """Handle command-specific errors"""
-        if isinstance(error, commands.CommandOnCooldown):
-            await ctx.respond(
-                f"⏰ Please wait {error.retry_after:.1f} seconds before using this command again.",
-                ephemeral=True
-            )
-        else:
-           
-            raise error
-
-def setup(bot):
-    bot.add_cog(GeminiCog(bot))
+import asyncio
+import os
+import time
+import discord
+from discord.ext import commands
+from discord.commands import slash_command, Option
+from dotenv import load_dotenv
+from Utils.answer_cache import AnswerCache, normalise_question
+from Utils.chat_sessions import ChatSessions
+from Utils.database import get_database
+from Utils.outbound import get_scheduler
+from Utils.streaming_reply import StreamingReply
+
+load_dotenv()
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+
+
+if not GEMINI_API_KEY:
+    raise ValueError("GEMINI_API_KEY not found in environment variables")
+
+
+class GeminiCog(commands.Cog):
+    REQUIRED_INTENTS = ('guilds',)
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.model = None  # created on the first question, see _get_model
+        self._model_lock = asyncio.Lock()
+        self.slots = asyncio.Semaphore(int(os.getenv('GEMINI_MAX_CONCURRENCY', 4)))
+        self.max_pending = int(os.getenv('GEMINI_MAX_PENDING', 20))
+        self.pending = 0
+        # Answers to repeated questions come from users.db instead of another generation
+        self.answers = AnswerCache(
+            db=get_database(),
+            maxsize=int(os.getenv('ASKBOT_CACHE_SIZE', 1024)),
+            ttl=int(os.getenv('ASKBOT_CACHE_TTL', 86400))
+        )
+        self.outbound = get_scheduler()
+        self.inflight = {}  # normalised question -> future resolved with the answer being generated
+        self.chats = ChatSessions(
+            max_sessions=int(os.getenv('ASKBOT_MAX_SESSIONS', 5000)),
+            idle_timeout=int(os.getenv('ASKBOT_SESSION_IDLE', 1800)),
+            max_turns=int(os.getenv('ASKBOT_SESSION_TURNS', 20)),
+            token_budget=int(os.getenv('ASKBOT_SESSION_TOKENS', 8000))
+        )
+    
+    @slash_command(name="askbot", description="Ask the bot any question")
+    @commands.cooldown(1, 5, commands.BucketType.user)
+    async def askbot(
+        self, 
+        ctx, 
+        question: str = Option(description="Your question for the bot"),
+        context: str = Option(
+            description="Remember the conversation in this channel, or just yours",
+            choices=["channel", "me"],
+            required=False,
+            default=None
+        )
+    ):
+       
+        if len(question) > 500:
+            await ctx.respond("Your question is too long. Please keep it under 500 characters.")
+            return
+        
+        # Answers that depend on earlier turns are neither cached nor shared
+        if context:
+            await self._ask_in_conversation(ctx, question, self._session_key(ctx, context))
+            return
+        
+        key = normalise_question(question)
+        cached = self.answers.get(key)
+        if cached:
+            await self._send_answer(ctx, cached)
+            return
+        
+        # Someone is already asking the same question, wait for that answer instead of generating it again
+        leader = self.inflight.get(key)
+        if leader is not None:
+            self.answers.coalesced += 1
+            await ctx.defer()
+            answer = await asyncio.shield(leader)
+            if answer:
+                await self._send_answer(ctx, answer)
+            else:
+                await ctx.respond("Sorry, I couldn't generate a response.")
+            return
+        
+        if await self._busy(ctx):
+            return
+        
+        # Registered before the first await, so the same question asked during the defer waits for this answer
+        future = self.inflight[key] = asyncio.get_running_loop().create_future()
+        answer = None
+        self.pending += 1
+        try:
+            await ctx.defer()
+            async with self.slots:
+                start = time.monotonic()
+                answer = await self._stream_answer(ctx, question)
+                if answer:
+                    self.answers.set(key, answer, time.monotonic() - start)
+                
+        except Exception as e:
+           
+            print(f"Error in askbot command: {type(e).__name__}: {e}")
+            await ctx.respond("An error occurred while processing your request. Please try again later.")
+        finally:
+            self.pending -= 1
+            del self.inflight[key]
+            future.set_result(answer)
+    
+    async def _get_model(self):
+        """google.generativeai takes a while to import, so it is loaded on a thread when the first question comes in"""
+        if self.model is None:
+            async with self._model_lock:
+                if self.model is None:
+                    self.model = await asyncio.to_thread(self._create_model)
+        return self.model
+    
+    @staticmethod
+    def _create_model():
+        import google.generativeai as genai
+        genai.configure(api_key=GEMINI_API_KEY)
+        return genai.GenerativeModel('gemini-2.0-flash-exp')
+    
+    async def _busy(self, ctx):
+        """Bounded gate: a burst of questions waits for a slot, and past max_pending it is turned away"""
+        if self.pending >= self.max_pending:
+            await ctx.respond("⏳ I'm answering too many questions right now. Please try again in a moment.", ephemeral=True)
+            return True
+        return False
+    
+    @staticmethod
+    def _session_key(ctx, context):
+        return ('channel', ctx.channel_id) if context == "channel" else ('user', ctx.author.id)
+    
+    async def _ask_in_conversation(self, ctx, question, key):
+        """Answers through the key's chat session, whose whole history is kept here and resent with every turn"""
+        if await self._busy(ctx):
+            return
+        
+        await ctx.defer()
+        
+        self.pending += 1
+        try:
+            conversation = self.chats.get(key, await self._get_model())
+            # One turn at a time per conversation, otherwise two answers would interleave in the history
+            async with conversation.lock, self.slots:
+                try:
+                    await self._stream_answer(ctx, question, conversation.chat)
+                finally:
+                    # The next prompt is this history, keep it within the turn and token budgets even after an error
+                    self.chats.trim(conversation)
+                
+        except Exception as e:
+            print(f"Error in askbot conversation: {type(e).__name__}: {e}")
+            await ctx.respond("An error occurred while processing your request. Please try again later.")
+        finally:
+            self.pending -= 1
+    
+    async def _send_answer(self, ctx, answer):
+        """Posts a finished answer in 1900 character chunks"""
+        chunks = [answer[i:i + 1900] for i in range(0, len(answer), 1900)]
+        
+        await ctx.respond(chunks[0])
+        
+        for chunk in chunks[1:]:
+            await self.outbound.send(ctx.followup, chunk)
+    
+    async def _stream_answer(self, ctx, question, chat=None):
+        """Edits the answer into the response as Gemini streams it, returns the full answer or None"""
+        if chat is not None:
+            response = await chat.send_message_async(question, stream=True)
+        else:
+            model = await self._get_model()
+            response = await model.generate_content_async(question, stream=True)
+        reply = StreamingReply(ctx, self.outbound)
+        
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (safety stops, finish markers)
+                continue
+            if text:
+                await reply.append(text)
+        
+        if not reply.text.strip():
+            if hasattr(response, 'prompt_feedback') and response.prompt_feedback.block_reason:
+                await ctx.respond("Your question was blocked due to safety filters.")
+            else:
+                await ctx.respond("The response was empty. Try rephrasing your question.")
+            return None
+        
+        await reply.finish()
+        return reply.text
+    
+    @slash_command(name="forgetchat", description="Clears what the bot remembers of an askbot conversation")
+    async def forgetchat(
+        self,
+        ctx,
+        context: str = Option(description="Which conversation to forget", choices=["channel", "me"], default="me")
+    ):
+        if self.chats.forget(self._session_key(ctx, context)):
+            await ctx.respond("🧹 Conversation forgotten.", ephemeral=True)
+        else:
+            await ctx.respond("There is no conversation to forget.", ephemeral=True)
+    
+    @slash_command(name="askbotstats", description="Shows askbot answer cache statistics")
+    @commands.is_owner()
+    async def askbotstats(self, ctx):
+        stats = self.answers.stats()
+        
+        embed = discord.Embed(
+            title="📊 Askbot Stats",
+            color=discord.Color.blue()
+        )
+        embed.add_field(
+            name="Answer cache",
+            value=(
+                f"Entries: {stats['size']}/{stats['maxsize']} | Hits: {stats['hits']} | Misses: {stats['misses']} | "
+                f"Hit rate: {stats['hit_rate']:.0%} | Evicted: {stats['evictions']}"
+            ),
+            inline=False
+        )
+        embed.add_field(
+            name="Savings",
+            value=f"Generation time saved: {stats['saved_seconds']}s | Coalesced: {stats['coalesced']}",
+            inline=False
+        )
+        sessions = self.chats.stats()
+        embed.add_field(
+            name="Conversations",
+            value=(
+                f"Active: {sessions['size']}/{sessions['maxsize']} | Resumed: {sessions['hits']} | "
+                f"Started: {sessions['misses']} | Evicted: {sessions['evictions']} | Turns trimmed: {sessions['trimmed']}"
+            ),
+            inline=False
+        )
+        embed.add_field(name="Generating", value=f"{self.pending}/{self.max_pending}", inline=False)
+        
+        await ctx.respond(embed=embed, ephemeral=True)
+    
+    async def warmup(self):
+        """Loads cached answers from users.db"""
+        await self.answers.load()
+    
+    @askbot.error
+    async def askbot_error(self, ctx, error):
+        """Handle command-specific errors"""
+        if isinstance(error, commands.CommandOnCooldown):
+            await ctx.respond(
+                f"⏰ Please wait {error.retry_after:.1f} seconds before using this command again.",
+                ephemeral=True
+            )
+        else:
+           
+            raise error
+
+def setup(bot):
+    bot.add_cog(GeminiCog(bot))
@@ -0,0 +1,135 @@
+import os
+import random
+import discord
+from discord.ext import commands
+from discord.commands import slash_command, Option
+from Utils.database import get_database
+from Utils.outbound import get_scheduler
+from Utils.xp_store import XPStore, level_for, xp_for
+
+
+class LeaderboardView(discord.ui.View):
+    """Previous/next buttons over a guild's in-memory leaderboard"""
+
+    PAGE_SIZE = 10
+
+    def __init__(self, guild, board):
+        super().__init__(timeout=180)
+        self.guild = guild
+        self.board = board
+        self.page = 0
+
+    def pages(self):
+        return max(1, -(-len(self.board) // self.PAGE_SIZE))
+
+    def embed(self):
+        offset = self.page * self.PAGE_SIZE
+        lines = [
+            f"**#{offset + i + 1}** <@{user_id}> · Level {level_for(xp)} · {xp} XP"
+            for i, (user_id, xp) in enumerate(self.board.top(offset, self.PAGE_SIZE))
+        ]
+        embed = discord.Embed(
+            title=f"🏆 {self.guild.name} Leaderboard",
+            description="\n".join(lines) or "Nobody has earned XP yet.",
+            color=discord.Color.gold()
+        )
+        embed.set_footer(text=f"Page {self.page + 1}/{self.pages()} · {len(self.board)} members ranked")
+        return embed
+
+    async def turn(self, interaction, step):
+        # The board keeps changing underneath, so clamp against its current size
+        self.page = min(max(0, self.page + step), self.pages() - 1)
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="Previous", emoji="◀️", style=discord.ButtonStyle.secondary)
+    async def previous(self, button, interaction):
+        await self.turn(interaction, -1)
+
+    @discord.ui.button(label="Next", emoji="▶️", style=discord.ButtonStyle.secondary)
+    async def next(self, button, interaction):
+        await self.turn(interaction, 1)
+
+
+class LevelsCog(commands.Cog):
+    REQUIRED_INTENTS = ('guilds', 'guild_messages')
+
+    def __init__(self, bot):
+        self.bot = bot
+        # XP lives in users.db, increments are flushed in one batch every XP_FLUSH_INTERVAL seconds
+        self.store = XPStore(get_database(), flush_interval=float(os.getenv('XP_FLUSH_INTERVAL', 5)))
+        # One award per member per minute, so spamming does not farm XP
+        self.xp_cooldown = commands.CooldownMapping.from_cooldown(1, 60, commands.BucketType.member)
+        self.outbound = get_scheduler()
+
+    async def warmup(self):
+        """Creates the levels table and starts the flush task"""
+        await self.store.load()
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        if message.author.bot or message.guild is None:
+            return
+        if self.xp_cooldown.update_rate_limit(message):
+            return
+
+        old, new = await self.store.award(message.guild.id, message.author.id, random.randint(15, 25))
+        level = level_for(new)
+        if level > level_for(old):
+            try:
+                await self.outbound.send(message.channel, f"🎉 {message.author.mention} reached level **{level}**!")
+            except discord.HTTPException as e:
+                print(f"Error sending level up message: {e}")
+
+    @slash_command(name="level", description="Shows your level and XP")
+    @commands.cooldown(1, 5, commands.BucketType.user)
+    async def level(self, ctx):
+        if ctx.guild is None:
+            await ctx.respond("Levels only exist in servers.", ephemeral=True)
+            return
+        board = await self.store.guild(ctx.guild.id)
+        xp = board.get(ctx.author.id)
+        level = level_for(xp)
+        await ctx.respond(
+            f"⭐ {ctx.author.mention} is level **{level}** with **{xp}** XP "
+            f"({xp_for(level + 1) - xp} XP to level {level + 1})"
+        )
+
+    @slash_command(name="rank", description="Shows a member's rank in this server")
+    @commands.cooldown(1, 5, commands.BucketType.user)
+    async def rank(self, ctx, member: discord.Member = Option(description="Member to look up", required=False, default=None)):
+        if ctx.guild is None:
+            await ctx.respond("Levels only exist in servers.", ephemeral=True)
+            return
+        member = member or ctx.author
+        board = await self.store.guild(ctx.guild.id)
+        rank = board.rank(member.id)
+        if rank is None:
+            await ctx.respond(f"{member.mention} has not earned any XP yet.")
+            return
+
+        xp = board.get(member.id)
+        embed = discord.Embed(title=f"📈 {member.display_name}", color=discord.Color.gold())
+        embed.add_field(name="Rank", value=f"#{rank} of {len(board)}", inline=True)
+        embed.add_field(name="Level", value=str(level_for(xp)), inline=True)
+        embed.add_field(name="XP", value=str(xp), inline=True)
+        await ctx.respond(embed=embed)
+
+    @slash_command(name="leaderboard", description="Shows the server's XP leaderboard")
+    @commands.cooldown(1, 5, commands.BucketType.user)
+    async def leaderboard(self, ctx):
+        if ctx.guild is None:
+            await ctx.respond("Levels only exist in servers.", ephemeral=True)
+            return
+        view = LeaderboardView(ctx.guild, await self.store.guild(ctx.guild.id))
+        await ctx.respond(embed=view.embed(), view=view)
+
+    async def shutdown(self):
+        """Writes the XP awarded since the last flush"""
+        await self.store.shutdown()
+
+    def cog_unload(self):
+        self.store.close()
+
+
+def setup(bot):
+    bot.add_cog(LevelsCog(bot))
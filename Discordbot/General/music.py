@@ -1,596 +1,977 @@
-import discord
-import os
-from discord.ext import commands
-from discord.commands import slash_command, Option
-import yt_dlp as youtube_dl
-import asyncio
-from googleapiclient.discovery import build
-from dotenv import load_dotenv
-from collections import deque
-import re
-
-class MusicPlayer(commands.Cog):
-    def __init__(self, bot):
-        self.bot = bot
-        self.players = {}
-        self.queues = {}
-        self.inactivity_tasks = {}
-        self.loop = {}
-        self.current_song = {}
-        
-        load_dotenv()
-        youtube_api_key = os.getenv('YOUTUBE_API_KEY')
-        if not youtube_api_key:
-            raise ValueError("YOUTUBE_API_KEY not found in environment variables")
-        
-        self.youtube = build('youtube', 'v3', developerKey=youtube_api_key)
-        
-        
-        self.YDL_OPTIONS = {
-            'format': 'bestaudio/best',
-            'noplaylist': True,
-            'quiet': True,
-            'no_warnings': True,
-            'ignoreerrors': False,
-            'nocheckcertificate': True,
-            'default_search': 'ytsearch',
-            'extract_flat': False,
-        }
-        
-        self.FFMPEG_OPTIONS = {
-            'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
-            'options': '-vn'
-        }
-
-    @slash_command(name="play", description="Plays music or videos from YouTube")
-    @commands.cooldown(1, 3, commands.BucketType.user)
-    async def play(self, ctx, query: str = Option(description="Song name or YouTube URL")):
-        await ctx.defer()
-        
-        # Check if user is in voice channel
-        if ctx.author.voice is None:
-            await ctx.followup.send("❌ You need to be in a voice channel to use this command.")
-            return
-
-        # Connect to voice channel if not already connected
-        if ctx.voice_client is None:
-            try:
-                vc = await ctx.author.voice.channel.connect()
-                await ctx.followup.send(f"✅ Joined **{vc.channel.name}**")
-            except Exception as e:
-                await ctx.followup.send(f"❌ Failed to join voice channel: {str(e)}")
-                return
-        else:
-            vc = ctx.voice_client
-
-        # Initialize queue for this guild
-        if ctx.guild.id not in self.queues:
-            self.queues[ctx.guild.id] = deque()
-        
-        self.players[ctx.guild.id] = vc
-
-        youtube_url_pattern = re.compile(
-            r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/'
-            r'(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})'
-        )
-
-        try:
-            # Determine if query is URL or search term
-            if youtube_url_pattern.match(query):
-                video_url = query
-            else:
-                # Search YouTube
-                request = self.youtube.search().list(
-                    q=query,
-                    part='snippet',
-                    type='video',
-                    maxResults=1
-                )
-                response = request.execute()
-                
-                if not response.get('items'):
-                    await ctx.followup.send("❌ No results found on YouTube.")
-                    return
-                
-                video_id = response['items'][0]['id']['videoId']
-                video_url = f"https://www.youtube.com/watch?v={video_id}"
-
-            # Extract video info
-            loop = asyncio.get_event_loop()
-            info = await loop.run_in_executor(
-                None, 
-                lambda: youtube_dl.YoutubeDL(self.YDL_OPTIONS).extract_info(video_url, download=False)
-            )
-            
-            if not info:
-                await ctx.followup.send("❌ Could not extract video information.")
-                return
-            
-            # Handle playlist results
-            if 'entries' in info:
-                info = info['entries'][0]
-            
-            # Get audio URL with multiple fallback methods
-            audio_url = None
-            
-            
-            if 'url' in info:
-                audio_url = info['url']
-            
-            
-            elif 'formats' in info and info['formats']:
-                formats = info['formats']
-                
-               
-                audio_formats = [f for f in formats 
-                               if f.get('acodec') != 'none' 
-                               and f.get('vcodec') == 'none'
-                               and f.get('url')]
-                
-                if audio_formats:
-                    # Pick best audio quality
-                    audio_formats.sort(key=lambda x: x.get('abr', 0) or 0, reverse=True)
-                    audio_url = audio_formats[0]['url']
-                else:
-                    # Fallback: any format with audio
-                    formats_with_audio = [f for f in formats 
-                                        if f.get('acodec') != 'none' 
-                                        and f.get('url')]
-                    
-                    if formats_with_audio:
-                        audio_url = formats_with_audio[0]['url']
-            
-            
-            if not audio_url and 'requested_formats' in info:
-                for fmt in info['requested_formats']:
-                    if fmt.get('url'):
-                        audio_url = fmt['url']
-                        break
-            
-            if not audio_url:
-                await ctx.followup.send(
-                    "❌ Could not extract audio URL. The video may not have audio or is unavailable.\n"
-                    "**Tip:** Try updating yt-dlp: `pip install --upgrade yt-dlp`"
-                )
-                return
-            
-            song_info = {
-                'url': audio_url,
-                'title': info.get('title', 'Unknown Title'),
-                'duration': info.get('duration', 0),
-                'requester': ctx.author.name,
-                'webpage_url': info.get('webpage_url', video_url)
-            }
-            
-            self.queues[ctx.guild.id].append(song_info)
-            
-            # Start playing if nothing is currently playing
-            if not vc.is_playing() and not vc.is_paused():
-                await self.play_next(ctx)
-            else:
-                duration_str = self._format_duration(song_info['duration'])
-                await ctx.followup.send(
-                    f"➕ Added to queue: **{song_info['title']}** `[{duration_str}]`\n"
-                    f"Position: #{len(self.queues[ctx.guild.id])}"
-                )
-
-        except youtube_dl.utils.DownloadError as e:
-            error_msg = str(e).lower()
-            
-            if 'requested format is not available' in error_msg:
-                await ctx.followup.send(
-                    "❌ The requested format is not available for this video.\n"
-                    "**Solution:** Run `pip install --upgrade yt-dlp` and restart the bot."
-                )
-            elif 'sign in' in error_msg or 'login' in error_msg:
-                await ctx.followup.send("❌ This video requires authentication. Try a different video.")
-            elif 'not available' in error_msg or 'private' in error_msg:
-                await ctx.followup.send("❌ This video is not available (may be region-locked or private).")
-            else:
-                await ctx.followup.send(f"❌ Could not download video: {str(e)}")
-            
-            print(f"DownloadError: {e}")
-            
-        except KeyError as e:
-            await ctx.followup.send(f"❌ Missing video data: {str(e)}. The video format may not be supported.")
-            print(f"KeyError in play command: {str(e)}")
-            
-        except Exception as e:
-            await ctx.followup.send(f"❌ An unexpected error occurred. Please try again or use a different video.")
-            print(f"Play command error: {type(e).__name__}: {str(e)}")
-
-    @slash_command(name="join", description="Joins your voice channel")
-    @commands.cooldown(1, 3, commands.BucketType.user)
-    async def join(self, ctx):
-        await ctx.defer()
-
-        if ctx.author.voice is None:
-            await ctx.followup.send("❌ You need to be in a voice channel to use this command.")
-            return
-        
-        voice_channel = ctx.author.voice.channel
-        
-        if ctx.voice_client is None:
-            try:
-                vc = await voice_channel.connect()
-                await ctx.followup.send(f"✅ Joined **{voice_channel.name}**")
-                self.players[ctx.guild.id] = vc
-                await self.start_inactivity_check(ctx.guild.id)
-            except Exception as e:
-                await ctx.followup.send(f"❌ Failed to join: {str(e)}")
-        else:
-            await ctx.followup.send(f"ℹ️ Already connected to **{ctx.voice_client.channel.name}**")
-
-    @slash_command(name="leave", description="Leaves the voice channel")
-    async def leave(self, ctx):
-        if ctx.voice_client is None:
-            await ctx.respond("❌ I'm not in a voice channel!")
-            return
-        
-        guild_id = ctx.guild.id
-        
-        # Clear queue and stop playback
-        if guild_id in self.queues:
-            self.queues[guild_id].clear()
-        if guild_id in self.loop:
-            self.loop[guild_id] = False
-        if guild_id in self.current_song:
-            del self.current_song[guild_id]
-        
-        await ctx.voice_client.disconnect()
-        await self.stop_inactivity_check(guild_id)
-        
-        if guild_id in self.players:
-            del self.players[guild_id]
-        
-        await ctx.respond("👋 Left the voice channel")
-
-    @slash_command(name="loop", description="Toggles looping of the current song")
-    async def loop(self, ctx):
-        guild_id = ctx.guild.id
-
-        if guild_id not in self.loop:
-            self.loop[guild_id] = False
-
-        self.loop[guild_id] = not self.loop[guild_id]
-
-        if self.loop[guild_id]:
-            await ctx.respond("🔁 Looping enabled")
-        else:
-            await ctx.respond("🔁 Looping disabled")
-
-    async def play_next(self, ctx):
-        guild_id = ctx.guild.id
-        vc = ctx.voice_client
-
-       
-        if not vc or not vc.is_connected():
-            self.current_song.pop(guild_id, None)
-            return
-        
-        if not self.queues.get(guild_id):
-            self.current_song.pop(guild_id, None)
-            await self.start_inactivity_check(guild_id)
-            return
-
-        song_info = self.queues[guild_id].popleft()
-        self.current_song[guild_id] = song_info
-
-        try:
-            audio_source = discord.FFmpegPCMAudio(song_info['url'], **self.FFMPEG_OPTIONS)
-            
-            def after_playing(error):
-                if error:
-                    print(f"Player error: {error}")
-                
-                # Schedule the next song
-                future = asyncio.run_coroutine_threadsafe(
-                    self.after_song(ctx), 
-                    self.bot.loop
-                )
-                try:
-                    future.result()
-                except Exception as e:
-                    print(f"Error in after_playing: {e}")
-            
-            vc.play(audio_source, after=after_playing)
-            
-            duration_str = self._format_duration(song_info['duration'])
-            embed = discord.Embed(
-                title="🎵 Now Playing",
-                description=f"**{song_info['title']}**",
-                color=discord.Color.green()
-            )
-            embed.add_field(name="Duration", value=duration_str, inline=True)
-            embed.add_field(name="Requested by", value=song_info['requester'], inline=True)
-            embed.add_field(name="Loop", value="🔁 Enabled" if self.loop.get(guild_id, False) else "➡️ Disabled", inline=True)
-            
-            await ctx.followup.send(embed=embed)
-            
-            await self.start_inactivity_check(guild_id)
-            
-        except Exception as e:
-            print(f"Error playing song: {str(e)}")
-            self.current_song.pop(guild_id, None)
-            
-            await ctx.followup.send(f"❌ Failed to play: {song_info['title']}")
-            
-            # Try to play next song
-            if self.queues.get(guild_id):
-                await self.play_next(ctx)
-
-    async def play_song(self, ctx, song_info):
-        """Helper function for looping songs"""
-        vc = ctx.voice_client
-        guild_id = ctx.guild.id
-
-        if not vc or not vc.is_connected():
-            return
-
-        try:
-            audio_source = discord.FFmpegPCMAudio(song_info['url'], **self.FFMPEG_OPTIONS)
-            
-            def after_playing(error):
-                if error:
-                    print(f"Player error: {error}")
-                future = asyncio.run_coroutine_threadsafe(
-                    self.after_song(ctx), 
-                    self.bot.loop
-                )
-                try:
-                    future.result()
-                except Exception as e:
-                    print(f"Error in after_playing (loop): {e}")
-            
-            vc.play(audio_source, after=after_playing)
-            
-        except Exception as e:
-            print(f"Error in play_song: {str(e)}")
-            await ctx.followup.send(f"❌ Error looping song: {str(e)}")
-
-    async def after_song(self, ctx):
-        """Called after a song finishes playing"""
-        vc = ctx.voice_client
-        guild_id = ctx.guild.id
-
-        # Check if looping is enabled
-        if vc and guild_id in self.loop and self.loop[guild_id] and guild_id in self.current_song:
-            await self.play_song(ctx, self.current_song[guild_id])
-        # Check if there are more songs in queue
-        elif vc and self.queues.get(guild_id):
-            await self.play_next(ctx)
-        # Start inactivity timer if queue is empty
-        elif vc and not self.queues.get(guild_id):
-            await self.start_inactivity_check(guild_id)
-
-    @slash_command(name="pause", description="Pauses the current song")
-    async def pause(self, ctx):
-        if ctx.author.voice is None:
-            await ctx.respond("❌ You need to be in a voice channel to use this command.")
-            return
-
-        if not ctx.voice_client or not ctx.voice_client.is_playing():
-            await ctx.respond("❌ Nothing is playing!")
-            return
-
-        ctx.voice_client.pause()
-        await ctx.respond("⏸️ Paused")
-
-    @slash_command(name="resume", description="Resumes the paused song")
-    async def resume(self, ctx):
-        if ctx.author.voice is None:
-            await ctx.respond("❌ You need to be in a voice channel to use this command.")
-            return
-
-        if not ctx.voice_client or not ctx.voice_client.is_paused():
-            await ctx.respond("❌ Nothing is paused!")
-            return
-
-        ctx.voice_client.resume()
-        await ctx.respond("▶️ Resumed")
-    
-    @slash_command(name="skip", description="Skips to the next song in queue")
-    async def skipsong(self, ctx):
-        if ctx.author.voice is None:
-            await ctx.respond("❌ You need to be in a voice channel to use this command.")
-            return
-        
-        if not ctx.voice_client or not ctx.voice_client.is_playing():
-            await ctx.respond("❌ Nothing is playing right now.")
-            return
-        
-        # Disable loop for this skip
-        guild_id = ctx.guild.id
-        was_looping = self.loop.get(guild_id, False)
-        if was_looping:
-            self.loop[guild_id] = False
-        
-        ctx.voice_client.stop()
-        await ctx.respond("⏭️ Skipped to next song")
-        
-        # Re-enable loop if it was on
-        if was_looping:
-            self.loop[guild_id] = True
-
-    @slash_command(name="stop", description="Stops the music and clears the queue")
-    async def stop(self, ctx):
-        guild_id = ctx.guild.id
-        
-        if ctx.author.voice is None:
-            await ctx.respond("❌ You need to be in a voice channel to use this command.")
-            return
-
-        if not ctx.voice_client:
-            await ctx.respond("❌ I'm not in a voice channel!")
-            return
-        
-        # Clear everything
-        if guild_id in self.queues:
-            self.queues[guild_id].clear()
-        if guild_id in self.loop:
-            self.loop[guild_id] = False
-        if guild_id in self.current_song:
-            del self.current_song[guild_id]
-        
-        if ctx.voice_client.is_playing() or ctx.voice_client.is_paused():
-            ctx.voice_client.stop()
-        
-        await ctx.respond("⏹️ Stopped playing and cleared the queue")
-
-    @slash_command(name="queue", description="Shows the current music queue")
-    async def show_queue(self, ctx):
-        guild_id = ctx.guild.id
-
-        # Check if there's a current song or queue
-        has_current = guild_id in self.current_song
-        has_queue = guild_id in self.queues and self.queues[guild_id]
-        
-        if not has_current and not has_queue:
-            await ctx.respond("📭 The queue is empty")
-            return
-        
-        embed = discord.Embed(
-            title="🎵 Music Queue",
-            color=discord.Color.blue()
-        )
-        
-        # Show currently playing song
-        if has_current:
-            current = self.current_song[guild_id]
-            duration_str = self._format_duration(current['duration'])
-            loop_status = " 🔁" if self.loop.get(guild_id, False) else ""
-            embed.add_field(
-                name="Now Playing",
-                value=f"**{current['title']}** `[{duration_str}]`{loop_status}\nRequested by: {current['requester']}",
-                inline=False
-            )
-        
-        # Show queue
-        if has_queue:
-            queue_list = list(self.queues[guild_id])
-            queue_text = ""
-            
-            for i, song in enumerate(queue_list[:10]):  # Show first 10 songs
-                duration_str = self._format_duration(song['duration'])
-                queue_text += f"`{i + 1}.` **{song['title']}** `[{duration_str}]`\n"
-            
-            if len(queue_list) > 10:
-                queue_text += f"\n*...and {len(queue_list) - 10} more*"
-            
-            embed.add_field(
-                name=f"Up Next ({len(queue_list)} songs)",
-                value=queue_text,
-                inline=False
-            )
-        
-        await ctx.respond(embed=embed)
-
-    @slash_command(name="nowplaying", description="Shows the currently playing song")
-    async def nowplaying(self, ctx):
-        guild_id = ctx.guild.id
-        
-        if guild_id not in self.current_song:
-            await ctx.respond("❌ Nothing is currently playing")
-            return
-        
-        song = self.current_song[guild_id]
-        duration_str = self._format_duration(song['duration'])
-        
-        embed = discord.Embed(
-            title="🎵 Now Playing",
-            description=f"**{song['title']}**",
-            color=discord.Color.green()
-        )
-        embed.add_field(name="Duration", value=duration_str, inline=True)
-        embed.add_field(name="Requested by", value=song['requester'], inline=True)
-        embed.add_field(name="Loop", value="🔁 Enabled" if self.loop.get(guild_id, False) else "➡️ Disabled", inline=True)
-        embed.add_field(name="URL", value=f"[Click here]({song['webpage_url']})", inline=False)
-        
-        await ctx.respond(embed=embed)
-
-    @slash_command(name="clear", description="Clears the entire queue")
-    async def clear(self, ctx):
-        guild_id = ctx.guild.id
-        
-        if guild_id not in self.queues or not self.queues[guild_id]:
-            await ctx.respond("❌ The queue is already empty")
-            return
-        
-        queue_length = len(self.queues[guild_id])
-        self.queues[guild_id].clear()
-        
-        await ctx.respond(f"🗑️ Cleared {queue_length} song(s) from the queue")
-
-    def _format_duration(self, seconds):
-        """Format duration in seconds to MM:SS or HH:MM:SS"""
-        if not seconds:
-            return "Unknown"
-        
-        hours = seconds // 3600
-        minutes = (seconds % 3600) // 60
-        secs = seconds % 60
-        
-        if hours > 0:
-            return f"{hours:02d}:{minutes:02d}:{secs:02d}"
-        else:
-            return f"{minutes:02d}:{secs:02d}"
-
-    async def check_inactivity(self, guild_id, timeout=300):
-        """Disconnect bot after 5 minutes of inactivity"""
-        try:
-            await asyncio.sleep(timeout)
-
-            player = self.players.get(guild_id)
-            if player and player.is_connected() and not player.is_playing() and not player.is_paused():
-                await player.disconnect()
-                
-                if guild_id in self.players:
-                    del self.players[guild_id]
-                if guild_id in self.queues:
-                    self.queues[guild_id].clear()
-                if guild_id in self.current_song:
-                    del self.current_song[guild_id]
-                
-                guild = self.bot.get_guild(guild_id)
-                if guild and guild.system_channel:
-                    await guild.system_channel.send("👋 Disconnected due to 5 minutes of inactivity")
-                
-                await self.stop_inactivity_check(guild_id)
-
-        except asyncio.CancelledError:
-            pass
-        except Exception as e:
-            print(f"Error in inactivity check for guild {guild_id}: {e}")
-
-    async def start_inactivity_check(self, guild_id):
-        """Start or restart the inactivity timer"""
-        # Cancel existing task
-        if guild_id in self.inactivity_tasks:
-            self.inactivity_tasks[guild_id].cancel()
-            try:
-                await self.inactivity_tasks[guild_id]
-            except asyncio.CancelledError:
-                pass
-
-        # Create new task
-        self.inactivity_tasks[guild_id] = asyncio.create_task(
-            self.check_inactivity(guild_id)
-        )
-
-    async def stop_inactivity_check(self, guild_id):
-        """Stop the inactivity timer"""
-        if guild_id in self.inactivity_tasks:
-            self.inactivity_tasks[guild_id].cancel()
-            try:
-                await self.inactivity_tasks[guild_id]
-            except asyncio.CancelledError:
-                pass
-            del self.inactivity_tasks[guild_id]
-
-    def cog_unload(self):
-        """Cleanup when cog is unloaded"""
-        for task in self.inactivity_tasks.values():
-            task.cancel()
-
-def setup(bot):
-    bot.add_cog(MusicPlayer(bot))
+import discord
+import os
+from discord.ext import commands
+from discord.commands import slash_command, Option
+import asyncio
+import itertools
+import time
+from dotenv import load_dotenv
+import re
+from Utils.audio_cache import AudioCache
+from Utils.ffmpeg_supervisor import FFmpegSupervisor, TranscodeCapacityError
+from Utils.database import get_database
+from Utils.extractor_pool import ExtractionFailed, ExtractorBusy, ExtractorPool
+from Utils.inactivity import InactivityManager
+from Utils.metrics import REGISTRY
+from Utils.music_cache import MusicCache, stream_expiry
+from Utils.music_sessions import SessionStore
+from Utils.music_state import GuildPlayerState, Track
+from Utils.outbound import get_scheduler
+from Utils.youtube_search import YouTubeSearch
+
+YOUTUBE_URL_PATTERN = re.compile(
+    r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/'
+    r'(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})'
+)
+VIDEO_ID_PATTERN = re.compile(r'(?:[?&]v=|youtu\.be/|embed/|shorts/|/v/)([A-Za-z0-9_-]{11})')
+PLAYLIST_URL_PATTERN = re.compile(r'youtube\.com/playlist\?(?:.*&)?list=([\w-]+)')
+
+RESOLVE_SECONDS = REGISTRY.histogram(
+    'discordbot_song_resolve_seconds', 'Time to get a playable stream URL for a song', ('source',)
+)
+RESOLVED_FROM_CACHE = RESOLVE_SECONDS.labels('cache')
+RESOLVED_FROM_EXTRACTOR = RESOLVE_SECONDS.labels('extractor')
+
+
+class SongUnavailable(Exception):
+    """Raised with a user facing message when a video has no playable audio"""
+
+
+class MusicPlayer(commands.Cog):
+    REQUIRED_INTENTS = ('guilds', 'voice_states')
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.states = {}  # guild_id -> GuildPlayerState
+        self.inactivity = InactivityManager(self._disconnect_idle, timeout=300)
+        self.outbound = get_scheduler()
+        
+        load_dotenv()
+        youtube_api_key = os.getenv('YOUTUBE_API_KEY')
+        if not youtube_api_key:
+            raise ValueError("YOUTUBE_API_KEY not found in environment variables")
+        
+        # The API client is built on the first search, not here
+        self.search = YouTubeSearch(
+            api_key=youtube_api_key,
+            max_concurrency=int(os.getenv('YOUTUBE_SEARCH_CONCURRENCY', 8)),
+            timeout=float(os.getenv('YOUTUBE_SEARCH_TIMEOUT', 10))
+        )
+        
+        # Set MUSIC_CACHE_DB (e.g. users.db) to keep the cache across restarts
+        cache_db = os.getenv('MUSIC_CACHE_DB')
+        self.cache = MusicCache(
+            db=get_database(cache_db) if cache_db else None,
+            maxsize=int(os.getenv('MUSIC_CACHE_SIZE', 2048))
+        )
+        
+        self.YDL_OPTIONS = {
+            'format': 'bestaudio/best',
+            'noplaylist': True,
+            'quiet': True,
+            'no_warnings': True,
+            'ignoreerrors': False,
+            'nocheckcertificate': True,
+            'default_search': 'ytsearch',
+            'extract_flat': False,
+            'socket_timeout': 15,
+        }
+        
+        # Every playback FFmpeg process goes through the supervisor, which caps how many run on this host
+        self.ffmpeg = FFmpegSupervisor(
+            max_processes=int(os.getenv('FFMPEG_MAX_PROCESSES', 32)),
+            wait_timeout=int(os.getenv('FFMPEG_WAIT_TIMEOUT', 10))
+        )
+        
+        self.extractor = ExtractorPool(
+            self.YDL_OPTIONS,
+            size=int(os.getenv('EXTRACTOR_POOL_SIZE', 4)),
+            max_pending=int(os.getenv('EXTRACTOR_MAX_PENDING', 64)),
+            per_guild=int(os.getenv('EXTRACTOR_PER_GUILD', 2)),
+            processes=os.getenv('EXTRACTOR_PROCESSES', '0') == '1'
+        )
+        
+        # Songs to re-validate ahead, and how many seconds before the current song ends to do it
+        self.PREFETCH_DEPTH = 2
+        self.PREFETCH_LEAD = 30
+        self.prewarm_source = os.getenv('MUSIC_PREWARM_SOURCE', '0') == '1'
+        
+        # Playlists are queued page by page, the first page is small so the first song starts quickly
+        self.PLAYLIST_FIRST_PAGE = 10
+        self.PLAYLIST_PAGE = 100
+        self.PLAYLIST_LIMIT = int(os.getenv('PLAYLIST_LIMIT', 500))
+        
+        # Set AUDIO_CACHE_DIR to keep frequently played tracks on disk as Opus
+        audio_cache_dir = os.getenv('AUDIO_CACHE_DIR')
+        self.audio_cache = AudioCache(
+            audio_cache_dir,
+            max_bytes=int(os.getenv('AUDIO_CACHE_MAX_MB', 2048)) * 1024**2,
+            threshold=int(os.getenv('AUDIO_CACHE_THRESHOLD', 3))
+        ) if audio_cache_dir else None
+        
+        # Queues survive restarts in users.db, MUSIC_SESSIONS=0 turns that off
+        self.sessions = SessionStore(
+            get_database(),
+            flush_interval=float(os.getenv('MUSIC_SESSION_FLUSH', 2)),
+            position_interval=float(os.getenv('MUSIC_SESSION_POSITION', 15))
+        ) if os.getenv('MUSIC_SESSIONS', '1') == '1' else None
+        self.RESTORE_CONCURRENCY = int(os.getenv('MUSIC_RESTORE_CONCURRENCY', 16))
+        self._restore_task = None
+
+    @slash_command(name="play", description="Plays music or videos from YouTube")
+    @commands.cooldown(1, 3, commands.BucketType.user)
+    async def play(self, ctx, query: str = Option(description="Song name or YouTube URL")):
+        await ctx.defer()
+        
+        # Check if user is in voice channel
+        if ctx.author.voice is None:
+            await ctx.followup.send("❌ You need to be in a voice channel to use this command.")
+            return
+
+        # Connect to voice channel if not already connected
+        if ctx.voice_client is None:
+            try:
+                vc = await ctx.author.voice.channel.connect()
+                await self.outbound.send(ctx.followup, f"✅ Joined **{vc.channel.name}**")
+            except Exception as e:
+                await ctx.followup.send(f"❌ Failed to join voice channel: {str(e)}")
+                return
+        else:
+            vc = ctx.voice_client
+
+        state = self._state(ctx.guild.id)
+        state.voice_client = vc
+        state.ctx = ctx
+
+        try:
+            if PLAYLIST_URL_PATTERN.search(query):
+                await self._enqueue_playlist(ctx, vc, query)
+                return
+            
+            # Determine if query is URL or search term
+            if YOUTUBE_URL_PATTERN.match(query):
+                video_url = query
+                video_id_match = VIDEO_ID_PATTERN.search(query)
+                video_id = video_id_match.group(1) if video_id_match else None
+            else:
+                video_id = self.cache.get_video_id(query)
+                if not video_id:
+                    # Search YouTube
+                    video_id = await self.search.search(query)
+                    
+                    if not video_id:
+                        await ctx.followup.send("❌ No results found on YouTube.")
+                        return
+                    
+                    self.cache.set_video_id(query, video_id)
+                
+                video_url = f"https://www.youtube.com/watch?v={video_id}"
+
+            song_info = await self._resolve_song(video_url, video_id, ctx.guild.id)
+            track = Track.from_info(song_info, ctx.author.name)
+            
+            state.enqueue(track)
+            
+            # The worker starts playing if nothing is currently playing, or confirms the queue position
+            state.post('enqueue', (ctx, track))
+
+        except ExtractionFailed as e:
+            error_msg = str(e).lower()
+            
+            if 'requested format is not available' in error_msg:
+                await ctx.followup.send(
+                    "❌ The requested format is not available for this video.\n"
+                    "**Solution:** Run `pip install --upgrade yt-dlp` and restart the bot."
+                )
+            elif 'sign in' in error_msg or 'login' in error_msg:
+                await ctx.followup.send("❌ This video requires authentication. Try a different video.")
+            elif 'not available' in error_msg or 'private' in error_msg:
+                await ctx.followup.send("❌ This video is not available (may be region-locked or private).")
+            else:
+                await ctx.followup.send(f"❌ Could not download video: {str(e)}")
+            
+            print(f"DownloadError: {e}")
+            
+        except SongUnavailable as e:
+            await ctx.followup.send(str(e))
+            
+        except ExtractorBusy:
+            await ctx.followup.send("❌ The music service is busy right now. Please try again in a moment.")
+            
+        except asyncio.TimeoutError:
+            await ctx.followup.send("❌ YouTube took too long to respond. Please try again.")
+            print(f"YouTube lookup timed out for query: {query}")
+            
+        except KeyError as e:
+            await ctx.followup.send(f"❌ Missing video data: {str(e)}. The video format may not be supported.")
+            print(f"KeyError in play command: {str(e)}")
+            
+        except Exception as e:
+            await ctx.followup.send(f"❌ An unexpected error occurred. Please try again or use a different video.")
+            print(f"Play command error: {type(e).__name__}: {str(e)}")
+
+    async def _enqueue_playlist(self, ctx, vc, url):
+        """Queues a playlist page by page as tracks without a stream URL, _refresh_track resolves them right before they play"""
+        guild_id = ctx.guild.id
+        state = self._state(guild_id)
+        version = state.queue_version
+        title = None
+        added = 0
+        start = 1
+        page = self.PLAYLIST_FIRST_PAGE
+        
+        # Bounded by position too, skipped private and deleted videos would otherwise keep added under the limit
+        while start <= self.PLAYLIST_LIMIT and added < self.PLAYLIST_LIMIT:
+            end = min(start + page - 1, self.PLAYLIST_LIMIT)
+            info = await self.extractor.extract_playlist(url, guild_id, start, end)
+            
+            # Stop ingesting if the queue was cleared or the bot left while this page loaded
+            if state.queue_version != version or self.states.get(guild_id) is not state or not vc.is_connected():
+                return
+            
+            info = info or {}
+            title = title or info.get('title', 'Unknown Playlist')
+            entries = info.get('entries') or []
+            
+            for entry in entries:
+                if entry and entry.get('id') and entry.get('title') not in ('[Private video]', '[Deleted video]'):
+                    state.enqueue(Track(
+                        title=entry.get('title') or 'Unknown Title',
+                        duration=int(entry.get('duration') or 0),
+                        video_id=entry['id'],
+                        requester=ctx.author.name
+                    ))
+                    added += 1
+            
+            if start == 1:
+                if not added:
+                    await ctx.followup.send("❌ No playable videos found in this playlist.")
+                    return
+                
+                await self.outbound.send(ctx.followup, f"📃 Loading playlist **{title}**...")
+                state.post('enqueue')
+            
+            if len(entries) < end - start + 1:
+                break
+            start = end + 1
+            page = self.PLAYLIST_PAGE
+        
+        await self.outbound.send(ctx.followup, f"➕ Added **{added}** songs from **{title}** to the queue")
+
+    async def _resolve_song(self, video_url, video_id, guild_id):
+        """Returns song info with a playable stream URL, from the cache while it is still fresh"""
+        start = time.perf_counter()
+        song_info = self.cache.get_song(video_id) if video_id else None
+        if song_info and song_info['url']:
+            RESOLVED_FROM_CACHE.observe(time.perf_counter() - start)
+            return song_info
+        
+        # Extract video info
+        info = await self.extractor.extract(video_url, guild_id)
+        
+        if not info:
+            raise SongUnavailable("❌ Could not extract video information.")
+        
+        # Handle playlist results
+        if 'entries' in info:
+            info = info['entries'][0]
+        
+        audio_url, acodec = self._select_audio_url(info)
+        
+        if not audio_url:
+            raise SongUnavailable(
+                "❌ Could not extract audio URL. The video may not have audio or is unavailable.\n"
+                "**Tip:** Try updating yt-dlp: `pip install --upgrade yt-dlp`"
+            )
+        
+        song_info = {
+            'url': audio_url,
+            'url_expires': stream_expiry(audio_url),
+            'title': info.get('title', 'Unknown Title'),
+            'duration': info.get('duration', 0),
+            'webpage_url': info.get('webpage_url', video_url),
+            'video_id': info.get('id') or video_id,
+            'acodec': acodec
+        }
+        
+        if song_info['video_id']:
+            self.cache.set_song(song_info['video_id'], song_info)
+        
+        RESOLVED_FROM_EXTRACTOR.observe(time.perf_counter() - start)
+        return song_info
+
+    async def _refresh_track(self, track, guild_id, lead=0):
+        """Re-resolves the stream URL in place if it would expire before the song finishes"""
+        if not self.cache.is_fresh(track.url, track.url_expires, track.duration, lead):
+            fresh = await self._resolve_song(track.webpage_url, track.video_id, guild_id)
+            track.url = fresh['url']
+            track.url_expires = fresh['url_expires']
+            track.acodec = fresh.get('acodec')
+            # Playlist tracks may not know their duration yet
+            track.duration = track.duration or fresh['duration'] or 0
+
+    def _schedule_prefetch(self, state, delay):
+        """(Re)starts the lookahead for a guild, delay seconds before the current song ends"""
+        if state.prefetch_task:
+            state.prefetch_task.cancel()
+        state.prefetch_task = asyncio.create_task(self._prefetch(state, delay))
+
+    async def _prefetch(self, state, delay):
+        """Validates the next songs while the current one plays so the switch never hits an expired URL"""
+        try:
+            await asyncio.sleep(delay)
+            
+            upcoming = list(itertools.islice(state.queue, self.PREFETCH_DEPTH))
+            if state.loop and state.current:
+                upcoming.insert(0, state.current)
+            
+            for track in upcoming:
+                if self._is_cached(track):
+                    continue
+                try:
+                    await self._refresh_track(track, state.guild_id, lead=self.PREFETCH_LEAD)
+                except Exception as e:
+                    print(f"Prefetch failed for {track.title}: {type(e).__name__}: {e}")
+            
+            # Optionally start the next FFmpeg process now so it is already buffering when the song ends
+            if (self.prewarm_source and state.queue and not state.loop and state.queue[0].source is None
+                    and not self._is_cached(state.queue[0])):
+                track = state.queue[0]
+                try:
+                    source = await self._stream_source(track)
+                except TranscodeCapacityError:
+                    return
+                # The wait for a slot can outlast a skip or a cleared queue, the source is only for this track
+                if state.queue and state.queue[0] is track and track.source is None:
+                    track.source = source
+                else:
+                    source.cleanup()
+        
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if state.prefetch_task is asyncio.current_task():
+                state.prefetch_task = None
+
+    def _is_cached(self, track):
+        """True if the track is in the local Opus cache, so it needs no stream URL"""
+        return self.audio_cache is not None and track.video_id in self.audio_cache
+
+    def _state(self, guild_id):
+        """Returns the guild's player state, creating it on first use"""
+        state = self.states.get(guild_id)
+        if state is None:
+            state = self.states[guild_id] = GuildPlayerState(guild_id, self.sessions)
+            if self.sessions:
+                # Anything saved for the guild belongs to an older session, this one journals its queue from scratch
+                self.sessions.cleared(guild_id)
+            state.worker = asyncio.create_task(self._playback_worker(state))
+        return state
+
+    def _drop_state(self, guild_id):
+        """Forgets everything about a guild the bot has left"""
+        state = self.states.pop(guild_id, None)
+        if state is None:
+            return
+        state.reset()
+        self.inactivity.discard(guild_id)
+        if self.sessions:
+            self.sessions.drop(guild_id)
+        if state.worker and state.worker is not asyncio.current_task():
+            state.worker.cancel()
+
+    @slash_command(name="join", description="Joins your voice channel")
+    @commands.cooldown(1, 3, commands.BucketType.user)
+    async def join(self, ctx):
+        await ctx.defer()
+
+        if ctx.author.voice is None:
+            await ctx.followup.send("❌ You need to be in a voice channel to use this command.")
+            return
+        
+        voice_channel = ctx.author.voice.channel
+        
+        if ctx.voice_client is None:
+            try:
+                vc = await voice_channel.connect()
+                await self.outbound.send(ctx.followup, f"✅ Joined **{voice_channel.name}**")
+                state = self._state(ctx.guild.id)
+                state.voice_client = vc
+                state.ctx = ctx
+                self.inactivity.touch(ctx.guild.id)
+            except Exception as e:
+                await ctx.followup.send(f"❌ Failed to join: {str(e)}")
+        else:
+            await ctx.followup.send(f"ℹ️ Already connected to **{ctx.voice_client.channel.name}**")
+
+    @slash_command(name="leave", description="Leaves the voice channel")
+    async def leave(self, ctx):
+        if ctx.voice_client is None:
+            await ctx.respond("❌ I'm not in a voice channel!")
+            return
+        
+        # Clear queue and stop playback
+        self._drop_state(ctx.guild.id)
+        await ctx.voice_client.disconnect()
+        
+        await ctx.respond("👋 Left the voice channel")
+
+    @slash_command(name="loop", description="Toggles looping of the current song")
+    async def loop(self, ctx):
+        state = self.states.get(ctx.guild.id)
+        if state is None or state.current is None:
+            await ctx.respond("❌ Nothing is currently playing")
+            return
+        
+        enabled = not state.loop
+        state.post('loop', enabled)
+
+        if enabled:
+            await ctx.respond("🔁 Looping enabled")
+        else:
+            await ctx.respond("🔁 Looping disabled")
+
+    async def _playback_worker(self, state):
+        """Consumes a guild's playback events one at a time, every transition is a single step"""
+        while True:
+            event, value = await state.events.get()
+            try:
+                await self._handle_event(state, event, value)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error handling {event} for guild {state.guild_id}: {type(e).__name__}: {e}")
+
+    async def _handle_event(self, state, event, value):
+        vc = self._voice_client(state)
+        
+        if event == 'enqueue':
+            # value is (ctx, track) for a single /play, None for a playlist
+            if state.current is None:
+                await self._start_next(state)
+            elif value:
+                ctx, track = value
+                duration_str = self._format_duration(track.duration)
+                await self.outbound.send(
+                    ctx.followup,
+                    f"➕ Added to queue: **{track.title}** `[{duration_str}]`\n"
+                    f"Position: #{len(state.queue)}"
+                )
+        
+        elif event == 'track_end':
+            # Ignore the end of a source that has already been replaced
+            if value != state.play_token:
+                return
+            if state.skip_pending:
+                await self._start_next(state)
+            elif state.loop and state.current:
+                if not await self._start_track(state, state.current, announce=False):
+                    await self._start_next(state)
+            else:
+                await self._start_next(state)
+        
+        elif event == 'skip':
+            # The stopped source posts track_end, which then ignores the loop flag
+            if vc and (vc.is_playing() or vc.is_paused()):
+                state.skip_pending = True
+                vc.stop()
+        
+        elif event == 'stop':
+            state.reset()
+            if vc and (vc.is_playing() or vc.is_paused()):
+                vc.stop()
+        
+        elif event == 'loop':
+            state.loop = value
+            state.changed()
+        
+        elif event == 'resume':
+            # value is (track, position) of the song that was playing when the bot last stopped
+            track, position = value
+            if not await self._start_track(state, track, start=position):
+                await self._start_next(state)
+
+    async def _start_next(self, state):
+        """Plays the first playable song in the queue or goes idle, failed songs are skipped in a loop"""
+        while state.queue:
+            vc = self._voice_client(state)
+            if not vc or not vc.is_connected():
+                break
+            if await self._start_track(state, state.next_track()):
+                return
+        
+        state.current = None
+        state.changed()
+        self.inactivity.touch(state.guild_id)
+
+    async def _start_track(self, state, track, announce=True, start=0):
+        """Starts one song, start seconds in, returns False if it could not be played"""
+        vc = self._voice_client(state)
+        # Use the FFmpeg process prefetch already started, otherwise make sure the URL has not expired
+        audio_source, track.source = track.source, None
+        if not vc or not vc.is_connected():
+            # Looping and resumed songs get here without the checks _start_next makes
+            if audio_source is not None:
+                audio_source.cleanup()
+            return False
+        state.current = track
+        
+        try:
+            cached_path = None
+            if audio_source is None:
+                cached_path = self.audio_cache.get(track.video_id) if self._is_cached(track) else None
+                if cached_path:
+                    # Already Opus on disk: no download and no transcoding, FFmpeg only remuxes the packets
+                    audio_source = await self.ffmpeg.create(
+                        cached_path, track.duration, opus=True, local=True, start=start
+                    )
+                else:
+                    await self._refresh_track(track, state.guild_id)
+                    audio_source = await self._stream_source(track, start)
+            
+            if not cached_path and self.audio_cache and track.video_id:
+                self.audio_cache.record_play(track.video_id, track.url, track.duration)
+            
+            state.play_token += 1
+            state.skip_pending = False
+            vc.play(audio_source, after=self._after_playing(state, state.play_token))
+            audio_source = None  # the voice client cleans it up from here on
+            state.changed()
+            self._schedule_prefetch(state, max(0, track.duration - start - self.PREFETCH_LEAD))
+            
+            if announce:
+                duration_str = self._format_duration(track.duration)
+                embed = discord.Embed(
+                    title="🎵 Now Playing",
+                    description=f"**{track.title}**",
+                    color=discord.Color.green()
+                )
+                embed.add_field(name="Duration", value=duration_str, inline=True)
+                embed.add_field(name="Requested by", value=track.requester, inline=True)
+                embed.add_field(name="Loop", value="🔁 Enabled" if state.loop else "➡️ Disabled", inline=True)
+                
+                await self._send(state, embed=embed)
+            
+            self.inactivity.touch(state.guild_id)
+            return True
+            
+        except TranscodeCapacityError:
+            state.current = None
+            await self._send(state, f"⏳ Too many songs are playing right now, skipped: {track.title}")
+            return False
+            
+        except Exception as e:
+            print(f"Error playing song: {str(e)}")
+            state.current = None
+            await self._send(state, f"❌ Failed to play: {track.title}")
+            return False
+        
+        finally:
+            # A source the voice client never took still holds an FFmpeg process and a supervisor slot
+            if audio_source is not None:
+                audio_source.cleanup()
+
+    async def _stream_source(self, track, start=0):
+        """Supervised FFmpeg source for a track's stream URL, passing Opus streams through untouched"""
+        return await self.ffmpeg.create(track.url, track.duration, opus=track.acodec == 'opus', start=start)
+
+    def _after_playing(self, state, token):
+        """Builds the voice client's after callback, which runs on the player thread"""
+        def after_playing(error):
+            if error:
+                print(f"Player error: {error}")
+            
+            # Hand the event to the event loop and return straight away, never wait on it from this thread
+            self.bot.loop.call_soon_threadsafe(state.post, 'track_end', token)
+        
+        return after_playing
+
+    def _voice_client(self, state):
+        guild = self.bot.get_guild(state.guild_id)
+        return guild.voice_client if guild else None
+
+    async def _send(self, state, *args, **kwargs):
+        """Posts a playback message through the last music command's followup, or to its channel after a restart"""
+        if state.ctx is not None:
+            target = state.ctx.followup
+        elif state.text_channel_id:
+            target = self.bot.get_partial_messageable(state.text_channel_id)
+        else:
+            return
+        try:
+            # Not a reply to that command, so it queues behind the command's own followups
+            await self.outbound.send(target, *args, priority=False, **kwargs)
+        except discord.HTTPException as e:
+            print(f"Error sending playback message: {e}")
+
+    @slash_command(name="pause", description="Pauses the current song")
+    async def pause(self, ctx):
+        if ctx.author.voice is None:
+            await ctx.respond("❌ You need to be in a voice channel to use this command.")
+            return
+
+        if not ctx.voice_client or not ctx.voice_client.is_playing():
+            await ctx.respond("❌ Nothing is playing!")
+            return
+
+        ctx.voice_client.pause()
+        await ctx.respond("⏸️ Paused")
+
+    @slash_command(name="resume", description="Resumes the paused song")
+    async def resume(self, ctx):
+        if ctx.author.voice is None:
+            await ctx.respond("❌ You need to be in a voice channel to use this command.")
+            return
+
+        if not ctx.voice_client or not ctx.voice_client.is_paused():
+            await ctx.respond("❌ Nothing is paused!")
+            return
+
+        ctx.voice_client.resume()
+        await ctx.respond("▶️ Resumed")
+    
+    @slash_command(name="skip", description="Skips to the next song in queue")
+    async def skipsong(self, ctx):
+        if ctx.author.voice is None:
+            await ctx.respond("❌ You need to be in a voice channel to use this command.")
+            return
+        
+        if not ctx.voice_client or not ctx.voice_client.is_playing():
+            await ctx.respond("❌ Nothing is playing right now.")
+            return
+        
+        # An explicit event, so the end of this song does not replay it when looping
+        self._state(ctx.guild.id).post('skip')
+        await ctx.respond("⏭️ Skipped to next song")
+
+    @slash_command(name="stop", description="Stops the music and clears the queue")
+    async def stop(self, ctx):
+        guild_id = ctx.guild.id
+        
+        if ctx.author.voice is None:
+            await ctx.respond("❌ You need to be in a voice channel to use this command.")
+            return
+
+        if not ctx.voice_client:
+            await ctx.respond("❌ I'm not in a voice channel!")
+            return
+        
+        # Clear everything
+        self._state(guild_id).post('stop')
+        
+        await ctx.respond("⏹️ Stopped playing and cleared the queue")
+
+    @slash_command(name="queue", description="Shows the current music queue")
+    async def show_queue(self, ctx):
+        state = self.states.get(ctx.guild.id)
+
+        # Check if there's a current song or queue
+        has_current = state is not None and state.current is not None
+        has_queue = state is not None and state.queue
+        
+        if not has_current and not has_queue:
+            await ctx.respond("📭 The queue is empty")
+            return
+        
+        embed = discord.Embed(
+            title="🎵 Music Queue",
+            color=discord.Color.blue()
+        )
+        
+        # Show currently playing song
+        if has_current:
+            current = state.current
+            duration_str = self._format_duration(current.duration)
+            loop_status = " 🔁" if state.loop else ""
+            embed.add_field(
+                name="Now Playing",
+                value=f"**{current.title}** `[{duration_str}]`{loop_status}\nRequested by: {current.requester}",
+                inline=False
+            )
+        
+        # Show queue
+        if has_queue:
+            queue_length = len(state.queue)
+            queue_text = ""
+            
+            for i, track in enumerate(itertools.islice(state.queue, 10)):  # Show first 10 songs
+                duration_str = self._format_duration(track.duration)
+                queue_text += f"`{i + 1}.` **{track.title}** `[{duration_str}]`\n"
+            
+            if queue_length > 10:
+                queue_text += f"\n*...and {queue_length - 10} more*"
+            
+            embed.add_field(
+                name=f"Up Next ({queue_length} songs)",
+                value=queue_text,
+                inline=False
+            )
+        
+        await ctx.respond(embed=embed)
+
+    @slash_command(name="nowplaying", description="Shows the currently playing song")
+    async def nowplaying(self, ctx):
+        state = self.states.get(ctx.guild.id)
+        
+        if state is None or state.current is None:
+            await ctx.respond("❌ Nothing is currently playing")
+            return
+        
+        track = state.current
+        duration_str = self._format_duration(track.duration)
+        
+        embed = discord.Embed(
+            title="🎵 Now Playing",
+            description=f"**{track.title}**",
+            color=discord.Color.green()
+        )
+        embed.add_field(name="Duration", value=duration_str, inline=True)
+        embed.add_field(name="Requested by", value=track.requester, inline=True)
+        embed.add_field(name="Loop", value="🔁 Enabled" if state.loop else "➡️ Disabled", inline=True)
+        embed.add_field(name="URL", value=f"[Click here]({track.webpage_url})", inline=False)
+        
+        await ctx.respond(embed=embed)
+
+    @slash_command(name="clear", description="Clears the entire queue")
+    async def clear(self, ctx):
+        state = self.states.get(ctx.guild.id)
+        
+        if state is None or not state.queue:
+            await ctx.respond("❌ The queue is already empty")
+            return
+        
+        queue_length = len(state.queue)
+        state.clear_queue()
+        
+        await ctx.respond(f"🗑️ Cleared {queue_length} song(s) from the queue")
+
+    @staticmethod
+    def _select_audio_url(info):
+        """Get audio URL and its codec with multiple fallback methods"""
+        audio_url = None
+        acodec = None
+        
+        if 'url' in info:
+            audio_url = info['url']
+            acodec = info.get('acodec')
+        
+        elif 'formats' in info and info['formats']:
+            formats = info['formats']
+            
+            audio_formats = [f for f in formats 
+                           if f.get('acodec') != 'none' 
+                           and f.get('vcodec') == 'none'
+                           and f.get('url')]
+            
+            if audio_formats:
+                # Pick best audio quality
+                audio_formats.sort(key=lambda x: x.get('abr', 0) or 0, reverse=True)
+                audio_url = audio_formats[0]['url']
+                acodec = audio_formats[0].get('acodec')
+            else:
+                # Fallback: any format with audio
+                formats_with_audio = [f for f in formats 
+                                    if f.get('acodec') != 'none' 
+                                    and f.get('url')]
+                
+                if formats_with_audio:
+                    audio_url = formats_with_audio[0]['url']
+                    acodec = formats_with_audio[0].get('acodec')
+        
+        if not audio_url and 'requested_formats' in info:
+            for fmt in info['requested_formats']:
+                if fmt.get('url'):
+                    audio_url = fmt['url']
+                    acodec = fmt.get('acodec')
+                    break
+        
+        return audio_url, acodec
+
+    @slash_command(name="musicstats", description="Shows music cache statistics")
+    @commands.is_owner()
+    async def musicstats(self, ctx):
+        stats = self.cache.stats()
+        
+        embed = discord.Embed(
+            title="📊 Music Stats",
+            color=discord.Color.blue()
+        )
+        embed.add_field(name="Search cache", value=self._format_cache_stats(stats['queries']), inline=False)
+        embed.add_field(name="Song cache", value=self._format_cache_stats(stats['songs']), inline=False)
+        embed.add_field(
+            name="Extractors",
+            value=" | ".join(f"{key.replace('_', ' ').capitalize()}: {value}" for key, value in self.extractor.stats().items()),
+            inline=False
+        )
+        if self.audio_cache:
+            embed.add_field(
+                name="Audio cache",
+                value=" | ".join(f"{key.capitalize()}: {value}" for key, value in self.audio_cache.stats().items()),
+                inline=False
+            )
+        ffmpeg = self.ffmpeg.stats()
+        embed.add_field(
+            name="FFmpeg",
+            value=(
+                f"Running: {ffmpeg['active']}/{ffmpeg['max']} | Peak: {ffmpeg['peak']} | Started: {ffmpeg['started']} | "
+                f"Restarts: {ffmpeg['restarts']} | Rejected: {ffmpeg['rejected']} | "
+                f"CPU: {ffmpeg['cpu_seconds']}s | RSS: {ffmpeg['rss_mb']} MB"
+            ),
+            inline=False
+        )
+        if self.sessions:
+            sessions = self.sessions.stats()
+            embed.add_field(
+                name="Saved sessions",
+                value=(
+                    f"Playing: {sessions['playing']} | Pending writes: {sessions['pending']} | "
+                    f"Flushes: {sessions['flushes']} | Rows written: {sessions['rows_written']}"
+                ),
+                inline=False
+            )
+        inactivity = self.inactivity.stats()
+        embed.add_field(
+            name="Voice sessions",
+            value=f"Tracked: {inactivity['tracked']} | Idle 1m+: {inactivity['idle']} | Timed out: {inactivity['expired']}",
+            inline=False
+        )
+        embed.add_field(
+            name="Stream URLs",
+            value=f"Fresh: {stats['stream_hits']} | Expired: {stats['stream_misses']} | Hit rate: {stats['stream_hit_rate']:.0%}",
+            inline=False
+        )
+        
+        await ctx.respond(embed=embed, ephemeral=True)
+
+    @staticmethod
+    def _format_cache_stats(stats):
+        return (
+            f"Entries: {stats['size']}/{stats['maxsize']} | Hits: {stats['hits']} | "
+            f"Misses: {stats['misses']} | Hit rate: {stats['hit_rate']:.0%} | Evicted: {stats['evictions']}"
+        )
+
+    def _format_duration(self, seconds):
+        """Format duration in seconds to MM:SS or HH:MM:SS"""
+        if not seconds:
+            return "Unknown"
+        
+        hours = seconds // 3600
+        minutes = (seconds % 3600) // 60
+        secs = seconds % 60
+        
+        if hours > 0:
+            return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+        else:
+            return f"{minutes:02d}:{secs:02d}"
+
+    async def _disconnect_idle(self, guild_ids):
+        """Disconnect, in one batch, every guild that saw no activity for 5 minutes"""
+        async def disconnect(guild_id):
+            state = self.states.get(guild_id)
+            player = self._voice_client(state) if state else None
+            
+            # Still playing a long song, check again after another timeout
+            if player and (player.is_playing() or player.is_paused()):
+                self.inactivity.touch(guild_id)
+                return
+            
+            self._drop_state(guild_id)
+            if player and player.is_connected():
+                await player.disconnect()
+                
+                guild = self.bot.get_guild(guild_id)
+                if guild and guild.system_channel:
+                    await self.outbound.send(guild.system_channel, "👋 Disconnected due to 5 minutes of inactivity")
+        
+        results = await asyncio.gather(*(disconnect(guild_id) for guild_id in guild_ids), return_exceptions=True)
+        for guild_id, result in zip(guild_ids, results):
+            if isinstance(result, Exception):
+                print(f"Error in inactivity check for guild {guild_id}: {result}")
+
+    async def warmup(self):
+        """Loads the music cache, starts the extractor workers and resumes saved sessions once the bot is ready"""
+        loads = [self.cache.load(), self.extractor.warm()]
+        if self.sessions:
+            loads.append(self.sessions.load())
+        await asyncio.gather(*loads)
+        if self.sessions:
+            self._restore_task = asyncio.create_task(self._restore_sessions())
+
+    async def _restore_sessions(self):
+        """Rejoins every guild that was playing when the bot last stopped, a few at a time"""
+        await self.bot.wait_until_ready()
+        saved = await self.sessions.saved()
+        if not saved:
+            return
+        
+        slots = asyncio.Semaphore(self.RESTORE_CONCURRENCY)
+        
+        async def restore(session):
+            async with slots:
+                return await self._restore_session(session)
+        
+        start = time.perf_counter()
+        results = await asyncio.gather(*(restore(session) for session in saved), return_exceptions=True)
+        restored = 0
+        for session, result in zip(saved, results):
+            if isinstance(result, Exception):
+                print(f"Error restoring music session for guild {session.guild_id}: {type(result).__name__}: {result}")
+                self.sessions.drop(session.guild_id)
+            elif result:
+                restored += 1
+        print(f"Restored {restored}/{len(saved)} music sessions in {time.perf_counter() - start:.1f}s")
+
+    async def _restore_session(self, session):
+        guild = self.bot.get_guild(session.guild_id)
+        if guild is None:
+            # Served by another cluster, or the bot was removed from it
+            return False
+        channel = guild.get_channel(session.voice_channel_id)
+        if guild.id in self.states or guild.voice_client is not None or channel is None:
+            # Someone started playing before the restore got to this guild, or the channel is gone
+            if guild.id not in self.states:
+                self.sessions.drop(guild.id)
+            return False
+        
+        vc = await channel.connect()
+        if guild.id in self.states:
+            # A /play got in while the bot was connecting, its queue wins
+            return False
+        state = self._state(guild.id)
+        state.voice_client = vc
+        state.text_channel_id = session.text_channel_id
+        state.loop = session.loop
+        # Stream URLs are kept as they were, _refresh_track re-resolves the expired ones right before they play
+        for data in session.queue:
+            state.enqueue(Track.from_snapshot(data))
+        if session.current:
+            state.post('resume', (Track.from_snapshot(session.current), session.position))
+        else:
+            state.post('enqueue')
+        self.inactivity.touch(guild.id)
+        return True
+
+    async def shutdown(self):
+        """Saves every session while the voice clients are still connected, leaving them for the next start"""
+        if self._restore_task:
+            self._restore_task.cancel()
+        if self.sessions:
+            await self.sessions.shutdown()
+
+    def cog_unload(self):
+        """Cleanup when cog is unloaded"""
+        if self._restore_task:
+            self._restore_task.cancel()
+        # Saved first, so dropping the in-memory states below keeps the sessions for the next start
+        if self.sessions:
+            self.sessions.close()
+        for guild_id in list(self.states):
+            self._drop_state(guild_id)
+        self.inactivity.stop()
+        if self.audio_cache:
+            self.audio_cache.close()
+        self.search.close()
+        self.extractor.close()
+
+def setup(bot):
+    bot.add_cog(MusicPlayer(bot))
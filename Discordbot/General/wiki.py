@@ -1,33 +1,118 @@
-import discord
-from discord.ext import commands
-from discord.commands import slash_command
-import wikipedia
-
-class wikisearch(commands.Cog): 
-
-    def __init__(self, bot): 
-        self.bot = bot
-        
-    @slash_command(name='wikisearch', description="Searches wikipedia.")
-    @commands.cooldown(1, 5, commands.BucketType.user) 
-    async def wikisearch(self, ctx, query: str):
-        print(f"Hold on! Searching...")
-        try:
-            page = wikipedia.page(query)
-            snippet = page.summary[:1900] + "..." if len(page.summary) > 1900 else page.summary
-            wikipedia_embed = discord.Embed(
-                title=page.title,
-                description=snippet,
-            )
-
-            wikipedia_embed.set_footer(text=page.url)  
-            await ctx.respond(embed=wikipedia_embed)
-        except wikipedia.exceptions.DisambiguationError as e:
-            await ctx.respond(f"Multiple results found. Please be more specific with your query")
-        except wikipedia.exceptions.PageError as e:
-            await ctx.respond(f"No results found for '{query}'")
-        except Exception as e:
-            await ctx.respond(f"An error occurred while fetching the Wikipedia page: {e}")
-
-def setup(bot): 
+import asyncio
+import os
+import discord
+from discord.ext import commands
+from discord.commands import slash_command, Option
+from Utils.wiki_client import WikiClient, PageNotFound, DisambiguationError
+from Utils.title_index import TitleIndex
+
+
+async def title_autocomplete(ctx: discord.AutocompleteContext):
+    """Answers from the local title index only, so it always fits in the autocomplete window"""
+    return ctx.cog.titles.search(ctx.value or "")
+
+
+class DisambiguationView(discord.ui.View):
+    """Dropdown of the articles a disambiguation page links to"""
+
+    def __init__(self, cog, options):
+        super().__init__(timeout=120)
+        self.cog = cog
+        self.options = options[:25]  # Discord allows 25 options per select menu
+
+        select = discord.ui.Select(
+            placeholder="Pick the article you meant",
+            options=[discord.SelectOption(label=title[:100], value=str(i)) for i, title in enumerate(self.options)]
+        )
+        select.callback = self.pick
+        self.add_item(select)
+
+    async def pick(self, interaction):
+        title = self.options[int(interaction.data['values'][0])]
+        await interaction.response.defer()
+        try:
+            page = await self.cog.lookup(title)
+            await interaction.edit_original_response(content=None, embed=self.cog.page_embed(page), view=None)
+        except DisambiguationError as e:
+            await interaction.edit_original_response(
+                content=f"**{title}** is ambiguous too, pick one:", view=DisambiguationView(self.cog, e.options)
+            )
+        except PageNotFound:
+            await interaction.edit_original_response(content=f"No results found for '{title}'", view=None)
+        except Exception as e:
+            await interaction.edit_original_response(
+                content=f"An error occurred while fetching the Wikipedia page: {e}", view=None
+            )
+
+class wikisearch(commands.Cog): 
+    REQUIRED_INTENTS = ('guilds',)
+
+    def __init__(self, bot): 
+        self.bot = bot
+        self.client = WikiClient()
+        # Titles for autocomplete: everything resolved so far, plus WIKI_TITLE_INDEX if set
+        self.titles = TitleIndex()
+        self._merge_task = None
+
+    @slash_command(name='wikisearch', description="Searches wikipedia.")
+    @commands.cooldown(1, 5, commands.BucketType.user) 
+    async def wikisearch(self, ctx, query: str = Option(description="Article to look up", autocomplete=title_autocomplete)):
+        print(f"Hold on! Searching...")
+        await ctx.defer()
+        try:
+            page = await self.lookup(query)
+            await ctx.respond(embed=self.page_embed(page))
+        except DisambiguationError as e:
+            await ctx.respond(
+                f"Multiple results found for **{e.title}**, pick one:", view=DisambiguationView(self, e.options)
+            )
+        except PageNotFound as e:
+            await ctx.respond(f"No results found for '{query}'")
+        except Exception as e:
+            await ctx.respond(f"An error occurred while fetching the Wikipedia page: {e}")
+
+    async def lookup(self, query):
+        """Looks up a page and feeds every title it learns into the autocomplete index"""
+        try:
+            page = await self.client.lookup(query)
+        except DisambiguationError as e:
+            for title in e.options:
+                self.titles.add(title)
+            self._merge_titles()
+            raise
+        self.titles.add(page['title'])
+        self._merge_titles()
+        return page
+
+    def _merge_titles(self):
+        """Folds recently added titles into the big sorted array on a worker thread, one merge at a time"""
+        if self.titles.needs_merge and (self._merge_task is None or self._merge_task.done()):
+            self._merge_task = asyncio.create_task(asyncio.to_thread(self.titles.add_many))
+
+    @staticmethod
+    def page_embed(page):
+        summary = page['summary']
+        snippet = summary[:1900] + "..." if len(summary) > 1900 else summary
+        wikipedia_embed = discord.Embed(
+            title=page['title'],
+            description=snippet,
+        )
+
+        wikipedia_embed.set_footer(text=page['url'])  
+        return wikipedia_embed
+
+    async def warmup(self):
+        """Loads WIKI_TITLE_INDEX into the autocomplete index"""
+        path = os.getenv('WIKI_TITLE_INDEX')
+        if path and not len(self.titles):
+            try:
+                count = await asyncio.to_thread(self.titles.load, path)
+                print(f"Loaded {count} Wikipedia titles for autocomplete")
+            except OSError as e:
+                print(f"Could not load WIKI_TITLE_INDEX: {e}")
+
+    def cog_unload(self):
+        self.bot.loop.create_task(self.client.close())
+
+def setup(bot): 
     bot.add_cog(wikisearch(bot))
\ No newline at end of file
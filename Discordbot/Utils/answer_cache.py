@@ -0,0 +1,76 @@
+import time
+from Utils.cache import TTLCache, normalise_query, trim_table
+
+
+def normalise_question(question):
+    """Case, whitespace and trailing punctuation differences ask the same question"""
+    return normalise_query(question).rstrip('?!. ')
+
+
+class AnswerCache:
+    """Normalised question -> generated answer, LRU with a TTL, optionally kept in sqlite across restarts"""
+
+    def __init__(self, db=None, maxsize=1024, ttl=86400):
+        self.answers = TTLCache(maxsize=maxsize, ttl=ttl)  # question -> (answer, seconds it took to generate)
+        self.db = db
+        self.saved_seconds = 0.0
+        self.coalesced = 0
+        self._writes = 0
+        self._loaded = False
+
+    async def load(self):
+        """Creates the table and warms the cache from the database, once"""
+        if self.db is None or self._loaded:
+            return
+        self._loaded = True
+
+        await self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS askbot_answers (
+                question TEXT PRIMARY KEY,
+                answer TEXT NOT NULL,
+                latency REAL NOT NULL,
+                expires REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS askbot_answers_expires ON askbot_answers (expires);
+        """)
+        await self.db.run(trim_table, 'askbot_answers', self.answers.maxsize)
+
+        # Newest first, inserted in reverse so the most recently stored answers end up at the hot end of the LRU
+        rows = await self.db.fetchall(
+            'SELECT question, answer, latency, expires FROM askbot_answers ORDER BY expires DESC LIMIT ?',
+            (self.answers.maxsize,)
+        )
+        for question, answer, latency, expires in reversed(rows):
+            self.answers.set(question, (answer, latency), expires_at=expires)
+
+    def get(self, key):
+        """Returns the cached answer for a normalised question, counting the generation time it saved"""
+        entry = self.answers.get(key)
+        if entry is None:
+            return None
+        answer, latency = entry
+        self.saved_seconds += latency
+        return answer
+
+    def set(self, key, answer, latency):
+        self.answers.set(key, (answer, latency))
+        if self.db is None or not self._loaded:
+            return
+
+        params = (key, answer, latency, time.time() + self.answers.ttl)
+
+        def _write(conn):
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO askbot_answers (question, answer, latency, expires) VALUES (?, ?, ?, ?)',
+                    params
+                )
+
+        # Write-behind, the command never waits on sqlite
+        self.db.submit(_write)
+        self._writes += 1
+        if self._writes % self.answers.maxsize == 0:
+            self.db.submit(trim_table, 'askbot_answers', self.answers.maxsize)
+
+    def stats(self):
+        return {**self.answers.stats(), 'saved_seconds': round(self.saved_seconds, 1), 'coalesced': self.coalesced}
@@ -0,0 +1,152 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+
+class AudioCache:
+    """Disk cache of Opus encoded tracks, filled in the background once a track has been played often enough"""
+
+    def __init__(self, directory, max_bytes=2 * 1024**3, threshold=3, max_duration=900, max_jobs=2, max_counts=10000):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.threshold = threshold
+        # Long videos (mixes, streams) would push everything else out of the cache
+        self.max_duration = max_duration
+        self.max_counts = max_counts
+        self._counts = OrderedDict()  # video_id -> plays, only for tracks not cached yet
+        self._files = OrderedDict()  # video_id -> file size, least recently played first
+        self._jobs = {}  # video_id -> task encoding it
+        self._job_slots = asyncio.Semaphore(max_jobs)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.encoded = 0
+        self.failed = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Rebuilds the LRU order from file modification times, which get() refreshes"""
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.part'):
+                # Other cluster processes may be encoding into the same directory, only clear abandoned files
+                if os.stat(path).st_mtime < time.time() - 3600:
+                    os.remove(path)
+            elif name.endswith('.opus'):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name[:-5], stat.st_size))
+
+        for _, video_id, size in sorted(entries):
+            self._files[video_id] = size
+            self.total_bytes += size
+        self._evict()
+
+    def __contains__(self, video_id):
+        return video_id in self._files
+
+    def path(self, video_id):
+        return os.path.join(self.directory, f"{video_id}.opus")
+
+    def get(self, video_id):
+        """Returns the cached file for a video, or None"""
+        if video_id not in self._files:
+            self.misses += 1
+            return None
+
+        path = self.path(video_id)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.total_bytes -= self._files.pop(video_id)
+            self.misses += 1
+            return None
+
+        self._files.move_to_end(video_id)
+        self.hits += 1
+        return path
+
+    def record_play(self, video_id, url, duration):
+        """Counts a play streamed from YouTube and starts encoding the track once it crosses the threshold"""
+        self.misses += 1
+        if video_id in self._files or video_id in self._jobs or not duration or duration > self.max_duration:
+            return
+
+        plays = self._counts.pop(video_id, 0) + 1
+        if plays < self.threshold:
+            self._counts[video_id] = plays
+            if len(self._counts) > self.max_counts:
+                self._counts.popitem(last=False)
+            return
+
+        self._jobs[video_id] = asyncio.create_task(self._encode(video_id, url))
+
+    async def _encode(self, video_id, url):
+        path = self.path(video_id)
+        part = f"{path}.{os.getpid()}.part"
+        process = None
+        try:
+            async with self._job_slots:
+                process = await asyncio.create_subprocess_exec(
+                    'ffmpeg', '-nostdin', '-loglevel', 'error',
+                    '-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5',
+                    '-i', url, '-vn', '-c:a', 'libopus', '-b:a', '128k', '-ar', '48000', '-ac', '2',
+                    '-f', 'ogg', part,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                _, stderr = await process.communicate()
+
+            if process.returncode != 0:
+                self.failed += 1
+                print(f"Audio cache encode failed for {video_id}: {stderr.decode(errors='replace').strip()}")
+                return
+
+            os.replace(part, path)
+            size = os.path.getsize(path)
+            self._files[video_id] = size
+            self.total_bytes += size
+            self.encoded += 1
+            self._evict()
+
+        except asyncio.CancelledError:
+            if process and process.returncode is None:
+                process.kill()
+            raise
+        except Exception as e:
+            self.failed += 1
+            print(f"Audio cache encode failed for {video_id}: {type(e).__name__}: {e}")
+        finally:
+            self._jobs.pop(video_id, None)
+            if os.path.exists(part):
+                os.remove(part)
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._files:
+            video_id, size = self._files.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path(video_id))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        return {
+            'files': len(self._files),
+            'megabytes': round(self.total_bytes / 1024**2, 1),
+            'hits': self.hits,
+            'misses': self.misses,
+            'encoding': len(self._jobs),
+            'encoded': self.encoded,
+            'failed': self.failed,
+            'evictions': self.evictions,
+        }
+
+    def close(self):
+        for task in self._jobs.values():
+            task.cancel()
@@ -0,0 +1,57 @@
+import asyncio
+from Utils.cache import TTLCache
+
+
+def estimate_tokens(content):
+    """Rough token count of one history entry, about four characters per token, no API call"""
+    return sum(len(getattr(part, 'text', '') or '') for part in content.parts) // 4 + 1
+
+
+class Conversation:
+    """One chat session and the lock that keeps its turns in order"""
+
+    __slots__ = ('chat', 'lock')
+
+    def __init__(self, chat):
+        self.chat = chat
+        self.lock = asyncio.Lock()
+
+
+class ChatSessions:
+    """Opt-in conversations keyed by channel or user, bounded in count, idle time, turns and tokens"""
+
+    def __init__(self, max_sessions=5000, idle_timeout=1800, max_turns=20, token_budget=8000):
+        # Touched on every turn, so idle conversations expire and the LRU caps how many are kept
+        self.sessions = TTLCache(maxsize=max_sessions, ttl=idle_timeout)
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.trimmed = 0
+
+    def get(self, key, model):
+        """Returns the conversation for a key, starting a new one on model if it expired or never existed"""
+        conversation = self.sessions.get(key)
+        if conversation is None:
+            conversation = Conversation(model.start_chat(history=[]))
+        self.sessions.set(key, conversation)
+        return conversation
+
+    def trim(self, conversation):
+        """Drops the oldest question/answer pairs until the history fits the turn and token budgets"""
+        history = conversation.chat.history
+        tokens = sum(estimate_tokens(content) for content in history)
+        start = 0
+        while len(history) - start > 2 and (
+            (len(history) - start) // 2 > self.max_turns or tokens > self.token_budget
+        ):
+            tokens -= estimate_tokens(history[start]) + estimate_tokens(history[start + 1])
+            start += 2
+
+        if start:
+            conversation.chat.history = history[start:]
+            self.trimmed += start // 2
+
+    def forget(self, key):
+        return self.sessions.pop(key) is not None
+
+    def stats(self):
+        return {**self.sessions.stats(), 'trimmed': self.trimmed}
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import multiprocessing
+import time
+import urllib.request
+
+GATEWAY_BOT_URL = 'https://discord.com/api/v10/gateway/bot'
+IDENTIFY_INTERVAL = 5.5  # Discord allows one IDENTIFY per 5 seconds
+
+
+def recommended_shard_count(token):
+    """Asks Discord how many shards this bot should run"""
+    request = urllib.request.Request(
+        GATEWAY_BOT_URL,
+        headers={'Authorization': f"Bot {token}", 'User-Agent': 'DiscordBot (discordbot, 1.0)'}
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)['shards']
+
+
+def shard_ranges(shard_count, clusters):
+    """Splits shard ids into contiguous, nearly equal ranges, one per cluster"""
+    clusters = max(1, min(clusters, shard_count))
+    size, extra = divmod(shard_count, clusters)
+    ranges, start = [], 0
+    for i in range(clusters):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+def identify_hook(lock):
+    """before_identify_hook that serialises IDENTIFY across every cluster process through one shared lock"""
+    async def before_identify_hook(shard_id, *, initial=False):
+        loop = asyncio.get_running_loop()
+        # The timeout covers a cluster that died while holding the lock
+        acquired = await loop.run_in_executor(None, lock.acquire, True, IDENTIFY_INTERVAL * 4)
+        if acquired:
+            # Held for the identify window, then handed to the next shard in whichever process is waiting
+            loop.call_later(IDENTIFY_INTERVAL, lock.release)
+        else:
+            # Still spaced like py-cord's own hook, identifying straight away is what the lock is there to prevent
+            print(f"Shard {shard_id} timed out waiting for the identify lock, waiting {IDENTIFY_INTERVAL}s instead")
+            await asyncio.sleep(IDENTIFY_INTERVAL)
+
+    return before_identify_hook
+
+
+def run_clusters(target, shard_count, clusters, restart_delay=5):
+    """Runs target(cluster_id, shard_ids, shard_count, identify_lock) in one process per cluster, restarting crashes"""
+    context = multiprocessing.get_context('spawn')
+    identify_lock = context.Lock()
+    ranges = shard_ranges(shard_count, clusters)
+    processes = {}
+
+    def start(cluster_id):
+        process = context.Process(
+            target=target,
+            args=(cluster_id, ranges[cluster_id], shard_count, identify_lock),
+            name=f"cluster-{cluster_id}"
+        )
+        process.start()
+        processes[cluster_id] = process
+        print(f"Cluster {cluster_id} started (pid {process.pid}) with shards {ranges[cluster_id][0]}-{ranges[cluster_id][-1]}")
+
+    for cluster_id in range(len(ranges)):
+        start(cluster_id)
+
+    try:
+        while processes:
+            time.sleep(1)
+            for cluster_id, process in list(processes.items()):
+                if process.is_alive():
+                    continue
+                if process.exitcode == 0:
+                    del processes[cluster_id]
+                    continue
+                print(f"Cluster {cluster_id} exited with code {process.exitcode}, restarting in {restart_delay}s")
+                time.sleep(restart_delay)
+                start(cluster_id)
+    except KeyboardInterrupt:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join()
@@ -0,0 +1,74 @@
+import asyncio
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'users.db')
+
+_databases = {}
+
+
+class Database:
+    """One sqlite3 connection owned by a single worker thread, so queries never run on the event loop"""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        return self._conn
+
+    def _call(self, fn, *args):
+        return fn(self._connect(), *args)
+
+    def submit(self, fn, *args):
+        """Queues fn(conn, *args) on the database thread without waiting for it"""
+        return self._executor.submit(self._call, fn, *args)
+
+    async def run(self, fn, *args):
+        """Runs fn(conn, *args) on the database thread and returns its result"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, fn, *args)
+
+    async def execute(self, sql, params=()):
+        def _execute(conn):
+            with conn:
+                conn.execute(sql, params)
+        await self.run(_execute)
+
+    async def executemany(self, sql, rows):
+        def _executemany(conn):
+            with conn:
+                conn.executemany(sql, rows)
+        await self.run(_executemany)
+
+    async def executescript(self, script):
+        await self.run(lambda conn: conn.executescript(script))
+
+    async def fetchall(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def fetchone(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchone())
+
+    def close(self):
+        def _close(conn):
+            conn.close()
+            self._conn = None
+        if self._conn is not None:
+            self.submit(_close)
+        self._executor.shutdown(wait=True)
+        _databases.pop(os.path.abspath(self.path), None)
+
+
+def get_database(path=DEFAULT_PATH):
+    """Returns the shared Database for a file so every cog uses the same connection"""
+    path = os.path.abspath(path)
+    if path not in _databases:
+        _databases[path] = Database(path)
+    return _databases[path]
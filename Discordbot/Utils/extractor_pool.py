@@ -0,0 +1,175 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from Utils.metrics import REGISTRY
+
+# Each worker thread (or process) keeps one warm YoutubeDL, YoutubeDL is not thread safe
+_worker = threading.local()
+
+EXTRACT_WAIT = REGISTRY.histogram(
+    'discordbot_extractor_wait_seconds', 'Time an extraction waited for a free yt-dlp worker', ('kind',)
+)
+EXTRACT_SECONDS = REGISTRY.histogram(
+    'discordbot_extractor_seconds', 'Time a yt-dlp worker spent on an extraction', ('kind', 'outcome')
+)
+
+
+class ExtractorBusy(Exception):
+    """Raised when too many extractions are already waiting for a worker"""
+
+
+class ExtractionFailed(Exception):
+    """yt-dlp's DownloadError, re-raised as a plain exception so callers need not import yt-dlp"""
+
+
+def _init_worker(options):
+    # Imported here so only the workers pay for it, when warm() starts them after connecting
+    import yt_dlp as youtube_dl
+    _worker.download_error = youtube_dl.utils.DownloadError
+    _worker.ydl = youtube_dl.YoutubeDL(options)
+    # Playlists are only listed (id, title, duration), their videos are resolved one by one later
+    _worker.flat_ydl = youtube_dl.YoutubeDL({**options, 'noplaylist': False, 'extract_flat': 'in_playlist'})
+    # Instantiates the YouTube extractors up front instead of on the first request
+    _worker.ydl.get_info_extractor('Youtube')
+    _worker.flat_ydl.get_info_extractor('YoutubeTab')
+
+
+def _extract(url):
+    try:
+        info = _worker.ydl.extract_info(url, download=False)
+    except _worker.download_error as e:
+        raise ExtractionFailed(str(e)) from None
+    # Plain data only, so results can cross a process boundary
+    return _worker.ydl.sanitize_info(info)
+
+
+def _extract_playlist(url, start, end):
+    # Safe to change per call, every worker owns its YoutubeDL
+    _worker.flat_ydl.params['playlist_items'] = f"{start}-{end}"
+    try:
+        info = _worker.flat_ydl.extract_info(url, download=False)
+    except _worker.download_error as e:
+        raise ExtractionFailed(str(e)) from None
+    return _worker.flat_ydl.sanitize_info(info)
+
+
+def _warm(barrier):
+    if barrier is not None:
+        barrier.wait(timeout=30)
+
+
+class ExtractorPool:
+    """Fixed pool of warm YoutubeDL workers with backpressure and per-guild fairness"""
+
+    def __init__(self, options, size=4, max_pending=64, per_guild=2, timeout=60, processes=False):
+        self.options = options
+        self.size = size
+        self.max_pending = max_pending
+        self.per_guild = per_guild
+        self.timeout = timeout
+        self.processes = processes
+        self._slots = asyncio.Semaphore(size)
+        self._guilds = {}  # guild_id -> [semaphore, number of callers holding or waiting on it]
+        self.pending = 0
+        self.rejected = 0
+        self.completed = 0
+        self._warmed = False
+        self._executor = self._create_executor()
+
+    def _create_executor(self):
+        if self.processes:
+            # spawn instead of fork: the parent has the gateway's threads and event loop running
+            return ProcessPoolExecutor(
+                max_workers=self.size,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.options,)
+            )
+        return ThreadPoolExecutor(
+            max_workers=self.size,
+            thread_name_prefix="yt-dlp",
+            initializer=_init_worker,
+            initargs=(self.options,)
+        )
+
+    async def warm(self):
+        """Starts every worker so the first /play does not pay for YoutubeDL construction"""
+        if self._warmed:
+            return
+        self._warmed = True
+
+        loop = asyncio.get_running_loop()
+        barrier = None if self.processes else threading.Barrier(self.size)
+        await asyncio.gather(*(
+            loop.run_in_executor(self._executor, _warm, barrier) for _ in range(self.size)
+        ))
+
+    async def extract(self, url, guild_id=None):
+        """Returns the sanitized info dict for url, raises ExtractorBusy when the pool is saturated"""
+        return await self._run(guild_id, 'video', _extract, url)
+
+    async def extract_playlist(self, url, guild_id=None, start=1, end=100):
+        """Returns one page of a playlist with flat entries (id, url, title, duration)"""
+        return await self._run(guild_id, 'playlist', _extract_playlist, url, start, end)
+
+    async def _run(self, guild_id, kind, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ExtractorBusy()
+
+        self.pending += 1
+        queued = time.perf_counter()
+        guild = self._guilds.get(guild_id)
+        if guild is None:
+            guild = self._guilds[guild_id] = [asyncio.Semaphore(self.per_guild), 0]
+        guild[1] += 1
+        try:
+            # A guild may only hold per_guild places in the line for a worker
+            async with guild[0]:
+                await self._slots.acquire()
+                started = time.perf_counter()
+                EXTRACT_WAIT.labels(kind).observe(started - queued)
+                outcome = 'error'
+                try:
+                    future = self._submit(fn, *args)
+                    info = await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+                    outcome = 'ok'
+                except BrokenExecutor:
+                    # A worker process died, replace the pool for the next caller
+                    self._executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = self._create_executor()
+                    raise
+                finally:
+                    EXTRACT_SECONDS.labels(kind, outcome).observe(time.perf_counter() - started)
+                self.completed += 1
+                return info
+        finally:
+            self.pending -= 1
+            guild[1] -= 1
+            if guild[1] == 0:
+                self._guilds.pop(guild_id, None)
+
+    def _submit(self, fn, *args):
+        """Runs fn on a worker, its slot comes back when the worker is done rather than when the caller gives up"""
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'mode': 'process' if self.processes else 'thread',
+            'pending': self.pending,
+            'guilds_waiting': len(self._guilds),
+            'completed': self.completed,
+            'rejected': self.rejected,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,182 @@
+import asyncio
+import os
+import threading
+import discord
+
+STREAM_BEFORE_OPTIONS = '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5'
+PCM_OPTIONS = '-vn -ac 2 -ar 48000'
+OPUS_OPTIONS = '-vn'
+FRAME_SECONDS = 0.02  # discord audio frames are 20ms
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+class TranscodeCapacityError(Exception):
+    """Raised when every FFmpeg slot stays busy for longer than the wait timeout"""
+
+
+def process_usage(pid):
+    """Returns (cpu seconds, rss bytes) of a process from /proc, or None where /proc is unavailable"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # The command name may contain spaces, the fields we want come after its closing parenthesis
+            fields = f.read().rsplit(')', 1)[1].split()
+    except (OSError, IndexError):
+        return None
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    rss_bytes = int(fields[21]) * PAGE_SIZE
+    return cpu_seconds, rss_bytes
+
+
+class SupervisedSource(discord.AudioSource):
+    """Wraps an FFmpeg source, tracks the playback position and restarts FFmpeg from it if it dies mid-song"""
+
+    def __init__(self, supervisor, location, duration, opus, local, start=0):
+        self.supervisor = supervisor
+        self.location = location
+        self.duration = duration
+        self.opus = opus
+        self.local = local
+        self.start = start
+        self.frames = 0
+        self.restarts = 0
+        self.cpu_seconds = 0.0
+        self._released = False
+        self._inner = self._spawn(start)
+
+    @property
+    def position(self):
+        """Seconds into the song, the start offset plus the audio handed to the voice client so far"""
+        return self.start + self.frames * FRAME_SECONDS
+
+    def _spawn(self, seek):
+        before_options = '' if self.local else STREAM_BEFORE_OPTIONS
+        if seek:
+            before_options = f"-ss {seek:.2f} {before_options}"
+
+        if self.opus:
+            source = discord.FFmpegOpusAudio(
+                self.location, codec='copy', before_options=before_options, options=OPUS_OPTIONS
+            )
+        else:
+            source = discord.FFmpegPCMAudio(self.location, before_options=before_options, options=PCM_OPTIONS)
+        self.supervisor.started += 1
+        return source
+
+    def _died_early(self):
+        """True if FFmpeg exited with an error, or stopped well before the end of a song of known length"""
+        process = getattr(self._inner, '_process', None)
+        returncode = process.poll() if process else None
+        if returncode:
+            return True
+        return bool(self.duration) and self.position < self.duration - 5
+
+    def read(self):
+        data = self._inner.read()
+        if data:
+            self.frames += 1
+            return data
+
+        if self.restarts < self.supervisor.max_restarts and self._died_early():
+            # Runs on the voice player thread, so spawning FFmpeg here does not block the event loop
+            self.restarts += 1
+            self.supervisor.restarts += 1
+            print(f"FFmpeg stopped at {self.position:.0f}s of {self.duration}s, restarting from there")
+            self._record_usage()
+            self._inner.cleanup()
+            self._inner = self._spawn(self.position)
+            return self.read()
+
+        return b''
+
+    def is_opus(self):
+        return self._inner.is_opus()
+
+    def usage(self):
+        """(cpu seconds, rss bytes) of the FFmpeg process currently running, including earlier restarts' CPU"""
+        process = getattr(self._inner, '_process', None)
+        usage = process_usage(process.pid) if process else None
+        if usage is None:
+            return self.cpu_seconds, 0
+        return self.cpu_seconds + usage[0], usage[1]
+
+    def _record_usage(self):
+        self.cpu_seconds = self.usage()[0]
+
+    def cleanup(self):
+        if self._released:
+            return
+        self._released = True
+        self._record_usage()
+        self._inner.cleanup()
+        self.supervisor._release(self)
+
+
+class FFmpegSupervisor:
+    """Caps concurrent FFmpeg processes, builds sources with tuned options and keeps per-process accounting"""
+
+    source_class = SupervisedSource
+
+    def __init__(self, max_processes=32, wait_timeout=10, max_restarts=3):
+        self.max_processes = max_processes
+        self.wait_timeout = wait_timeout
+        self.max_restarts = max_restarts
+        self._slots = asyncio.Semaphore(max_processes)
+        self._active = set()
+        self._lock = threading.Lock()  # cleanup runs on voice player threads
+        self._loop = None
+        self.peak = 0
+        self.started = 0
+        self.restarts = 0
+        self.rejected = 0
+        self.finished_cpu_seconds = 0.0
+
+    async def create(self, location, duration=0, opus=False, local=False, start=0):
+        """Returns a SupervisedSource once a slot is free, raises TranscodeCapacityError after wait_timeout"""
+        self._loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.wait_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise TranscodeCapacityError()
+
+        try:
+            source = self.source_class(self, location, duration, opus, local, start)
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._active.add(source)
+            self.peak = max(self.peak, len(self._active))
+        return source
+
+    def _release(self, source):
+        with self._lock:
+            if source not in self._active:
+                return
+            self._active.discard(source)
+            self.finished_cpu_seconds += source.cpu_seconds
+        self._loop.call_soon_threadsafe(self._slots.release)
+
+    def stats(self):
+        with self._lock:
+            active = list(self._active)
+        cpu_seconds = self.finished_cpu_seconds
+        rss_bytes = 0
+        for source in active:
+            source_cpu, source_rss = source.usage()
+            cpu_seconds += source_cpu
+            rss_bytes += source_rss
+
+        return {
+            'active': len(active),
+            'max': self.max_processes,
+            'peak': self.peak,
+            'started': self.started,
+            'restarts': self.restarts,
+            'rejected': self.rejected,
+            'cpu_seconds': round(cpu_seconds, 1),
+            'rss_mb': round(rss_bytes / 1024**2, 1),
+        }
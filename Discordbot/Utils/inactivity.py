@@ -0,0 +1,77 @@
+import asyncio
+import heapq
+import time
+
+
+class InactivityManager:
+    """A single timer for every guild: last-activity timestamps plus a deadline heap with lazy deletion"""
+
+    def __init__(self, on_idle, timeout=300, interval=5):
+        # on_idle(guild_ids) is awaited with every guild whose timeout ran out during one tick
+        self.on_idle = on_idle
+        self.timeout = timeout
+        self.interval = interval
+        self._last_activity = {}  # guild_id -> monotonic time of the last touch
+        self._heap = []  # (deadline, guild_id), at most one entry per guild
+        self._in_heap = set()
+        self._task = None
+        self.expired = 0
+
+    def touch(self, guild_id):
+        """Records activity for a guild, O(1) while the guild already has a heap entry"""
+        now = time.monotonic()
+        self._last_activity[guild_id] = now
+        if guild_id not in self._in_heap:
+            self._in_heap.add(guild_id)
+            heapq.heappush(self._heap, (now + self.timeout, guild_id))
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def discard(self, guild_id):
+        """Stops tracking a guild, its heap entry is dropped when it reaches the top"""
+        self._last_activity.pop(guild_id, None)
+
+    def _pop_expired(self, now):
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, guild_id = heapq.heappop(self._heap)
+            last_activity = self._last_activity.get(guild_id)
+
+            if last_activity is None:
+                self._in_heap.discard(guild_id)
+            elif last_activity + self.timeout > now:
+                # Touched since this entry was pushed, move it to the real deadline
+                heapq.heappush(self._heap, (last_activity + self.timeout, guild_id))
+            else:
+                self._in_heap.discard(guild_id)
+                del self._last_activity[guild_id]
+                expired.append(guild_id)
+        return expired
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            expired = self._pop_expired(time.monotonic())
+            if not expired:
+                continue
+
+            self.expired += len(expired)
+            try:
+                await self.on_idle(expired)
+            except Exception as e:
+                print(f"Error handling {len(expired)} idle guild(s): {type(e).__name__}: {e}")
+
+    def stats(self, idle_after=60):
+        """Guild counts, idle meaning no activity for idle_after seconds"""
+        now = time.monotonic()
+        return {
+            'tracked': len(self._last_activity),
+            'idle': sum(1 for last in self._last_activity.values() if now - last >= idle_after),
+            'heap_size': len(self._heap),
+            'expired': self.expired,
+        }
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,62 @@
+import os
+import discord
+
+# base intents, whether members are cached, message cache size, and whether to chunk every guild on startup
+PROFILES = {
+    # Only what the loaded cogs declare, nothing cached beyond that
+    'minimal': {'base': discord.Intents.none, 'cache_members': False, 'max_messages': None, 'chunk': False},
+    # Discord's default intents, bounded message cache, members cached as the intents allow
+    'default': {'base': discord.Intents.default, 'cache_members': True, 'max_messages': 1000, 'chunk': False},
+    # The old Intents.all() setup, including presences and chunking every guild's member list
+    'all': {'base': discord.Intents.all, 'cache_members': True, 'max_messages': 1000, 'chunk': True},
+}
+
+
+def required_intents(declared):
+    """Union of the REQUIRED_INTENTS each extension's cogs declare, guilds always included"""
+    required = {'guilds'}
+    for intents in declared:
+        required.update(intents)
+    return required
+
+
+def client_options(required, profile=None):
+    """Keyword arguments for discord.Bot: intents, member cache flags, message cache size and chunking"""
+    profile = profile or os.getenv('INTENTS_PROFILE', 'minimal')
+    if profile not in PROFILES:
+        raise ValueError(f"INTENTS_PROFILE must be one of {', '.join(PROFILES)}, not {profile!r}")
+    settings = PROFILES[profile]
+
+    intents = settings['base']()
+    for name in required:
+        setattr(intents, name, True)
+
+    if settings['cache_members']:
+        member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+    else:
+        # Members still arrive with every interaction, they are just not kept afterwards
+        member_cache_flags = discord.MemberCacheFlags.none()
+        if intents.members:
+            member_cache_flags.joined = True
+
+    max_messages = settings['max_messages']
+    if os.getenv('MAX_MESSAGES'):
+        max_messages = int(os.getenv('MAX_MESSAGES')) or None
+
+    return {
+        'intents': intents,
+        'member_cache_flags': member_cache_flags,
+        'max_messages': max_messages,
+        # Requesting member chunks needs the members intent, and is only worth it where a cog needs the full list
+        'chunk_guilds_at_startup': settings['chunk'] and intents.members,
+    }
+
+
+def describe(options):
+    """One line summary of client_options() for the startup log"""
+    enabled = sorted(name for name, value in options['intents'] if value)
+    cached = sorted(name for name, value in options['member_cache_flags'] if value)
+    return (
+        f"Intents: {', '.join(enabled)} | member cache: {', '.join(cached) or 'off'} | "
+        f"message cache: {options['max_messages'] or 'off'} | chunking: {options['chunk_guilds_at_startup']}"
+    )
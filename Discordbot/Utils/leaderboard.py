@@ -0,0 +1,37 @@
+from bisect import bisect_left, insort
+
+
+class GuildLeaderboard:
+    """XP of one guild's members, plus the same entries kept sorted so ranks and pages never need a query"""
+
+    __slots__ = ('xp', '_ranked')
+
+    def __init__(self, rows=()):
+        self.xp = dict(rows)  # user_id -> xp
+        # (-xp, user_id) ascending, i.e. highest XP first and ties broken by user id
+        self._ranked = sorted((-xp, user_id) for user_id, xp in self.xp.items())
+
+    def __len__(self):
+        return len(self._ranked)
+
+    def get(self, user_id, default=0):
+        return self.xp.get(user_id, default)
+
+    def update(self, user_id, xp):
+        """Moves a member to their new position, a bisect and two list moves instead of a re-sort"""
+        old = self.xp.get(user_id)
+        if old is not None:
+            del self._ranked[bisect_left(self._ranked, (-old, user_id))]
+        self.xp[user_id] = xp
+        insort(self._ranked, (-xp, user_id))
+
+    def rank(self, user_id):
+        """1-based position of a member, or None if they have no XP yet"""
+        xp = self.xp.get(user_id)
+        if xp is None:
+            return None
+        return bisect_left(self._ranked, (-xp, user_id)) + 1
+
+    def top(self, offset=0, count=10):
+        """[(user_id, xp), ...] for ranks offset + 1 to offset + count"""
+        return [(user_id, -negative_xp) for negative_xp, user_id in self._ranked[offset:offset + count]]
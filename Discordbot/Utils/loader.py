@@ -0,0 +1,132 @@
+import ast
+import asyncio
+import os
+import time
+
+STARTED = time.perf_counter()
+
+
+def _declared_intents(tree):
+    """REQUIRED_INTENTS of every class defined at the top level of a parsed module"""
+    intents = set()
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        for statement in node.body:
+            if isinstance(statement, ast.Assign) and any(
+                isinstance(target, ast.Name) and target.id == 'REQUIRED_INTENTS' for target in statement.targets
+            ):
+                intents.update(ast.literal_eval(statement.value))
+    return intents
+
+
+def find_extensions(folders=("Events", "General")):
+    """Returns [(name, intents its cogs declare)] for every .py in folders
+
+    The intents have to be known before the bot exists, so they are read from the source. Importing the
+    modules here would make bot.load_extension run every module body a second time.
+    """
+    found = []
+    for folder in folders:
+        for fn in sorted(os.listdir(f"./{folder}")):
+            if not fn.endswith(".py"):
+                continue
+            with open(os.path.join(folder, fn), encoding='utf-8') as f:
+                source = f.read()
+            try:
+                intents = _declared_intents(ast.parse(source))
+            except SyntaxError:
+                intents = set()  # load_extension reports it
+            found.append((f"{folder}.{fn[:-3]}", intents))
+    return found
+
+
+def load_extensions(bot, extensions, skip_failed=False):
+    """Loads the extensions and returns [(name, seconds)], each the module's import plus the cog's setup"""
+    timings = []
+    for name, _ in extensions:
+        start = time.perf_counter()
+        try:
+            bot.load_extension(name)
+        except Exception as e:
+            if not skip_failed:
+                raise
+            print(f"Skipping {name}: {type(e).__name__}: {e}")
+            continue
+        timings.append((name, time.perf_counter() - start))
+    return timings
+
+
+async def _timed(name, coro):
+    start = time.perf_counter()
+    try:
+        await coro
+        return name, time.perf_counter() - start, None
+    except Exception as e:
+        return name, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+
+def install_warmup(bot):
+    """Runs every cog's warmup() concurrently once the gateway connects, and reports time to ready"""
+    warmed = False
+    ready = False
+
+    @bot.listen('on_connect')
+    async def warm_cogs():
+        nonlocal warmed
+        if warmed:
+            return
+        warmed = True
+
+        warmups = [
+            _timed(name, cog.warmup()) for name, cog in bot.cogs.items() if hasattr(cog, 'warmup')
+        ]
+        start = time.perf_counter()
+        results = await asyncio.gather(*warmups)
+        print_table(
+            "Warmup (concurrent)", ("Cog", "ms", "error"),
+            [(name, f"{seconds * 1000:.0f}", error or "") for name, seconds, error in results],
+            f"wall {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+
+    @bot.listen('on_ready')
+    async def report_ready():
+        nonlocal ready
+        if not ready:
+            ready = True
+            print(f"Ready {time.perf_counter() - STARTED:.2f}s after start")
+
+
+def install_shutdown(bot):
+    """Runs every cog's shutdown() before the bot closes, py-cord does not unload cogs when it closes"""
+    close = bot.close
+    shut_down = False
+
+    async def shutdown_then_close():
+        nonlocal shut_down
+        if not shut_down:
+            shut_down = True
+            results = await asyncio.gather(*(
+                _timed(name, cog.shutdown()) for name, cog in bot.cogs.items() if hasattr(cog, 'shutdown')
+            ))
+            for name, _, error in results:
+                if error:
+                    print(f"Error shutting down {name}: {error}")
+        await close()
+
+    bot.close = shutdown_then_close
+
+
+def print_table(title, headers, rows, footer=""):
+    widths = [max(len(str(row[i])) for row in [headers, *rows]) for i in range(len(headers))]
+    print(title)
+    for row in [headers, *rows]:
+        print("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)).rstrip())
+    if footer:
+        print(footer)
+
+
+def print_load_timings(timings):
+    rows = [(name, f"{seconds * 1000:.0f}") for name, seconds in timings]
+    total = sum(seconds for _, seconds in timings)
+    print_table("Extensions", ("Extension", "load ms"), rows, f"total {total * 1000:.0f}ms")
@@ -0,0 +1,196 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+
+BOT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Upper bounds in seconds, the last bucket catches everything above 5s
+LAG_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float('inf'))
+
+
+class LagHistogram:
+    """Bucketed lag samples over the last windows * window seconds, in a ring of preallocated count rows"""
+
+    def __init__(self, window=60, windows=10, buckets=LAG_BUCKETS):
+        self.window = window
+        self.buckets = buckets
+        self.counts = [[0] * len(buckets) for _ in range(windows)]
+        self.maxima = [0.0] * windows
+        self.epochs = [-1] * windows  # which window each row currently holds
+
+    def _row(self, now):
+        epoch = int(now // self.window)
+        i = epoch % len(self.counts)
+        if self.epochs[i] != epoch:
+            row = self.counts[i]
+            for j in range(len(row)):
+                row[j] = 0
+            self.maxima[i] = 0.0
+            self.epochs[i] = epoch
+        return i
+
+    def record(self, lag, now=None):
+        i = self._row(time.monotonic() if now is None else now)
+        for j, bound in enumerate(self.buckets):
+            if lag <= bound:
+                self.counts[i][j] += 1
+                break
+        if lag > self.maxima[i]:
+            self.maxima[i] = lag
+
+    def _live_rows(self, now):
+        oldest = int(now // self.window) - len(self.counts) + 1
+        return [i for i, epoch in enumerate(self.epochs) if epoch >= oldest]
+
+    def summary(self, quantiles=(0.5, 0.9, 0.99), now=None):
+        """{'samples', 'max', 'p50', ...} where each percentile is the upper bound of the bucket it falls in"""
+        rows = self._live_rows(time.monotonic() if now is None else now)
+        totals = [sum(self.counts[i][j] for i in rows) for j in range(len(self.buckets))]
+        samples = sum(totals)
+        worst = max((self.maxima[i] for i in rows), default=0.0)
+        result = {'samples': samples, 'max': worst}
+        for q in quantiles:
+            value, seen = 0.0, 0
+            if samples:
+                for bound, count in zip(self.buckets, totals):
+                    seen += count
+                    if seen >= q * samples:
+                        value = min(bound, worst)
+                        break
+            result[f"p{q * 100:g}"] = value
+        return result
+
+
+class Offender:
+    __slots__ = ('where', 'task', 'stalls', 'total', 'worst', 'stack')
+
+    def __init__(self, where, task):
+        self.where = where
+        self.task = task
+        self.stalls = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.stack = ""
+
+
+class LoopMonitor:
+    """Samples event loop lag and, from a watchdog thread, grabs the loop thread's stack while it is stalled
+
+    The sampler sleeps for interval and records how late it woke up. The watchdog thread notices when
+    that heartbeat has not moved for longer than threshold, which means something is running on the
+    loop without awaiting, and captures the stack at that moment so the blocking call is in it.
+    """
+
+    def __init__(self, interval=0.1, threshold=0.25, max_offenders=50):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_offenders = max_offenders
+        self.histogram = LagHistogram()
+        self.offenders = {}  # where -> Offender
+        self.stalls = 0
+        self.captured = 0
+        self._heartbeat = time.monotonic()
+        self._capture = None  # (heartbeat, where, task, stack) written by the watchdog thread
+        self._loop = None
+        self._loop_thread = None
+        self._task = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._sample())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _sample(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - expected)
+            self.histogram.record(lag, now)
+            if lag >= self.threshold:
+                self._stalled(lag)
+
+    def _stalled(self, lag):
+        self.stalls += 1
+        capture, self._capture = self._capture, None
+        if capture is None:
+            # Shorter than the watchdog's polling gap, so there is no stack for it
+            where, task, stack = "unknown (no stack captured)", None, ""
+        else:
+            _, where, task, stack = capture
+
+        offender = self.offenders.get(where)
+        if offender is None:
+            if len(self.offenders) >= self.max_offenders:
+                del self.offenders[min(self.offenders.values(), key=lambda o: o.total).where]
+            offender = self.offenders[where] = Offender(where, task)
+        offender.stalls += 1
+        offender.total += lag
+        if lag >= offender.worst:
+            offender.worst = lag
+            offender.task = task
+            offender.stack = stack
+        print(f"Event loop stalled for {lag * 1000:.0f}ms in {where}")
+
+    def _watch(self):
+        captured_beat = None
+        while not self._stop.wait(self.threshold / 4):
+            beat = self._heartbeat
+            if beat == captured_beat or time.monotonic() - beat < self.interval + self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            captured_beat = beat
+            self.captured += 1
+            self._capture = (beat, *self._describe(frame))
+
+    def _describe(self, frame):
+        """(where, task name, formatted stack) for the frame the loop thread is currently executing"""
+        stack = traceback.extract_stack(frame)
+        # Everything up to the loop's callback dispatch is the same for every stall
+        starts = [i for i, entry in enumerate(stack) if entry.filename.endswith(os.path.join('asyncio', 'events.py'))]
+        if starts:
+            stack = stack[starts[-1] + 1:]
+        # The innermost frame in the bot's own code is the one to fix, library frames above it are the blocking call
+        ours = [
+            entry for entry in stack
+            if entry.filename.startswith(BOT_ROOT) and not entry.filename.endswith('loop_monitor.py')
+        ]
+        entry = ours[-1] if ours else stack[-1]
+        where = f"{os.path.relpath(entry.filename, BOT_ROOT) if ours else entry.filename} {entry.name}()"
+        try:
+            task = asyncio.current_task(self._loop)
+            task = task.get_name() if task is not None else None
+        except RuntimeError:
+            task = None
+        return where, task, "".join(traceback.format_list(stack[-12:]))
+
+    def worst_offenders(self, count=5):
+        return sorted(self.offenders.values(), key=lambda o: o.total, reverse=True)[:count]
+
+    def stats(self):
+        return {
+            **self.histogram.summary(),
+            'stalls': self.stalls,
+            'captured': self.captured,
+            'offenders': len(self.offenders),
+            'threshold': self.threshold,
+        }
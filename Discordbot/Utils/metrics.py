@@ -0,0 +1,161 @@
+import bisect
+import math
+
+# Seconds, from a cached reply to a slow yt-dlp extraction
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class CounterValue:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class HistogramValue:
+    """Observation counts per bucket in a list sized once, so observe() only increments numbers"""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    """One metric family, with a child per label value combination created on its first use"""
+
+    def __init__(self, kind, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._children = {}
+        self._default = None if self.labelnames else self._create()
+
+    def _create(self):
+        return HistogramValue(self.buckets) if self.kind == 'histogram' else CounterValue()
+
+    def labels(self, *values):
+        """The child for these label values, keep it around on hot paths to skip even the dict lookup"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._create()
+        return child
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def _samples(self):
+        if self._default is not None:
+            return [((), self._default)]
+        return list(self._children.items())
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.documentation}")
+        lines.append(f"# TYPE {self.name} {self.kind}")
+        for values, child in self._samples():
+            if self.kind == 'counter':
+                lines.append(f"{self.name}_total{_labels(self.labelnames, values)} {_format_value(child.value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), child.counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {child.count}")
+
+
+class CallbackMetric:
+    """A gauge or counter read from the bot when scraped, fn returns a number or [(label values, number)]"""
+
+    def __init__(self, kind, name, documentation, fn, labelnames=()):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def render(self, lines):
+        try:
+            samples = self.fn()
+        except Exception as e:
+            print(f"Error collecting metric {self.name}: {type(e).__name__}: {e}")
+            return
+        if not self.labelnames:
+            samples = [((), samples)]
+        suffix = '_total' if self.kind == 'counter' else ''
+        lines.append(f"# HELP {self.name} {self.documentation}")
+        lines.append(f"# TYPE {self.name} {self.kind}")
+        for values, value in samples:
+            lines.append(f"{self.name}{suffix}{_labels(self.labelnames, values)} {_format_value(value)}")
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        # Modules can be re-imported when an extension is reloaded, keep the family that has the data
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Metric('counter', name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Metric('histogram', name, documentation, labelnames, buckets))
+
+    def gauge_callback(self, name, documentation, fn, labelnames=()):
+        """Registers (or replaces, the callback usually closes over a cog) a gauge computed at scrape time"""
+        self._metrics[name] = CallbackMetric('gauge', name, documentation, fn, labelnames)
+
+    def counter_callback(self, name, documentation, fn, labelnames=()):
+        self._metrics[name] = CallbackMetric('counter', name, documentation, fn, labelnames)
+
+    def unregister(self, name):
+        self._metrics.pop(name, None)
+
+    def render(self):
+        """The Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics.values():
+            metric.render(lines)
+        lines.append('')
+        return '\n'.join(lines)
+
+
+REGISTRY = Registry()
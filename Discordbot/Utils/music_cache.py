@@ -0,0 +1,136 @@
+import json
+import re
+import time
+from Utils.cache import TTLCache, normalise_query, trim_table
+
+# googlevideo stream URLs carry their expiry as a unix timestamp, either as a query or a path parameter
+EXPIRE_PATTERN = re.compile(r'[?&/]expire[=/](\d+)')
+
+
+def stream_expiry(url, default_ttl=1800):
+    """Returns the unix time a stream URL stops working"""
+    match = EXPIRE_PATTERN.search(url or '')
+    if match:
+        return int(match.group(1))
+    return time.time() + default_ttl
+
+
+class MusicCache:
+    """Two tier cache: search query -> video id, and video id -> song info with its stream URL"""
+
+    def __init__(self, db=None, maxsize=2048, query_ttl=7 * 86400, info_ttl=86400, stream_margin=300):
+        self.queries = TTLCache(maxsize=maxsize * 4, ttl=query_ttl)
+        self.songs = TTLCache(maxsize=maxsize, ttl=info_ttl)
+        # A stream URL is only handed out if it outlives the song by this many seconds
+        self.stream_margin = stream_margin
+        self.db = db
+        self.stream_hits = 0
+        self.stream_misses = 0
+        self._writes = 0
+        self._loaded = False
+
+    async def load(self):
+        """Creates the tables and warms the cache from the database, once"""
+        if self.db is None or self._loaded:
+            return
+        self._loaded = True
+
+        await self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS music_queries (
+                query TEXT PRIMARY KEY,
+                video_id TEXT NOT NULL,
+                expires REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS music_songs (
+                video_id TEXT PRIMARY KEY,
+                info TEXT NOT NULL,
+                expires REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS music_queries_expires ON music_queries (expires);
+            CREATE INDEX IF NOT EXISTS music_songs_expires ON music_songs (expires);
+        """)
+        await self.db.run(self._trim)
+
+        # Every entry gets the same TTL, so the latest expiry is the latest stored. Those are read newest first
+        # and inserted in reverse, leaving the most recent at the hot end of the LRU
+        rows = await self.db.fetchall(
+            'SELECT query, video_id, expires FROM music_queries ORDER BY expires DESC LIMIT ?',
+            (self.queries.maxsize,)
+        )
+        for query, video_id, expires in reversed(rows):
+            self.queries.set(query, video_id, expires_at=expires)
+
+        rows = await self.db.fetchall(
+            'SELECT video_id, info, expires FROM music_songs ORDER BY expires DESC LIMIT ?',
+            (self.songs.maxsize,)
+        )
+        for video_id, info, expires in reversed(rows):
+            self.songs.set(video_id, json.loads(info), expires_at=expires)
+
+    def _trim(self, conn):
+        trim_table(conn, 'music_queries', self.queries.maxsize)
+        trim_table(conn, 'music_songs', self.songs.maxsize)
+
+    def _persist(self, sql, params):
+        """Write-behind: queued on the database thread, never awaited on the play path"""
+        def _write(conn):
+            with conn:
+                conn.execute(sql, params)
+
+        if self.db is not None and self._loaded:
+            self.db.submit(_write)
+            # Keeps the tables near the size of the cache, instead of every song ever played
+            self._writes += 1
+            if self._writes % self.songs.maxsize == 0:
+                self.db.submit(self._trim)
+
+    def get_video_id(self, query):
+        return self.queries.get(normalise_query(query))
+
+    def set_video_id(self, query, video_id):
+        query = normalise_query(query)
+        self.queries.set(query, video_id)
+        self._persist(
+            'INSERT OR REPLACE INTO music_queries (query, video_id, expires) VALUES (?, ?, ?)',
+            (query, video_id, time.time() + self.queries.ttl)
+        )
+
+    def get_song(self, video_id):
+        """Returns cached song info, with 'url' set to None when the stream URL is too close to expiring"""
+        song_info = self.songs.get(video_id)
+        if song_info is None:
+            return None
+
+        song_info = dict(song_info)
+        if self.is_fresh(song_info.get('url'), song_info.get('url_expires', 0), song_info.get('duration')):
+            self.stream_hits += 1
+        else:
+            song_info['url'] = None
+            self.stream_misses += 1
+        return song_info
+
+    def is_fresh(self, url, url_expires, duration, lead=0):
+        """True if the stream URL will still work for the whole song when it starts lead seconds from now"""
+        if not url:
+            return False
+        needed = lead + max(self.stream_margin, duration or 0)
+        return url_expires - needed > time.time()
+
+    def set_song(self, video_id, song_info):
+        song_info = {key: value for key, value in song_info.items() if key != 'requester'}
+        song_info['url_expires'] = stream_expiry(song_info.get('url'))
+        self.songs.set(video_id, song_info)
+        self._persist(
+            'INSERT OR REPLACE INTO music_songs (video_id, info, expires) VALUES (?, ?, ?)',
+            (video_id, json.dumps(song_info), time.time() + self.songs.ttl)
+        )
+
+    def stats(self):
+        stream_lookups = self.stream_hits + self.stream_misses
+        return {
+            'queries': self.queries.stats(),
+            'songs': self.songs.stats(),
+            'stream_hits': self.stream_hits,
+            'stream_misses': self.stream_misses,
+            'stream_hit_rate': self.stream_hits / stream_lookups if stream_lookups else 0.0,
+        }
@@ -0,0 +1,205 @@
+import asyncio
+import itertools
+import json
+import time
+
+INSERT_TRACK_SQL = 'INSERT OR REPLACE INTO music_queue (guild_id, seq, track) VALUES (?, ?, ?)'
+DELETE_TRACK_SQL = 'DELETE FROM music_queue WHERE guild_id = ? AND seq = ?'
+CLEAR_QUEUE_SQL = 'DELETE FROM music_queue WHERE guild_id = ?'
+DELETE_SESSION_SQL = 'DELETE FROM music_sessions WHERE guild_id = ?'
+UPSERT_SESSION_SQL = """
+    INSERT OR REPLACE INTO music_sessions
+        (guild_id, voice_channel_id, text_channel_id, loop, current, position, saved_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+class SavedSession:
+    __slots__ = ('guild_id', 'voice_channel_id', 'text_channel_id', 'loop', 'current', 'position', 'queue')
+
+    def __init__(self, guild_id, voice_channel_id, text_channel_id, loop, current, position):
+        self.guild_id = guild_id
+        self.voice_channel_id = voice_channel_id
+        self.text_channel_id = text_channel_id
+        self.loop = bool(loop)
+        self.current = json.loads(current) if current else None  # Track.snapshot() lists, not Tracks yet
+        self.position = position
+        self.queue = []
+
+
+class SessionStore:
+    """Music sessions written behind to sqlite, so a restart can pick every guild's queue back up
+
+    Queue changes are journaled as single row inserts and deletes, the rest of a session (current song,
+    position, loop flag, channels) as one row per guild rebuilt from the live state when it is flushed.
+    Nothing on the play path touches the database, it only appends to the pending list.
+    """
+
+    def __init__(self, db, flush_interval=2, position_interval=15):
+        self.db = db
+        self.flush_interval = flush_interval
+        # Playing guilds are saved this often even without changes, to keep their position close
+        self.position_interval = position_interval
+        self._ops = []  # (sql, params) in the order they happened
+        self._dirty = {}  # guild_id -> GuildPlayerState whose session row needs rewriting
+        self._playing = {}  # guild_id -> GuildPlayerState with a current song
+        self._task = None
+        self._ready = False
+        self._closed = False
+        self.flushes = 0
+        self.rows_written = 0
+
+    async def load(self):
+        """Creates the tables and starts the flush task, once"""
+        if self._ready:
+            return
+        self._ready = True
+        await self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS music_sessions (
+                guild_id INTEGER PRIMARY KEY,
+                voice_channel_id INTEGER NOT NULL,
+                text_channel_id INTEGER,
+                loop INTEGER NOT NULL DEFAULT 0,
+                current TEXT,
+                position REAL NOT NULL DEFAULT 0,
+                saved_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS music_queue (
+                guild_id INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                track TEXT NOT NULL,
+                PRIMARY KEY (guild_id, seq)
+            ) WITHOUT ROWID;
+        """)
+        self._task = asyncio.create_task(self._run())
+
+    async def saved(self):
+        """Every saved session with its queue, for resuming after a restart"""
+        def _read(conn):
+            sessions = {
+                row[0]: SavedSession(*row) for row in conn.execute(
+                    'SELECT guild_id, voice_channel_id, text_channel_id, loop, current, position FROM music_sessions'
+                )
+            }
+            for guild_id, track in conn.execute('SELECT guild_id, track FROM music_queue ORDER BY guild_id, seq'):
+                session = sessions.get(guild_id)
+                if session is not None:
+                    session.queue.append(json.loads(track))
+            return list(sessions.values())
+
+        return await self.db.run(_read)
+
+    def appended(self, guild_id, seq, track):
+        if not self._closed:
+            self._ops.append((INSERT_TRACK_SQL, (guild_id, seq, json.dumps(track.snapshot()))))
+
+    def popped(self, guild_id, seq):
+        if not self._closed:
+            self._ops.append((DELETE_TRACK_SQL, (guild_id, seq)))
+
+    def cleared(self, guild_id):
+        if not self._closed:
+            self._ops.append((CLEAR_QUEUE_SQL, (guild_id,)))
+
+    def touch(self, state):
+        if self._closed:
+            return
+        self._dirty[state.guild_id] = state
+        if state.current is not None:
+            self._playing[state.guild_id] = state
+        else:
+            self._playing.pop(state.guild_id, None)
+
+    def drop(self, guild_id):
+        """Forgets a guild's session, the bot left on purpose"""
+        self._dirty.pop(guild_id, None)
+        self._playing.pop(guild_id, None)
+        if not self._closed:
+            self._ops.append((CLEAR_QUEUE_SQL, (guild_id,)))
+            self._ops.append((DELETE_SESSION_SQL, (guild_id,)))
+
+    @staticmethod
+    def _session_row(state, now):
+        vc = state.voice_client
+        if vc is None or not vc.is_connected():
+            return None
+        if state.current is None and not state.queue:
+            return DELETE_SESSION_SQL, (state.guild_id,)
+        # The supervised FFmpeg source counts the audio frames it has played, pauses included
+        position = getattr(vc.source, 'position', 0) if state.current is not None else 0
+        text_channel_id = state.ctx.channel_id if state.ctx is not None else state.text_channel_id
+        current = json.dumps(state.current.snapshot()) if state.current is not None else None
+        return UPSERT_SESSION_SQL, (
+            state.guild_id, vc.channel.id, text_channel_id, int(state.loop), current, position, now
+        )
+
+    def _take_batch(self):
+        ops, self._ops = self._ops, []
+        dirty, self._dirty = self._dirty, {}
+        now = time.time()
+        for state in dirty.values():
+            row = self._session_row(state, now)
+            if row is not None:
+                ops.append(row)
+        return ops
+
+    @staticmethod
+    def _write(conn, ops):
+        # One transaction per flush, however many songs were queued and played since the last one
+        with conn:
+            for sql, group in itertools.groupby(ops, key=lambda op: op[0]):
+                conn.executemany(sql, [params for _, params in group])
+
+    async def flush(self):
+        ops = self._take_batch()
+        if not ops:
+            return
+        try:
+            await self.db.run(self._write, ops)
+        except Exception:
+            # Ahead of anything journaled since, so the next flush replays them in order
+            self._ops[:0] = ops
+            raise
+        self.flushes += 1
+        self.rows_written += len(ops)
+
+    async def _run(self):
+        last_positions = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if time.monotonic() - last_positions >= self.position_interval:
+                last_positions = time.monotonic()
+                self._dirty.update(self._playing)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error saving music sessions: {type(e).__name__}: {e}")
+
+    def stats(self):
+        return {
+            'playing': len(self._playing),
+            'pending': len(self._ops) + len(self._dirty),
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+        }
+
+    def _close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._dirty.update(self._playing)
+        ops = self._take_batch()
+        self._closed = True
+        return ops if self._ready else []
+
+    async def shutdown(self):
+        """Writes every session as it is now, before the bot's voice connections close, and ignores later changes"""
+        ops = self._close()
+        if ops:
+            await self.db.run(self._write, ops)
+
+    def close(self):
+        """Stops the flush task and queues the last changes, later calls (the cog dropping its states) are ignored"""
+        ops = self._close()
+        if ops:
+            self.db.submit(self._write, ops)
@@ -0,0 +1,135 @@
+import asyncio
+import sys
+from collections import deque
+
+
+class Track:
+    """One queued song. Slotted because long queues across many guilds hold a lot of these"""
+
+    __slots__ = ('url', 'url_expires', 'title', 'duration', 'video_id', 'requester', 'source', '_webpage_url', 'acodec')
+
+    def __init__(self, title, duration=0, video_id=None, requester=None, url=None, url_expires=0, webpage_url=None,
+                 acodec=None):
+        self.url = url
+        self.url_expires = url_expires
+        self.title = title
+        self.duration = int(duration or 0)
+        self.video_id = video_id
+        # The same few names request most songs, so they share one string object
+        self.requester = sys.intern(requester) if requester else None
+        # An FFmpeg source started early by prefetch
+        self.source = None
+        # Only stored when it cannot be rebuilt from the video id
+        self._webpage_url = None if video_id else webpage_url
+        # Codec of the stream URL, Opus streams skip the PCM decode and re-encode
+        self.acodec = acodec
+
+    @classmethod
+    def from_info(cls, song_info, requester=None):
+        return cls(
+            title=song_info.get('title', 'Unknown Title'),
+            duration=song_info.get('duration'),
+            video_id=song_info.get('video_id'),
+            requester=requester,
+            url=song_info.get('url'),
+            url_expires=song_info.get('url_expires', 0),
+            webpage_url=song_info.get('webpage_url'),
+            acodec=song_info.get('acodec')
+        )
+
+    def snapshot(self):
+        """The fields worth keeping across a restart, as a JSON-ready list"""
+        return [self.title, self.duration, self.video_id, self.requester, self._webpage_url, self.url,
+                self.url_expires, self.acodec]
+
+    @classmethod
+    def from_snapshot(cls, data):
+        title, duration, video_id, requester, webpage_url, url, url_expires, acodec = data
+        return cls(title, duration, video_id, requester, url, url_expires, webpage_url, acodec)
+
+    @property
+    def webpage_url(self):
+        if self.video_id:
+            return f"https://www.youtube.com/watch?v={self.video_id}"
+        return self._webpage_url
+
+    def cleanup(self):
+        """Kills the FFmpeg process prefetch may have started for this track"""
+        if self.source is not None:
+            self.source.cleanup()
+            self.source = None
+
+
+class GuildPlayerState:
+    """Everything the music cog knows about one guild, dropped as a whole when the bot leaves"""
+
+    __slots__ = (
+        'guild_id', 'voice_client', 'ctx', 'text_channel_id', 'queue', 'queue_seq', 'current', 'loop',
+        'prefetch_task', 'queue_version', 'events', 'worker', 'play_token', 'skip_pending', 'journal'
+    )
+
+    def __init__(self, guild_id, journal=None):
+        self.guild_id = guild_id
+        self.voice_client = None
+        # The latest music command, its followup webhook is used for playback messages
+        self.ctx = None
+        # Where playback messages go when there is no command to follow up, after a restart
+        self.text_channel_id = None
+        self.queue = deque()
+        # Sequence number of the next queued track, the first one in the queue is queue_seq - len(queue)
+        self.queue_seq = 0
+        self.current = None
+        self.loop = False
+        self.prefetch_task = None
+        # Bumped whenever the queue is cleared, so playlist ingestion can tell it should stop
+        self.queue_version = 0
+        # Playback events (enqueue, track_end, skip, stop, loop), consumed in order by the worker task
+        self.events = asyncio.Queue()
+        self.worker = None
+        # Identifies the playing source, so a late track_end from an older one is ignored
+        self.play_token = 0
+        self.skip_pending = False
+        # Utils.music_sessions.SessionStore, told about every change that should survive a restart
+        self.journal = journal
+
+    def post(self, event, value=None):
+        """Queues a playback event, O(1) and never blocks"""
+        self.events.put_nowait((event, value))
+
+    def enqueue(self, track):
+        self.queue.append(track)
+        if self.journal is not None:
+            self.journal.appended(self.guild_id, self.queue_seq, track)
+        self.queue_seq += 1
+
+    def next_track(self):
+        track = self.queue.popleft()
+        if self.journal is not None:
+            self.journal.popped(self.guild_id, self.queue_seq - len(self.queue) - 1)
+        return track
+
+    def changed(self):
+        """Marks the current song, loop flag or voice channel as changed"""
+        if self.journal is not None:
+            self.journal.touch(self)
+
+    def clear_queue(self):
+        """Empties the queue, stops the lookahead and kills any FFmpeg process it started early"""
+        self.queue_version += 1
+        for track in self.queue:
+            track.cleanup()
+        self.queue.clear()
+        if self.journal is not None:
+            self.journal.cleared(self.guild_id)
+
+        if self.prefetch_task:
+            self.prefetch_task.cancel()
+            self.prefetch_task = None
+
+    def reset(self):
+        """Clears the queue, the current song and the loop flag"""
+        self.clear_queue()
+        self.current = None
+        self.loop = False
+        self.skip_pending = False
+        self.changed()
@@ -0,0 +1,258 @@
+import asyncio
+import collections
+import os
+import time
+
+MESSAGE_LIMIT = 2000
+EMBEDS_PER_MESSAGE = 10
+EMBED_TOTAL_LIMIT = 6000
+
+_scheduler = None
+
+
+def parse_rate(value):
+    """'5/2' -> (5, 2.0): 5 requests per 2 seconds"""
+    limit, per = value.split('/')
+    return int(limit), float(per)
+
+
+class RateBucket:
+    """limit requests per `per` seconds, counted the way Discord does: a window opens with its first request"""
+
+    __slots__ = ('limit', 'per', 'remaining', 'reset_at')
+
+    SLACK = 0.05  # a window's requests reach Discord spread out, so the next one opens a little late
+
+    def __init__(self, limit, per):
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset_at = 0.0
+
+    def delay(self):
+        """Seconds until the next request may go out, 0 if it may go now"""
+        now = time.monotonic()
+        if now >= self.reset_at or self.remaining > 0:
+            return 0.0
+        return self.reset_at - now
+
+    def take(self):
+        now = time.monotonic()
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.per + self.SLACK
+        self.remaining -= 1
+
+    def full(self):
+        return time.monotonic() >= self.reset_at
+
+
+class Outgoing:
+    __slots__ = ('content', 'embeds', 'kwargs', 'future', 'message')
+
+    def __init__(self, content, embeds, kwargs, future, message=None):
+        self.content = content
+        self.embeds = embeds
+        self.kwargs = kwargs  # anything besides text and embeds (view, file, ephemeral...) is sent on its own
+        self.future = future
+        self.message = message  # set for an edit of this message instead of a new one
+
+
+class Route:
+    """One destination: a channel, or an interaction's followup webhook"""
+
+    __slots__ = ('target', 'buckets', 'priority', 'queue', 'task')
+
+    def __init__(self, target, *buckets):
+        self.target = target
+        self.buckets = buckets  # its own first, a request needs room in all of them
+        self.priority = collections.deque()  # command replies, sent before queue and never merged
+        self.queue = collections.deque()
+        self.task = None
+
+
+class OutboundScheduler:
+    """Sends bot messages through per-destination rate limit buckets and a global one
+
+    A message to an idle destination goes straight out. Messages that queue up behind one in flight, or
+    behind an empty bucket, are merged into as few messages as Discord's limits allow. Interaction
+    followups don't count against Discord's global limit, so command replies never wait behind a burst of
+    level ups for it.
+
+    Followups and edits through an interaction's webhook are command replies: they go out ahead of anything
+    else queued for that webhook (playback messages, sent with priority=False) and one request each, never
+    merged. Initial responses and defers don't come through here at all, ctx.respond sends them straight to
+    the interaction callback, which has no bucket shared with other traffic and must answer within 3 seconds.
+    """
+
+    def __init__(self, channel_rate=(5, 5), webhook_rate=(5, 2), global_rate=(50, 1)):
+        self.channel_rate = channel_rate
+        self.webhook_rate = webhook_rate
+        self.global_bucket = RateBucket(*global_rate)
+        self.routes = {}
+        self.requests = 0
+        self.messages = 0
+        self.merged = 0
+        self.throttled = 0
+        self.failed = 0
+
+    @staticmethod
+    def _key(target):
+        # Every ctx.followup is a new Webhook object, the token identifies the interaction
+        token = getattr(target, 'token', None)
+        if token:
+            return ('webhook', token)
+        return ('channel', target.id)
+
+    def _route(self, target):
+        key = self._key(target)
+        route = self.routes.get(key)
+        if route is None:
+            if key[0] == 'webhook':
+                route = Route(target, RateBucket(*self.webhook_rate))
+            else:
+                route = Route(target, RateBucket(*self.channel_rate), self.global_bucket)
+            self.routes[key] = route
+        return route
+
+    async def send(self, target, content=None, *, embed=None, embeds=None, priority=None, **kwargs):
+        """Sends (or merges) a message to a channel or followup webhook, returns the message that carried it
+
+        priority defaults to True for followup webhooks, pass False for messages that aren't a command reply.
+        """
+        embeds = list(embeds or ())
+        if embed is not None:
+            embeds.append(embed)
+        future = asyncio.get_running_loop().create_future()
+        item = Outgoing(None if content is None else str(content), embeds, kwargs, future)
+        return await self._queue(target, item, priority)
+
+    async def edit(self, target, message, content=None, **kwargs):
+        """Edits a message sent through target (or the interaction response, with message=ctx) in turn with its sends"""
+        future = asyncio.get_running_loop().create_future()
+        item = Outgoing(None if content is None else str(content), [], kwargs, future, message)
+        return await self._queue(target, item, None)
+
+    async def _queue(self, target, item, priority):
+        key = self._key(target)
+        route = self._route(target)
+        if priority is None:
+            priority = key[0] == 'webhook'
+        (route.priority if priority else route.queue).append(item)
+        self.messages += 1
+        if route.task is None:
+            route.task = asyncio.create_task(self._drain(key, route))
+        return await item.future
+
+    async def _wait(self, buckets):
+        throttled = False
+        delay = max(bucket.delay() for bucket in buckets)
+        while delay:
+            throttled = True
+            await asyncio.sleep(delay)
+            delay = max(bucket.delay() for bucket in buckets)
+        self.throttled += throttled
+
+    async def _drain(self, key, route):
+        try:
+            while route.priority or route.queue:
+                await self._wait(route.buckets)
+
+                # Everything that queued while waiting goes out together
+                batch = self._take_batch(route)
+                for bucket in route.buckets:
+                    bucket.take()
+                self.requests += 1
+                self.merged += len(batch) - 1
+                try:
+                    message = await self._deliver(route.target, batch)
+                except Exception as e:
+                    self.failed += 1
+                    for item in batch:
+                        if not item.future.done():
+                            item.future.set_exception(e)
+                else:
+                    for item in batch:
+                        if not item.future.done():
+                            item.future.set_result(message)
+        finally:
+            route.task = None
+            self._forget_later(key, route)
+
+    def _forget_later(self, key, route):
+        # Only once its window has closed, a fresh route in its place would otherwise allow a second burst
+        asyncio.get_running_loop().call_later(route.buckets[0].per, self._forget, key, route)
+
+    def _forget(self, key, route):
+        if self.routes.get(key) is not route or route.task is not None or route.priority or route.queue:
+            return
+        if route.buckets[0].full():
+            del self.routes[key]
+        else:
+            self._forget_later(key, route)
+
+    @staticmethod
+    def _take_batch(route):
+        """Pops the next message plus every following one that fits into it, command replies first and alone"""
+        queue = route.priority or route.queue
+        first = queue.popleft()
+        batch = [first]
+        if first.message is not None:
+            # Only the last of several queued edits to one message needs to be made
+            while queue and queue[0].message is first.message:
+                batch.append(queue.popleft())
+            return batch
+        if first.kwargs or queue is route.priority:
+            return batch
+
+        length = len(first.content or "")
+        embeds = len(first.embeds)
+        embed_chars = sum(len(e) for e in first.embeds)
+        while queue and not queue[0].kwargs and queue[0].message is None:
+            item = queue[0]
+            item_length = len(item.content or "")
+            joined = length + (1 if length and item_length else 0) + item_length
+            item_embed_chars = sum(len(e) for e in item.embeds)
+            if (joined > MESSAGE_LIMIT or embeds + len(item.embeds) > EMBEDS_PER_MESSAGE
+                    or embed_chars + item_embed_chars > EMBED_TOTAL_LIMIT):
+                break
+            batch.append(queue.popleft())
+            length, embeds, embed_chars = joined, embeds + len(item.embeds), embed_chars + item_embed_chars
+        return batch
+
+    @staticmethod
+    async def _deliver(target, batch):
+        last = batch[-1]
+        if last.message is not None:
+            return await last.message.edit(content=last.content, **last.kwargs)
+        content = "\n".join(item.content for item in batch if item.content) or None
+        embeds = [embed for item in batch for embed in item.embeds]
+        kwargs = dict(batch[0].kwargs)
+        if embeds:
+            kwargs['embeds'] = embeds
+        if getattr(target, 'token', None):
+            kwargs['wait'] = True
+        return await target.send(content, **kwargs)
+
+    def stats(self):
+        return {
+            'messages': self.messages,
+            'requests': self.requests,
+            'merged': self.merged,
+            'throttled': self.throttled,
+            'failed': self.failed,
+            'queued': sum(len(route.priority) + len(route.queue) for route in self.routes.values()),
+            'routes': len(self.routes),
+        }
+
+
+def get_scheduler():
+    """Returns the process wide scheduler, so every cog's messages share the same buckets"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = OutboundScheduler(
+            channel_rate=parse_rate(os.getenv('OUTBOUND_CHANNEL_RATE', '5/5')),
+            webhook_rate=parse_rate(os.getenv('OUTBOUND_WEBHOOK_RATE', '5/2')),
+            global_rate=parse_rate(os.getenv('OUTBOUND_GLOBAL_RATE', '50/1')),
+        )
+    return _scheduler
@@ -0,0 +1,48 @@
+import time
+
+
+class StreamingReply:
+    """Shows text as it arrives by editing a deferred response, batched so edits stay under the rate limit"""
+
+    def __init__(self, ctx, outbound, min_interval=1.0, limit=1900):
+        self.ctx = ctx
+        self.outbound = outbound  # the interaction's sends and edits share its webhook bucket
+        # Interaction webhooks allow about 5 edits per 5 seconds, one per second leaves room for the final one
+        self.min_interval = min_interval
+        self.limit = limit
+        self.text = ""  # everything received so far
+        self._start = 0  # where the message being edited starts in text
+        self._message = None  # None while the message being edited is the original response
+        self._shown = 0  # how much of text has been sent
+        self._last_edit = 0.0
+        self.edits = 0
+
+    async def append(self, text):
+        self.text += text
+        # The first text goes out straight away, later text waits for the next edit slot
+        if not self.edits or time.monotonic() - self._last_edit >= self.min_interval:
+            await self.flush()
+
+    async def flush(self):
+        if not self.text.strip():
+            return  # Discord rejects messages with no visible content
+        while len(self.text) - self._start > self.limit:
+            # The current message is full: finish it and carry on in a new one
+            if self._shown < self._start + self.limit:
+                await self._edit(self.text[self._start:self._start + self.limit])
+            self._start += self.limit
+            self._message = await self.outbound.send(self.ctx.followup, self.text[self._start:self._start + self.limit])
+            self._shown = min(len(self.text), self._start + self.limit)
+
+        if self._shown < len(self.text):
+            await self._edit(self.text[self._start:])
+            self._shown = len(self.text)
+
+    async def _edit(self, content):
+        # The original response is edited through ctx, continuation messages directly
+        await self.outbound.edit(self.ctx.followup, self._message or self.ctx, content=content)
+        self._last_edit = time.monotonic()
+        self.edits += 1
+
+    async def finish(self):
+        await self.flush()
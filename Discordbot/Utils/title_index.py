@@ -0,0 +1,90 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+from Utils.cache import normalise_query
+
+
+class TitleIndex:
+    """In-memory prefix index of article titles: a sorted array searched with bisect, no network involved
+
+    The big sorted array is only ever replaced whole, by add_many on a worker thread. Titles added one at a
+    time go to a small sorted array beside it until the next merge, so add stays cheap on the event loop.
+    """
+
+    def __init__(self, merge_at=2048):
+        self._keys = []  # normalised titles, sorted
+        self._titles = []  # original titles, in the same order as _keys
+        self._recent = []  # (key, title) added since the last merge, sorted
+        self._recent_keys = set()
+        self.merge_at = merge_at
+        self._lock = threading.Lock()  # add_many swaps the arrays in from a worker thread
+        self._merging = threading.Lock()  # one add_many at a time, each builds on the arrays the last one left
+
+    def __len__(self):
+        return len(self._keys) + len(self._recent)
+
+    @property
+    def needs_merge(self):
+        return len(self._recent) >= self.merge_at
+
+    def _contains(self, key):
+        position = bisect_left(self._keys, key)
+        return position < len(self._keys) and self._keys[position] == key
+
+    def add(self, title):
+        key = normalise_query(title)
+        with self._lock:
+            if key in self._recent_keys or self._contains(key):
+                return
+            self._recent_keys.add(key)
+            insort(self._recent, (key, title))
+
+    def add_many(self, titles=()):
+        """Merges titles and everything added since the last merge in one sort, meant for a worker thread"""
+        with self._merging:
+            self._merge(titles)
+
+    def _merge(self, titles):
+        with self._lock:
+            keys, titles_so_far, recent = self._keys, self._titles, list(self._recent)
+
+        merged = dict(zip(keys, titles_so_far))
+        for key, title in recent:
+            merged.setdefault(key, title)
+        for title in titles:
+            merged.setdefault(normalise_query(title), title)
+        keys = sorted(merged)
+        titles = [merged[key] for key in keys]
+
+        with self._lock:
+            self._keys, self._titles = keys, titles
+            # Titles added while this sort ran stay in the small array for the next merge
+            self._recent = [entry for entry in self._recent if entry[0] not in merged]
+            self._recent_keys = {key for key, _ in self._recent}
+
+    def load(self, path):
+        """Loads a title dump: one title per line, underscores for spaces as in Wikipedia's all-titles files"""
+        with open(path, encoding='utf-8') as f:
+            self.add_many(line.strip().replace('_', ' ') for line in f if line.strip())
+        return len(self)
+
+    def search(self, prefix, limit=25):
+        """Titles starting with prefix, case-insensitively, in alphabetical order"""
+        key = normalise_query(prefix)
+        if not key:
+            return []
+
+        with self._lock:
+            results = []
+            position = bisect_left(self._keys, key)
+            while position < len(self._keys) and len(results) < limit and self._keys[position].startswith(key):
+                results.append((self._keys[position], self._titles[position]))
+                position += 1
+
+            recent = []
+            position = bisect_left(self._recent, (key,))
+            while position < len(self._recent) and len(recent) < limit and self._recent[position][0].startswith(key):
+                recent.append(self._recent[position])
+                position += 1
+
+        return [title for _, title in heapq.merge(results, recent)][:limit]
@@ -0,0 +1,110 @@
+import asyncio
+import aiohttp
+from Utils.cache import TTLCache, normalise_query
+
+
+class PageNotFound(Exception):
+    """No article matches the query"""
+
+
+class DisambiguationError(Exception):
+    """The best match is a disambiguation page, options holds the articles it links to"""
+
+    def __init__(self, title, options):
+        super().__init__(title)
+        self.title = title
+        self.options = options
+
+
+class WikiClient:
+    """Non-blocking MediaWiki lookups over one pooled HTTP session, with a result cache and request coalescing"""
+
+    def __init__(self, language='en', maxsize=1024, ttl=86400, missing_ttl=600, timeout=10, max_options=100):
+        self.api_url = f"https://{language}.wikipedia.org/w/api.php"
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_options = max_options
+        # Misses are cached briefly, a typo repeated by several users should not hit the API every time
+        self.missing_ttl = missing_ttl
+        # normalised query -> result dict, disambiguation and missing results included
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight = {}  # normalised query -> task fetching it
+        self._session = None
+        self.fetches = 0
+        self.coalesced = 0
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=self.timeout,
+                connector=aiohttp.TCPConnector(limit=16, ttl_dns_cache=300),
+                headers={'User-Agent': 'Discordbot wikisearch (aiohttp)'}
+            )
+        return self._session
+
+    async def _api(self, **params):
+        params.update(action='query', format='json', formatversion='2')
+        async with self._get_session().get(self.api_url, params=params) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def _fetch(self, query):
+        """Search and fetch the intro of the best match in one round trip"""
+        self.fetches += 1
+        data = await self._api(
+            generator='search', gsrsearch=query, gsrlimit=1,
+            prop='extracts|info|pageprops', exintro=1, explaintext=1,
+            inprop='url', ppprop='disambiguation', redirects=1
+        )
+        pages = data.get('query', {}).get('pages', [])
+        if not pages:
+            return {'kind': 'missing'}
+
+        page = pages[0]
+        if 'disambiguation' in page.get('pageprops', {}):
+            links = await self._api(titles=page['title'], prop='links', plnamespace=0, pllimit='max')
+            linked = links.get('query', {}).get('pages', [{}])[0].get('links', [])
+            return {
+                'kind': 'disambiguation',
+                'title': page['title'],
+                'options': [link['title'] for link in linked[:self.max_options]],
+            }
+
+        return {
+            'kind': 'page',
+            'title': page['title'],
+            'summary': page.get('extract', ''),
+            'url': page['fullurl'],
+        }
+
+    async def lookup(self, query):
+        """Returns {'title', 'summary', 'url'} for the best match, raises PageNotFound or DisambiguationError"""
+        key = normalise_query(query)
+        result = self.cache.get(key)
+
+        if result is None:
+            task = self._inflight.get(key)
+            if task is None:
+                task = asyncio.create_task(self._fetch(query))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            else:
+                self.coalesced += 1
+
+            # Shielded so one caller timing out does not cancel the fetch the others are waiting on
+            result = await asyncio.shield(task)
+            if key not in self.cache:
+                ttl = self.missing_ttl if result['kind'] == 'missing' else None
+                self.cache.set(key, result, ttl=ttl)
+
+        if result['kind'] == 'missing':
+            raise PageNotFound(query)
+        if result['kind'] == 'disambiguation':
+            raise DisambiguationError(result['title'], result['options'])
+        return result
+
+    def stats(self):
+        return {**self.cache.stats(), 'fetches': self.fetches, 'coalesced': self.coalesced}
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
@@ -0,0 +1,152 @@
+import asyncio
+import math
+from Utils.leaderboard import GuildLeaderboard
+
+UPSERT_SQL = """
+    INSERT INTO levels (guild_id, user_id, xp, messages) VALUES (?, ?, ?, ?)
+    ON CONFLICT (guild_id, user_id) DO UPDATE SET
+        xp = xp + excluded.xp,
+        messages = messages + excluded.messages
+"""
+
+
+def level_for(xp):
+    """Level reached with this much XP, level n needs 100 * n^2 in total"""
+    return math.isqrt(xp // 100)
+
+
+def xp_for(level):
+    return 100 * level * level
+
+
+class XPStore:
+    """XP totals kept in memory per guild, with increments written behind to sqlite in batches"""
+
+    def __init__(self, db, flush_interval=5):
+        self.db = db
+        self.flush_interval = flush_interval
+        self._guilds = {}  # guild_id -> GuildLeaderboard, loaded on the guild's first award or lookup
+        self._loading = {}  # guild_id -> task loading it, shared by concurrent awards
+        self._dirty = {}  # (guild_id, user_id) -> [xp, messages] not written yet
+        self._task = None
+        self._ready = False
+        self.awards = 0
+        self.flushes = 0
+        self.rows_written = 0
+
+    async def load(self):
+        """Creates the table and starts the flush task, once"""
+        if self._ready:
+            return
+        self._ready = True
+        await self.db.execute("""
+            CREATE TABLE IF NOT EXISTS levels (
+                guild_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                xp INTEGER NOT NULL DEFAULT 0,
+                messages INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (guild_id, user_id)
+            )
+        """)
+        await self.db.execute('CREATE INDEX IF NOT EXISTS levels_guild_xp ON levels (guild_id, xp DESC)')
+        self._task = asyncio.create_task(self._run())
+
+    async def _load_guild(self, guild_id):
+        # Read in index order, so building the sorted leaderboard is close to linear
+        rows = await self.db.fetchall(
+            'SELECT user_id, xp FROM levels WHERE guild_id = ? ORDER BY xp DESC', (guild_id,)
+        )
+        return GuildLeaderboard(rows)
+
+    async def guild(self, guild_id):
+        """Returns a guild's GuildLeaderboard, reading it from sqlite only the first time"""
+        board = self._guilds.get(guild_id)
+        if board is not None:
+            return board
+
+        task = self._loading.get(guild_id)
+        if task is None:
+            task = self._loading[guild_id] = asyncio.create_task(self._load_guild(guild_id))
+        try:
+            board = await asyncio.shield(task)
+        finally:
+            self._loading.pop(guild_id, None)
+
+        # Every award in this guild waited for the load, so nothing is pending for it yet
+        return self._guilds.setdefault(guild_id, board)
+
+    async def award(self, guild_id, user_id, amount):
+        """Adds XP for one message and returns (old total, new total), no database write on this path"""
+        board = await self.guild(guild_id)
+        old = board.get(user_id)
+        new = old + amount
+        board.update(user_id, new)
+
+        pending = self._dirty.get((guild_id, user_id))
+        if pending is None:
+            self._dirty[(guild_id, user_id)] = [amount, 1]
+        else:
+            pending[0] += amount
+            pending[1] += 1
+        self.awards += 1
+        return old, new
+
+    def _take_batch(self):
+        batch, self._dirty = self._dirty, {}
+        return [(guild_id, user_id, xp, messages) for (guild_id, user_id), (xp, messages) in batch.items()]
+
+    @staticmethod
+    def _write(conn, rows):
+        # One transaction and one executemany per flush, however many messages it covers
+        with conn:
+            conn.executemany(UPSERT_SQL, rows)
+
+    async def flush(self):
+        rows = self._take_batch()
+        if not rows:
+            return
+        try:
+            await self.db.run(self._write, rows)
+        except Exception:
+            # Put the batch back so the next flush retries it
+            for guild_id, user_id, xp, messages in rows:
+                pending = self._dirty.setdefault((guild_id, user_id), [0, 0])
+                pending[0] += xp
+                pending[1] += messages
+            raise
+        self.flushes += 1
+        self.rows_written += len(rows)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error flushing XP: {type(e).__name__}: {e}")
+
+    def stats(self):
+        return {
+            'guilds': len(self._guilds),
+            'users': sum(len(board) for board in self._guilds.values()),
+            'pending': len(self._dirty),
+            'awards': self.awards,
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+        }
+
+    async def shutdown(self):
+        """Stops the flush task and writes whatever is still pending, before the bot closes"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def close(self):
+        """Stops the flush task and queues whatever is still pending on the database thread"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        rows = self._take_batch()
+        if rows:
+            self.db.submit(self._write, rows)
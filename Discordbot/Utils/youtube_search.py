@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from Utils.metrics import REGISTRY
+
+SEARCH_SECONDS = REGISTRY.histogram('discordbot_youtube_search_seconds', 'YouTube Data API search round trips')
+
+
+class YouTubeSearch:
+    """Runs YouTube Data API searches without blocking the event loop"""
+
+    def __init__(self, youtube=None, api_key=None, max_concurrency=8, timeout=10):
+        # Without a client one is built from api_key on the first search, on a worker thread
+        self._youtube = youtube
+        self.api_key = api_key
+        self._build_lock = threading.Lock()
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="yt-search")
+        # httplib2 connections are not thread safe, so every worker gets its own
+        self._local = threading.local()
+
+    @property
+    def youtube(self):
+        if self._youtube is None:
+            with self._build_lock:
+                if self._youtube is None:
+                    # Parsing the discovery document is the slow part of startup, so it waits for the first /play
+                    from googleapiclient.discovery import build
+                    self._youtube = build('youtube', 'v3', developerKey=self.api_key)
+        return self._youtube
+
+    def _http(self):
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            import httplib2
+            # A socket timeout, so a slow search frees its worker thread instead of holding it for httplib2's 60s
+            http = self._local.http = httplib2.Http(timeout=self.timeout)
+        return http
+
+    def _search_blocking(self, query):
+        """Runs on a worker thread and returns the top video id or None"""
+        request = self.youtube.search().list(
+            q=query,
+            part='snippet',
+            type='video',
+            maxResults=1
+        )
+        response = request.execute(http=self._http())
+
+        if not response.get('items'):
+            return None
+        return response['items'][0]['id']['videoId']
+
+    async def search(self, query):
+        """Returns the video id of the top result, raises asyncio.TimeoutError if the API is too slow"""
+        await self._semaphore.acquire()
+        start = time.perf_counter()
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, self._search_blocking, query)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        # Released when the worker thread is done, not when this call stops waiting for it
+        future.add_done_callback(lambda _: self._semaphore.release())
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+        finally:
+            SEARCH_SECONDS.observe(time.perf_counter() - start)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
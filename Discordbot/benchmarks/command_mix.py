@@ -0,0 +1,312 @@
+"""Replays a mix of slash commands across synthetic guilds through the real cogs, with no Discord connection.
+
+The cogs in Events/ and General/ are loaded into a bot whose guilds come from synthetic GUILD_CREATE payloads.
+Commands run through their real checks and cooldowns, with a fake ApplicationContext and fake voice clients.
+YouTube search, yt-dlp extraction, Wikipedia and Gemini are answered by a local stub server
+(benchmarks.stub_servers), and FFmpeg is not started. Reports per-command latency percentiles, throughput and
+memory.
+
+Run from the Discordbot folder:
+python -m benchmarks.command_mix --guilds 2000 --commands 20000 --concurrency 200
+python -m benchmarks.command_mix --mix play=50,queue=20,skip=10,nowplaying=20
+"""
+import argparse
+import asyncio
+import collections
+import os
+import random
+import resource
+import tempfile
+import time
+
+# The music and askbot cogs refuse to load without keys, the stubs never check them
+os.environ.setdefault('YOUTUBE_API_KEY', 'benchmark')
+os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+# Keep playback off the disk and the benchmark's writes out of the real users.db
+os.environ['AUDIO_CACHE_DIR'] = ''
+os.environ['MUSIC_CACHE_DB'] = ''
+
+import discord
+from discord.ext import commands
+from Utils import database
+from Utils.ffmpeg_supervisor import process_usage
+from Utils.intents import client_options, required_intents
+from Utils.loader import find_extensions, load_extensions, print_load_timings, print_table
+from Utils.metrics import REGISTRY
+from benchmarks.fakes import FakeContext, FakeMember, FakeVoiceChannel
+from benchmarks.intents_memory import guild_payload
+from benchmarks.stub_servers import StubExtractorPool, StubFFmpegSupervisor, StubModel, StubServer
+
+OWNER_ID = 42
+DEFAULT_MIX = (
+    "play=20,queue=8,nowplaying=5,skip=4,loop=2,wikisearch=15,askbot=12,level=10,rank=6,leaderboard=6,"
+    "ping=6,hello=6"
+)
+TOPICS = [f"topic {i}" for i in range(500)]
+
+
+def option_values(name, rng, args, guild_members):
+    """Keyword arguments for one invocation, every option given explicitly since the callback is called directly"""
+    if name == 'play':
+        if rng.random() < 0.02:
+            return {'query': f"https://www.youtube.com/playlist?list=PL{rng.randrange(50)}"}
+        return {'query': f"song {rng.randrange(args.songs)}"}
+    if name == 'wikisearch':
+        return {'query': rng.choice(TOPICS)}
+    if name == 'askbot':
+        context = rng.choice((None, None, None, "me"))
+        return {'question': f"What is {rng.choice(TOPICS)}?", 'context': context}
+    if name == 'forgetchat':
+        return {'context': "me"}
+    if name == 'rank':
+        return {'member': rng.choice(guild_members) if rng.random() < 0.5 else None}
+    if name == 'accountdate':
+        return {'member': rng.choice(guild_members)}
+    if name == 'loopstats':
+        return {'stacks': False}
+    return {}
+
+
+class BenchmarkBot(discord.Bot):
+    """There is no gateway heartbeat to measure, so /ping reports the simulated REST round trip"""
+
+    rest_latency = 0.0
+
+    @property
+    def latency(self):
+        return self.rest_latency
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def rss_mb():
+    usage = process_usage(os.getpid())
+    return usage[1] / 2**20 if usage else 0.0
+
+
+class Harness:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.latencies = collections.defaultdict(list)
+        self.first_replies = collections.defaultdict(list)
+        self.outcomes = collections.defaultdict(collections.Counter)
+        self.errors = collections.Counter()
+        self.rest_calls = 0
+
+    async def setup(self):
+        args = self.args
+        self.server = StubServer(args.latency_ms / 1000, args.chunk_ms / 1000).start()
+        # Every cog that asks for users.db gets a throwaway file instead
+        self.db_dir = tempfile.TemporaryDirectory()
+        database._databases[os.path.abspath(database.DEFAULT_PATH)] = database.Database(
+            os.path.join(self.db_dir.name, 'users.db')
+        )
+
+        self.rss_start = rss_mb()
+        extensions = find_extensions()
+        options = client_options(required_intents(intents for _, intents in extensions), 'minimal')
+        self.bot = BenchmarkBot(owner_id=OWNER_ID, **options)
+        self.bot.rest_latency = args.rest_ms / 1000
+        self.bot.loop = asyncio.get_running_loop()
+        print_load_timings(load_extensions(self.bot, extensions, skip_failed=True))
+        self._stub_services()
+
+        state = self.bot._connection
+        self.guilds = []
+        for guild_id in range(1, args.guilds + 1):
+            guild = state._add_guild_from_data(guild_payload(guild_id, 0, 3, options['intents']))
+            voice = FakeVoiceChannel(self.bot, guild, args.song_seconds)
+            members = [
+                FakeMember(guild_id * 1_000_000 + i, guild, voice if self.rng.random() < args.in_voice else None)
+                for i in range(1, args.users + 1)
+            ]
+            self.guilds.append((guild, members))
+        self.rss_loaded = rss_mb()
+
+        await asyncio.gather(*(cog.warmup() for cog in self.bot.cogs.values() if hasattr(cog, 'warmup')))
+
+        self.commands = {command.name: command for command in self.bot.pending_application_commands}
+        self.mix = []
+        for part in args.mix.split(","):
+            name, weight = part.split("=")
+            if name not in self.commands:
+                raise SystemExit(f"Unknown command in --mix: {name} (loaded: {', '.join(sorted(self.commands))})")
+            self.mix.append((name, float(weight)))
+
+    def _stub_services(self):
+        """Points the loaded cogs' external clients at the stub server"""
+        base = self.server.base_url
+        music = self.bot.get_cog('MusicPlayer')
+        if music:
+            from googleapiclient.discovery import build
+            music.search._youtube = build(
+                'youtube', 'v3', developerKey='benchmark', client_options={'api_endpoint': base}
+            )
+            music.extractor.close()
+            music.extractor = StubExtractorPool(base, music.YDL_OPTIONS, size=music.extractor.size)
+            music.ffmpeg = StubFFmpegSupervisor(music.ffmpeg.max_processes, music.ffmpeg.wait_timeout)
+        wiki = self.bot.get_cog('wikisearch')
+        if wiki:
+            wiki.client.api_url = f"{base}/w/api.php"
+        gemini = self.bot.get_cog('GeminiCog')
+        if gemini:
+            gemini.model = StubModel(base)
+
+    async def invoke(self, name):
+        guild, members = self.rng.choice(self.guilds)
+        author = self.rng.choice(members)
+        command = self.commands[name]
+        kwargs = option_values(name, self.rng, self.args, members)
+        ctx = FakeContext(self.bot, command, guild, author, self.args.rest_ms / 1000)
+
+        try:
+            await command.prepare(ctx)
+            try:
+                await command.callback(command.cog, ctx, **kwargs)
+            finally:
+                # py-cord runs these in the finally around the callback, the metrics cog times commands here
+                await command.call_after_hooks(ctx)
+            outcome = 'ok'
+        except commands.CommandOnCooldown as e:
+            outcome = 'cooldown'
+            # Through the command's error handler and the on_application_command_error listeners, as the bot would
+            await command.dispatch_error(ctx, e)
+        except Exception as e:
+            outcome = 'error'
+            self.errors[f"{name}: {type(e).__name__}: {e}"[:120]] += 1
+
+        self.outcomes[name][outcome] += 1
+        self.rest_calls += ctx.calls
+        if outcome == 'ok':
+            self.latencies[name].append(time.perf_counter() - ctx.started)
+            if ctx.first_reply is not None:
+                self.first_replies[name].append(ctx.first_reply)
+
+    async def run(self):
+        names = [name for name, _ in self.mix]
+        weights = [weight for _, weight in self.mix]
+        remaining = self.args.commands
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                await self.invoke(self.rng.choices(names, weights)[0])
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        self.wall = time.perf_counter() - start
+        self.rss_end = rss_mb()
+
+    async def teardown(self):
+        # What bot.close() does: stop playback and leave every voice channel before the cogs go
+        for vc in list(self.bot.voice_clients):
+            await vc.disconnect()
+        gemini = self.bot.get_cog('GeminiCog')
+        for name in list(self.bot.extensions):
+            self.bot.unload_extension(name)
+        if gemini and isinstance(gemini.model, StubModel):
+            await gemini.model.close()
+        await asyncio.sleep(0.1)  # let the unload tasks (wiki session close, xp flush) run
+        self.server.shutdown()
+        database.get_database().close()
+        self.db_dir.cleanup()
+
+    def report(self):
+        rows = []
+        for name, _ in self.mix:
+            latencies = sorted(self.latencies[name])
+            first = sorted(self.first_replies[name])
+            outcomes = self.outcomes[name]
+            rows.append((
+                name, sum(outcomes.values()), outcomes['ok'], outcomes['cooldown'], outcomes['error'],
+                *(f"{percentile(latencies, q) * 1000:.0f}" for q in (0.5, 0.9, 0.99)),
+                f"{(latencies[-1] if latencies else 0) * 1000:.0f}",
+                f"{percentile(first, 0.99) * 1000:.0f}",
+            ))
+        total = sum(sum(outcomes.values()) for outcomes in self.outcomes.values())
+        print_table(
+            "Commands", ("Command", "runs", "ok", "cooldown", "error", "p50 ms", "p90 ms", "p99 ms", "max ms",
+                         "p99 first reply ms"),
+            rows,
+            f"{total} commands in {self.wall:.1f}s = {total / self.wall:.0f}/s, {self.rest_calls} REST calls"
+        )
+
+        for error, count in self.errors.most_common(5):
+            print(f"  {count}x {error}")
+
+        print(
+            f"RSS: {self.rss_start:.0f} MB before loading, {self.rss_loaded:.0f} MB with {self.args.guilds} guilds, "
+            f"{self.rss_end:.0f} MB after the run, peak {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB"
+        )
+        print(f"Stub server requests: {dict(self.server.requests)}")
+
+        music = self.bot.get_cog('MusicPlayer')
+        if music:
+            ffmpeg = music.ffmpeg.stats()
+            print(
+                f"Music: {len(music.states)} guild states, {ffmpeg['started']} songs started, "
+                f"peak {ffmpeg['peak']} sources, extractor {music.extractor.stats()}"
+            )
+        outbound = self.bot.get_cog('Outbound')
+        if outbound:
+            stats = outbound.scheduler.stats()
+            print(
+                f"Outbound: {stats['messages']} messages in {stats['requests']} requests, {stats['merged']} merged, "
+                f"{stats['throttled']} throttled, {stats['failed']} failed"
+            )
+        if self.bot.get_cog('Metrics'):
+            start = time.perf_counter()
+            body = REGISTRY.render()
+            print(
+                f"Metrics: {len(body.splitlines())} lines, {len(body) / 1024:.0f} KiB, "
+                f"rendered in {(time.perf_counter() - start) * 1000:.1f}ms"
+            )
+        watchdog = self.bot.get_cog('Watchdog')
+        if watchdog:
+            stats = watchdog.monitor.stats()
+            print(
+                f"Event loop lag: p50 {stats['p50'] * 1000:.0f}ms, p99 {stats['p99'] * 1000:.0f}ms, "
+                f"max {stats['max'] * 1000:.0f}ms, {stats['stalls']} stalls"
+            )
+            for offender in watchdog.monitor.worst_offenders(3):
+                print(f"  {offender.where}: {offender.stalls}x, worst {offender.worst * 1000:.0f}ms")
+                if self.args.stacks and offender.stack:
+                    print(offender.stack)
+
+
+async def main(args):
+    harness = Harness(args)
+    await harness.setup()
+    try:
+        await harness.run()
+        harness.report()
+    finally:
+        await harness.teardown()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--guilds', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=20, help="Members per guild who run commands")
+    parser.add_argument('--in-voice', type=float, default=0.5, help="Share of members sitting in a voice channel")
+    parser.add_argument('--commands', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=200, help="Commands in flight at once")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="command=weight pairs, comma separated")
+    parser.add_argument('--songs', type=int, default=2000, help="Distinct /play search terms")
+    parser.add_argument('--song-seconds', type=float, default=5, help="How long a fake voice client plays a song")
+    parser.add_argument('--latency-ms', type=float, default=50, help="Stub API response time")
+    parser.add_argument('--chunk-ms', type=float, default=50, help="Delay between streamed Gemini chunks")
+    parser.add_argument('--rest-ms', type=float, default=30, help="Discord REST round trip per response")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--stacks', action='store_true', help="Print the stack of the worst event loop stalls")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
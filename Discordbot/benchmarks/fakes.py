@@ -0,0 +1,172 @@
+"""Fake interaction contexts, members and voice connections for driving the real cogs without Discord.
+
+Every REST call (defer, respond, followup, edit) sleeps for rest_latency, the round trip Discord would add.
+Voice clients "play" a source by waiting song_seconds and then calling the after callback, as the player
+thread would at the end of a song.
+"""
+import asyncio
+import time
+import discord
+
+
+class FakeMessage:
+    def __init__(self, ctx, content=None):
+        self.ctx = ctx
+        self.content = content
+
+    async def edit(self, content=None, **kwargs):
+        await self.ctx._rest(content, kwargs)
+        self.content = content
+
+
+class FakeWebhook:
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.token = f"token{id(ctx)}"  # the outbound scheduler keys followups by interaction token
+
+    async def send(self, content=None, wait=False, **kwargs):
+        await self.ctx._rest(content, kwargs)
+        return FakeMessage(self.ctx, content)
+
+
+class FakeContext:
+    """The subset of discord.ApplicationContext the cogs use"""
+
+    def __init__(self, bot, command, guild, author, rest_latency):
+        self.bot = bot
+        self.command = command
+        self.cog = command.cog
+        self.guild = guild
+        self.guild_id = guild.id
+        self.author = self.user = author
+        self.channel_id = guild.id * 100  # the first text channel of benchmarks.intents_memory's guilds
+        self.followup = FakeWebhook(self)
+        self.rest_latency = rest_latency
+        self.started = time.perf_counter()
+        self.first_reply = None  # seconds until the user saw something, a defer counts
+        self.calls = 0
+        self._responded = False
+
+    @property
+    def voice_client(self):
+        return self.guild.voice_client
+
+    async def _rest(self, content=None, kwargs=None):
+        if content is not None and len(str(content)) > 2000:
+            raise ValueError("Message content must be 2000 characters or fewer")
+        embed = (kwargs or {}).get('embed')
+        if embed is not None and len(embed) > 6000:
+            raise ValueError("Embed must be 6000 characters or fewer")
+        await asyncio.sleep(self.rest_latency)
+        self.calls += 1
+        if self.first_reply is None:
+            self.first_reply = time.perf_counter() - self.started
+
+    async def defer(self, ephemeral=False, invisible=True):
+        if self._responded:
+            raise discord.InteractionResponded(None)
+        self._responded = True
+        await self._rest()
+
+    async def respond(self, content=None, **kwargs):
+        # Like ApplicationContext.respond: the interaction response first, followups after it
+        if self._responded:
+            return await self.followup.send(content, **kwargs)
+        self._responded = True
+        await self._rest(content, kwargs)
+
+    async def edit(self, content=None, **kwargs):
+        await self._rest(content, kwargs)
+
+
+class FakeVoiceState:
+    __slots__ = ('channel',)
+
+    def __init__(self, channel):
+        self.channel = channel
+
+
+class FakeMember:
+    def __init__(self, user_id, guild, voice_channel=None):
+        self.id = user_id
+        self.guild = guild
+        self.name = self.display_name = f"user{user_id}"
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+        self.voice = FakeVoiceState(voice_channel) if voice_channel else None
+        self.created_at = discord.utils.snowflake_time(user_id << 22)
+
+    def __str__(self):
+        return self.name
+
+
+class FakeVoiceChannel:
+    def __init__(self, bot, guild, song_seconds):
+        self.bot = bot
+        self.guild = guild
+        self.id = guild.id * 100 + 99
+        self.name = "Music"
+        self.song_seconds = song_seconds
+
+    async def connect(self):
+        await asyncio.sleep(0.05)  # voice handshake
+        vc = FakeVoiceClient(self, self.song_seconds)
+        self.bot._connection._add_voice_client(self.guild.id, vc)
+        return vc
+
+
+class FakeVoiceClient:
+    """Plays nothing, but keeps the playing/paused state and ends songs like discord.VoiceClient does"""
+
+    def __init__(self, channel, song_seconds):
+        self.channel = channel
+        self.guild = channel.guild
+        self.song_seconds = song_seconds
+        self.source = None
+        self._after = None
+        self._timer = None
+        self._paused = False
+        self._connected = True
+        self.played = 0
+
+    def is_connected(self):
+        return self._connected
+
+    def is_playing(self):
+        return self.source is not None and not self._paused
+
+    def is_paused(self):
+        return self.source is not None and self._paused
+
+    def play(self, source, *, after=None):
+        if self.source is not None:
+            raise discord.ClientException('Already playing audio.')
+        self.source = source
+        self._after = after
+        self._paused = False
+        self.played += 1
+        self._timer = asyncio.get_running_loop().call_later(self.song_seconds, self._finish)
+
+    def _finish(self):
+        source, after, self.source, self._after = self.source, self._after, None, None
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if source is not None:
+            source.cleanup()
+            if after is not None:
+                after(None)
+
+    def stop(self):
+        self._finish()
+
+    def pause(self):
+        self._paused = True
+
+    def resume(self):
+        self._paused = False
+
+    async def disconnect(self, *, force=False):
+        self._finish()
+        self._connected = False
+        self.channel.bot._connection._remove_voice_client(self.guild.id)
@@ -0,0 +1,133 @@
+"""Memory held by py-cord's cache across N synthetic guilds, for each INTENTS_PROFILE.
+
+Guild and message payloads are fed straight into the client's ConnectionState, the same parsing path gateway
+events take, so no Discord connection is needed. Without the members intent Discord only sends the bot's own
+member (and voice members) in GUILD_CREATE, so the full member list is only fed when the profile has it.
+
+Run from the Discordbot folder: python -m benchmarks.intents_memory --guilds 2000 --members 200 --messages 50
+"""
+import argparse
+import asyncio
+import gc
+import tracemalloc
+import discord
+from Utils.intents import PROFILES, client_options
+
+# What the cogs in General/ and Events/ declare in REQUIRED_INTENTS, without importing their dependencies
+COG_INTENTS = {'guilds', 'guild_messages', 'voice_states'}
+BOT_ID = 1
+
+
+def user_payload(user_id):
+    return {'id': str(user_id), 'username': f"user{user_id}", 'discriminator': '0', 'global_name': None, 'avatar': None}
+
+
+def member_payload(user_id):
+    return {
+        'user': user_payload(user_id),
+        'roles': [],
+        'nick': None,
+        'joined_at': '2024-01-01T00:00:00+00:00',
+        'deaf': False,
+        'mute': False,
+    }
+
+
+def guild_payload(guild_id, members, channels, intents):
+    first_member = guild_id * 1_000_000
+    member_ids = range(first_member, first_member + members) if intents.members else ()
+    data = {
+        'id': str(guild_id),
+        'name': f"Guild {guild_id}",
+        'owner_id': str(first_member),
+        'member_count': members,
+        'large': members > 250,
+        'features': [],
+        'emojis': [],
+        'stickers': [],
+        'voice_states': [],
+        'threads': [],
+        'roles': [{
+            'id': str(guild_id), 'name': '@everyone', 'permissions': '0', 'position': 0,
+            'color': 0, 'colors': {'primary_color': 0, 'secondary_color': None, 'tertiary_color': None},
+            'hoist': False, 'managed': False, 'mentionable': False,
+        }],
+        'channels': [
+            {'id': str(guild_id * 100 + i), 'type': 0, 'name': f"channel-{i}", 'position': i, 'permission_overwrites': []}
+            for i in range(channels)
+        ],
+        'members': [member_payload(BOT_ID)] + [member_payload(user_id) for user_id in member_ids],
+    }
+    if intents.presences:
+        data['presences'] = [
+            {'user': {'id': str(user_id)}, 'status': 'online', 'activities': [], 'client_status': {'desktop': 'online'}}
+            for user_id in member_ids
+        ]
+    return data
+
+
+def message_payload(guild_id, message_id, members):
+    author = guild_id * 1_000_000 + message_id % max(members, 1)
+    return {
+        'id': str(guild_id * 10_000 + message_id),
+        'channel_id': str(guild_id * 100),
+        'guild_id': str(guild_id),
+        'author': user_payload(author),
+        'member': {key: value for key, value in member_payload(author).items() if key != 'user'},
+        'content': f"message {message_id}",
+        'timestamp': '2024-01-01T00:00:00+00:00',
+        'edited_timestamp': None,
+        'tts': False,
+        'mention_everyone': False,
+        'mentions': [],
+        'mention_roles': [],
+        'attachments': [],
+        'embeds': [],
+        'pinned': False,
+        'type': 0,
+    }
+
+
+async def measure(profile, args):
+    options = client_options(COG_INTENTS, profile)
+    gc.collect()
+    tracemalloc.start()
+
+    bot = discord.Bot(**options)
+    state = bot._connection
+    for guild_id in range(1, args.guilds + 1):
+        state._add_guild_from_data(guild_payload(guild_id, args.members, args.channels, options['intents']))
+        if options['intents'].guild_messages:
+            for message_id in range(args.messages):
+                state.parse_message_create(message_payload(guild_id, message_id, args.members))
+
+    await asyncio.sleep(0)  # let any dispatched listeners finish
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    cached_members = sum(len(guild._members) for guild in state._guilds.values())
+    cached_messages = len(state._messages) if state._messages is not None else 0
+    await bot.close()
+    return {
+        'profile': profile,
+        'MiB': round(current / 2**20, 1),
+        'KiB_per_guild': round(current / args.guilds / 1024, 1),
+        'cached_members': cached_members,
+        'cached_messages': cached_messages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--guilds', type=int, default=2000)
+    parser.add_argument('--members', type=int, default=200, help="Members per guild")
+    parser.add_argument('--channels', type=int, default=10, help="Text channels per guild")
+    parser.add_argument('--messages', type=int, default=50, help="Messages replayed per guild")
+    args = parser.parse_args()
+
+    for profile in PROFILES:
+        print(asyncio.run(measure(profile, args)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Memory of the music cog's per-guild state: parallel dicts of dict tracks vs GuildPlayerState/Track.
+
+Run from the Discordbot folder: python -m benchmarks.music_state_memory --guilds 10000 --tracks 200
+"""
+import argparse
+import gc
+import random
+import string
+import tracemalloc
+from collections import deque
+from Utils.music_state import GuildPlayerState, Track
+
+REQUESTERS = [f"user{i}" for i in range(50)]
+
+
+def fresh_name(rng):
+    # Names arrive from separate gateway payloads, so equal names are separate string objects
+    return ''.join(list(rng.choice(REQUESTERS)))
+
+
+def random_video_id(rng):
+    return ''.join(rng.choices(string.ascii_letters + string.digits + '-_', k=11))
+
+
+def build_dicts(guilds, tracks, rng):
+    """The layout before: five dicts keyed by guild id, tracks as plain dicts"""
+    players, queues, inactivity_tasks, loop, current_song = {}, {}, {}, {}, {}
+    for guild_id in range(guilds):
+        queue = deque()
+        for i in range(tracks):
+            video_id = random_video_id(rng)
+            queue.append({
+                'url': None,
+                'url_expires': 0,
+                'title': f"Song {guild_id}-{i} ({video_id})",
+                'duration': rng.randint(60, 600),
+                'webpage_url': f"https://www.youtube.com/watch?v={video_id}",
+                'video_id': video_id,
+                'requester': fresh_name(rng),
+            })
+        players[guild_id] = None
+        queues[guild_id] = queue
+        inactivity_tasks[guild_id] = None
+        loop[guild_id] = False
+        current_song[guild_id] = queue[0]
+    return players, queues, inactivity_tasks, loop, current_song
+
+
+def build_states(guilds, tracks, rng):
+    """The layout after: one slotted state per guild, slotted tracks"""
+    states = {}
+    for guild_id in range(guilds):
+        state = states[guild_id] = GuildPlayerState(guild_id)
+        for i in range(tracks):
+            video_id = random_video_id(rng)
+            state.queue.append(Track(
+                title=f"Song {guild_id}-{i} ({video_id})",
+                duration=rng.randint(60, 600),
+                video_id=video_id,
+                requester=fresh_name(rng),
+            ))
+        state.current = state.queue[0]
+    return states
+
+
+def measure(build, guilds, tracks):
+    gc.collect()
+    tracemalloc.start()
+    data = build(guilds, tracks, random.Random(0))
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    gc.collect()
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--guilds', type=int, default=10000)
+    parser.add_argument('--tracks', type=int, default=200)
+    args = parser.parse_args()
+
+    total = args.guilds * args.tracks
+    before = measure(build_dicts, args.guilds, args.tracks)
+    after = measure(build_states, args.guilds, args.tracks)
+    print(f"{args.guilds} guilds x {args.tracks} tracks ({total} tracks)")
+    print(f"dicts:  {before / 2**20:8.1f} MiB  {before / total:6.0f} B/track")
+    print(f"slots:  {after / 2**20:8.1f} MiB  {after / total:6.0f} B/track")
+    print(f"saved:  {(before - after) / before:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""Bursts of channel messages and interaction followups against a mock Discord REST API that enforces rate limits.
+
+The mock server applies Discord's message limits (5 per 5s per channel, 5 per 2s per interaction token,
+50 per second globally for everything but interactions) and answers over the limit with a 429, the same
+headers and JSON as Discord. The burst is sent once straight through py-cord, which only learns about the
+limits from response headers, and once through Utils.outbound's scheduler.
+
+Run from the Discordbot folder: python -m benchmarks.outbound_ratelimits --channels 50 --messages 4
+"""
+import argparse
+import asyncio
+import collections
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import aiohttp
+import discord
+from Utils.loader import print_table
+from Utils.outbound import OutboundScheduler
+
+APPLICATION_ID = 1000
+CHANNEL_MESSAGES = re.compile(r'/api/v\d+/channels/(\d+)/messages$')
+WEBHOOK_MESSAGES = re.compile(r'/api/v\d+/webhooks/(\d+)/([\w-]+)$')
+
+
+class RateLimitHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path.split('?')[0].endswith('/users/@me'):
+            self.send_json(200, {'id': str(APPLICATION_ID), 'username': 'bot', 'discriminator': '0', 'avatar': None})
+        else:
+            self.send_json(404, {'message': '404: Not Found', 'code': 0})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        path = self.path.split('?')[0]
+        if match := CHANNEL_MESSAGES.match(path):
+            channel_id, bucket, limit, is_global = match[1], f"channel:{match[1]}", self.server.channel_rate, True
+        elif match := WEBHOOK_MESSAGES.match(path):
+            channel_id, bucket, limit, is_global = match[1], f"webhook:{match[2]}", self.server.webhook_rate, False
+        else:
+            self.send_json(404, {'message': '404: Not Found', 'code': 0})
+            return
+
+        time.sleep(self.server.latency)
+        allowed, headers = self.server.hit(bucket, limit, is_global)
+        if not allowed:
+            self.send_json(429, headers.pop('body'), headers)
+            return
+
+        content = json.loads(body or b'{}').get('content') or ''
+        self.server.delivered(content)
+        self.send_json(200, self.server.message(channel_id, content), headers)
+
+    def send_json(self, status, data, headers=()):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in dict(headers).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RateLimitServer(ThreadingHTTPServer):
+    """Fixed windows per bucket, like Discord's: the window opens with its first request"""
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.05, channel_rate=(5, 5), webhook_rate=(5, 2), global_rate=(50, 1)):
+        super().__init__(('127.0.0.1', 0), RateLimitHandler)
+        self.latency = latency
+        self.channel_rate = channel_rate
+        self.webhook_rate = webhook_rate
+        self.global_rate = global_rate
+        self.lock = threading.Lock()
+        self.windows = {}  # bucket -> [opened, count]
+        self.next_id = 1
+        self.reset()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api/v{{API_VERSION}}"
+
+    def reset(self):
+        with self.lock:
+            self.windows.clear()
+            self.requests = 0
+            self.limited = collections.Counter()
+            self.lines = 0
+
+    def _window(self, key, per, now):
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= per:
+            window = self.windows[key] = [now, 0]
+        return window
+
+    def hit(self, bucket, rate, is_global=True):
+        limit, per = rate
+        global_limit, global_per = self.global_rate
+        now = time.monotonic()
+        with self.lock:
+            self.requests += 1
+            route = self._window(bucket, per, now)
+            glob = self._window('global', global_per, now)
+            if is_global and glob[1] >= global_limit:
+                self.limited['global'] += 1
+                retry_after = glob[0] + global_per - now
+                return False, {
+                    'Retry-After': str(max(1, round(retry_after))), 'Via': '1.1 google',
+                    'X-RateLimit-Global': 'true', 'X-RateLimit-Scope': 'global',
+                    'body': {'message': 'You are being rate limited.', 'retry_after': retry_after, 'global': True},
+                }
+            reset_after = route[0] + per - now
+            if route[1] >= limit:
+                self.limited['route'] += 1
+                return False, {
+                    'Retry-After': str(max(1, round(reset_after))), 'Via': '1.1 google',
+                    'X-RateLimit-Limit': str(limit), 'X-RateLimit-Remaining': '0',
+                    'X-RateLimit-Reset-After': f"{reset_after:.3f}", 'X-RateLimit-Bucket': bucket,
+                    'X-RateLimit-Scope': 'user',
+                    'body': {'message': 'You are being rate limited.', 'retry_after': reset_after, 'global': False},
+                }
+            route[1] += 1
+            glob[1] += is_global
+            return True, {
+                'X-RateLimit-Limit': str(limit), 'X-RateLimit-Remaining': str(limit - route[1]),
+                'X-RateLimit-Reset': f"{time.time() + reset_after:.3f}",
+                'X-RateLimit-Reset-After': f"{reset_after:.3f}", 'X-RateLimit-Bucket': bucket,
+            }
+
+    def delivered(self, content):
+        with self.lock:
+            self.lines += content.count('\n') + 1 if content else 0
+
+    def message(self, channel_id, content):
+        with self.lock:
+            message_id = self.next_id
+            self.next_id += 1
+        return {
+            'id': str(message_id), 'channel_id': str(channel_id), 'type': 0, 'content': content,
+            'author': {'id': str(APPLICATION_ID), 'username': 'bot', 'discriminator': '0', 'avatar': None, 'bot': True},
+            'attachments': [], 'embeds': [], 'mentions': [], 'mention_roles': [], 'pinned': False,
+            'mention_everyone': False, 'tts': False, 'timestamp': discord.utils.utcnow().isoformat(),
+            'edited_timestamp': None, 'flags': 0, 'components': [],
+        }
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+async def run(mode, args, server, client, session):
+    server.reset()
+    scheduler = OutboundScheduler() if mode == 'scheduler' else None
+    latencies = {'channel': [], 'followup': []}
+    failures = collections.Counter()
+    start = time.perf_counter()
+
+    async def send(kind, target, content):
+        try:
+            if scheduler:
+                await scheduler.send(target, content)
+            elif kind == 'followup':
+                await target.send(content, wait=True)
+            else:
+                await target.send(content)
+        except discord.HTTPException as e:
+            failures[f"{e.status}"] += 1
+            return
+        latencies[kind].append(time.perf_counter() - start)
+
+    sends = []
+    for c in range(args.channels):
+        channel = client.get_partial_messageable(10_000 + c)
+        for m in range(args.messages):
+            sends.append(send('channel', channel, f"🎉 <@{m}> reached level **{c}**!"))
+    for i in range(args.interactions):
+        webhook = discord.Webhook.partial(APPLICATION_ID, f"token-{mode}-{i}", session=session)
+        for f in range(args.followups):
+            sends.append(send('followup', webhook, f"➕ Added to queue: **song {i}.{f}**"))
+
+    await asyncio.gather(*sends)
+    wall = time.perf_counter() - start
+
+    for values in latencies.values():
+        values.sort()
+    merged = scheduler.stats()['merged'] if scheduler else 0
+    return (
+        mode, len(sends), server.lines, server.requests, server.limited['route'], server.limited['global'],
+        sum(failures.values()), merged, f"{wall:.2f}",
+        *(f"{percentile(latencies[kind], q) * 1000:.0f}" for kind in ('channel', 'followup') for q in (0.5, 0.99)),
+    )
+
+
+async def main(args):
+    server = RateLimitServer(latency=args.latency_ms / 1000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    discord.http.Route.API_BASE_URL = server.base_url
+
+    client = discord.Client()
+    await client.http.static_login('benchmark')
+    session = aiohttp.ClientSession()
+    try:
+        rows = [await run(mode, args, server, client, session) for mode in ('direct', 'scheduler')]
+    finally:
+        await session.close()
+        await client.http.close()
+        server.shutdown()
+
+    print_table(
+        "Outbound burst",
+        ("Mode", "messages", "delivered", "requests", "429 route", "429 global", "failed", "merged", "wall s",
+         "channel p50 ms", "channel p99 ms", "followup p50 ms", "followup p99 ms"),
+        rows,
+        f"{args.channels} channels x {args.messages} messages, {args.interactions} interactions x "
+        f"{args.followups} followups, {args.latency_ms:.0f}ms REST latency"
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--channels', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=4, help="Messages sent to each channel at once")
+    parser.add_argument('--interactions', type=int, default=20)
+    parser.add_argument('--followups', type=int, default=3, help="Followups sent for each interaction")
+    parser.add_argument('--latency-ms', type=float, default=50)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
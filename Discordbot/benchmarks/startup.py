@@ -0,0 +1,144 @@
+"""Cold-start time to ready: the loader in main.py against the eager startup it replaced.
+
+Every run is a fresh interpreter, so every import is paid again. The gateway is simulated: on_connect fires
+as soon as the extensions are loaded, and READY --gateway-ms later, the time Discord takes to stream the
+guilds. The bot is ready to serve once it has seen READY and its warmups are done.
+
+- lazy: the loader as main.py runs it. The YouTube client, the Gemini model and yt-dlp are created on first
+  use or in the extractor workers, and the warmups start on on_connect.
+- eager: startup as it was before. The cogs built the YouTube Data API client and the Gemini model and
+  imported yt_dlp while loading, and their set-up ran in on_ready listeners.
+
+The first-use column is what lazy mode moves to the first /play and /askbot: building the clients it skipped.
+
+Run from the Discordbot folder: python -m benchmarks.startup --runs 5 --gateway-ms 1000 --titles 200000
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def build_eager_clients():
+    """What the music and askbot cogs created at import and in __init__ before clients were deferred"""
+    from googleapiclient.discovery import build
+    youtube = build('youtube', 'v3', developerKey=os.environ['YOUTUBE_API_KEY'])
+    import google.generativeai as genai
+    genai.configure(api_key=os.environ['GEMINI_API_KEY'])
+    model = genai.GenerativeModel('gemini-2.0-flash-exp')
+    import yt_dlp  # noqa: F401, the music cog imported it for DownloadError
+    return youtube, model
+
+
+async def boot(mode, gateway_seconds, spawned):
+    import asyncio
+    import discord
+    from Utils import database
+    from Utils.intents import client_options, required_intents
+    from Utils.loader import find_extensions, load_extensions
+
+    db_dir = tempfile.TemporaryDirectory()
+    database._databases[os.path.abspath(database.DEFAULT_PATH)] = database.Database(
+        os.path.join(db_dir.name, 'users.db')
+    )
+
+    clients = build_eager_clients() if mode == 'eager' else None
+    extensions = find_extensions()
+    bot = discord.Bot(**client_options(required_intents(intents for _, intents in extensions), 'minimal'))
+    load_extensions(bot, extensions, skip_failed=True)
+    music = bot.get_cog('MusicPlayer')
+    gemini = bot.get_cog('GeminiCog')
+    if clients:
+        music.search._youtube, gemini.model = clients
+    loaded = time.time()
+
+    async def warm():
+        await asyncio.gather(*(cog.warmup() for cog in bot.cogs.values() if hasattr(cog, 'warmup')))
+
+    if mode == 'lazy':
+        warming = asyncio.create_task(warm())  # on_connect
+        await asyncio.sleep(gateway_seconds)  # READY
+        await warming
+    else:
+        await asyncio.sleep(gateway_seconds)  # READY, then the on_ready listeners
+        await warm()
+    ready = time.time()
+
+    start = time.perf_counter()
+    await asyncio.to_thread(lambda: music.search.youtube)
+    await gemini._get_model()
+    first_use = time.perf_counter() - start
+
+    music.extractor.close()
+    db_dir.cleanup()
+    return {'loaded': loaded - spawned, 'ready': ready - spawned, 'first_use': first_use}
+
+
+def run_child(mode, args):
+    env = {
+        **os.environ,
+        'YOUTUBE_API_KEY': 'benchmark',
+        'GEMINI_API_KEY': 'benchmark',
+        'AUDIO_CACHE_DIR': '',
+        'MUSIC_CACHE_DB': '',
+        'MUSIC_SESSIONS': '0',
+        'METRICS_PORT': '0',
+        'WIKI_TITLE_INDEX': args.title_file or '',
+    }
+    command = [
+        sys.executable, '-m', 'benchmarks.startup', '--child', mode,
+        '--gateway-ms', str(args.gateway_ms), '--spawned', repr(time.time()),
+    ]
+    result = subprocess.run(command, env=env, capture_output=True, text=True)
+    if result.returncode:
+        raise SystemExit(f"{mode} run failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(args):
+    if args.child:
+        import asyncio
+        result = asyncio.run(boot(args.child, args.gateway_ms / 1000, args.spawned))
+        print(json.dumps(result), flush=True)
+        return
+
+    from Utils.loader import print_table
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+        f.writelines(f"Article_{i:07d}\n" for i in range(args.titles))
+    args.title_file = f.name if args.titles else None
+    try:
+        results = {'eager': [], 'lazy': []}
+        for _ in range(args.runs):
+            # Interleaved, so a noisy moment on the machine hits both modes
+            for mode in results:
+                results[mode].append(run_child(mode, args))
+    finally:
+        os.unlink(f.name)
+
+    rows = []
+    for mode, runs in results.items():
+        rows.append((mode, *(
+            f"{statistics.median(run[field] for run in runs) * 1000:.0f}" for field in ('loaded', 'ready', 'first_use')
+        )))
+    print_table(
+        "Cold start (median)", ("Mode", "extensions loaded ms", "ready ms", "first use ms"), rows,
+        f"{args.runs} runs per mode, READY {args.gateway_ms}ms after connecting, {args.titles} titles to load"
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--gateway-ms', type=int, default=1000, help="Time from connecting to READY")
+    parser.add_argument('--titles', type=int, default=200000, help="Size of the WIKI_TITLE_INDEX dump, 0 for none")
+    parser.add_argument('--child', choices=('eager', 'lazy'), help=argparse.SUPPRESS)
+    parser.add_argument('--spawned', type=float, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,282 @@
+"""Local stand-ins for the YouTube Data API, yt-dlp's YouTube pages, Wikipedia and Gemini, on one stdlib HTTP server.
+
+Answers are derived from the request (a hash of the query), so the same query always gets the same video,
+article or answer and the bot's caches behave as they would against the real services.
+"""
+import collections
+import hashlib
+import json
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from Utils import extractor_pool
+from Utils.extractor_pool import ExtractionFailed, ExtractorPool
+from Utils.ffmpeg_supervisor import FFmpegSupervisor, SupervisedSource
+
+VIDEO_ID_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_"
+
+
+def video_id_for(text):
+    digest = hashlib.sha1(text.encode()).digest()
+    return "".join(VIDEO_ID_CHARS[byte % 64] for byte in digest[:11])
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real APIs, so pooled clients reuse connections
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        params = {key: values[0] for key, values in urllib.parse.parse_qs(url.query).items()}
+        route = self.server.routes.get(url.path)
+        if route is None:
+            self.send_error(404)
+            return
+        self.server.requests[url.path] += 1
+        if url.path != '/gemini':
+            time.sleep(self.server.latency)
+        route(self, params)
+
+    def send_json(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def youtube_search(self, params):
+        self.send_json({'items': [{'id': {'videoId': video_id_for(params.get('q', ''))}}]})
+
+    def youtube_video(self, params):
+        video_id = params['v']
+        if video_id.startswith('x'):
+            # A share of videos is unavailable, so the error path is part of the mix
+            self.send_json({'error': 'Video unavailable. This video is private.'})
+            return
+        base = self.server.base_url
+        self.send_json({
+            'id': video_id,
+            'title': f"Stub song {video_id}",
+            'duration': 120 + sum(map(ord, video_id)) % 240,
+            'webpage_url': f"https://www.youtube.com/watch?v={video_id}",
+            'formats': [
+                {'url': f"{base}/audio/{video_id}.webm?expire={int(time.time()) + 21600}",
+                 'acodec': 'opus', 'vcodec': 'none', 'abr': 160},
+                {'url': f"{base}/audio/{video_id}.m4a", 'acodec': 'mp4a.40.2', 'vcodec': 'none', 'abr': 128},
+            ],
+        })
+
+    def youtube_playlist(self, params):
+        start, end = (int(part) for part in params.get('items', '1-100').split('-'))
+        size = 40 + sum(map(ord, params.get('list', ''))) % 160
+        self.send_json({
+            'title': f"Stub playlist {params.get('list')}",
+            'entries': [
+                {'id': video_id_for(f"{params.get('list')}-{i}"), 'title': f"Playlist song {i}", 'duration': 200}
+                for i in range(start, min(end, size) + 1)
+            ],
+        })
+
+    def wikipedia(self, params):
+        if 'titles' in params:
+            self.send_json({'query': {'pages': [{
+                'title': params['titles'],
+                'links': [{'ns': 0, 'title': f"{params['titles']} ({i})"} for i in range(1, 31)],
+            }]}})
+            return
+        query = params.get('gsrsearch', '')
+        digest = int(hashlib.sha1(query.encode()).hexdigest(), 16)
+        if digest % 20 == 0:
+            self.send_json({'batchcomplete': True})  # no results
+        elif digest % 10 == 1:
+            self.send_json({'query': {'pages': [{'title': query.title(), 'pageprops': {'disambiguation': ''}}]}})
+        else:
+            self.send_json({'query': {'pages': [{
+                'title': query.title(),
+                'extract': f"{query.title()} is a stub article. " * 60,
+                'fullurl': f"https://en.wikipedia.org/wiki/{urllib.parse.quote(query.title())}",
+            }]}})
+
+    def gemini(self, params):
+        # One JSON line per streamed chunk, like the chunks of a generate_content stream
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        time.sleep(self.server.latency)
+        words = f"Here is a stub answer to '{params.get('q', '')}'. ".split() * self.server.answer_words
+        for i in range(0, len(words), 20):
+            self.wfile.write(json.dumps({'text': " ".join(words[i:i + 20]) + " "}).encode() + b"\n")
+            self.wfile.flush()
+            time.sleep(self.server.chunk_delay)
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.05, chunk_delay=0.05, answer_words=8):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.answer_words = answer_words
+        self.base_url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.requests = collections.Counter()
+        self.routes = {
+            '/youtube/v3/search': StubHandler.youtube_search,
+            '/watch': StubHandler.youtube_video,
+            '/playlist': StubHandler.youtube_playlist,
+            '/w/api.php': StubHandler.wikipedia,
+            '/gemini': StubHandler.gemini,
+        }
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="stub-server", daemon=True).start()
+        return self
+
+
+class StubYoutubeDL:
+    """The two YoutubeDL methods the extractor workers call, answered by the stub server"""
+
+    def __init__(self, base_url, params=None):
+        self.base_url = base_url
+        self.params = dict(params or {})
+
+    def extract_info(self, url, download=False):
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(url).query)
+        if 'list' in query:
+            path = f"/playlist?list={query['list'][0]}&items={self.params.get('playlist_items', '1-100')}"
+        else:
+            path = f"/watch?v={query['v'][0]}"
+        with urllib.request.urlopen(self.base_url + path) as response:
+            info = json.load(response)
+        if 'error' in info:
+            raise ExtractionFailed(info['error'])
+        return info
+
+    def sanitize_info(self, info):
+        return info
+
+
+def _init_stub_worker(base_url):
+    extractor_pool._worker.download_error = ExtractionFailed
+    extractor_pool._worker.ydl = StubYoutubeDL(base_url)
+    extractor_pool._worker.flat_ydl = StubYoutubeDL(base_url)
+
+
+class StubExtractorPool(ExtractorPool):
+    """The real pool (backpressure, per-guild fairness, timeouts) with workers that talk to the stub server"""
+
+    def __init__(self, base_url, options, **kwargs):
+        self.base_url = base_url
+        super().__init__(options, processes=False, **kwargs)
+
+    def _create_executor(self):
+        return ThreadPoolExecutor(
+            max_workers=self.size,
+            thread_name_prefix="yt-dlp",
+            initializer=_init_stub_worker,
+            initargs=(self.base_url,)
+        )
+
+
+class SilentAudio:
+    """Stands in for the FFmpeg process: nothing to read, nothing to clean up"""
+
+    def read(self):
+        return b''
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        pass
+
+
+class StubSource(SupervisedSource):
+    def _spawn(self, seek):
+        self.supervisor.started += 1
+        return SilentAudio()
+
+
+class StubFFmpegSupervisor(FFmpegSupervisor):
+    """The real slot accounting without starting FFmpeg"""
+
+    source_class = StubSource
+
+
+class StubChunk:
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+
+class StubContent:
+    """One history entry, shaped like genai's Content"""
+
+    __slots__ = ('role', 'parts')
+
+    def __init__(self, role, text):
+        self.role = role
+        self.parts = [StubChunk(text)]
+
+
+class StubResponse:
+    """Async iterator over the chunks of one streamed answer"""
+
+    prompt_feedback = None
+
+    def __init__(self, model, question, chat=None):
+        self.model = model
+        self.question = question
+        self.chat = chat
+
+    async def __aiter__(self):
+        text = []
+        async with self.model.session().get(f"{self.model.base_url}/gemini", params={'q': self.question[:200]}) as response:
+            async for line in response.content:
+                chunk = json.loads(line)['text']
+                text.append(chunk)
+                yield StubChunk(chunk)
+        if self.chat is not None:
+            self.chat.history += [StubContent('user', self.question), StubContent('model', "".join(text))]
+
+
+class StubChat:
+    def __init__(self, model, history):
+        self.model = model
+        self.history = history
+
+    async def send_message_async(self, question, stream=True):
+        return StubResponse(self.model, question, self)
+
+
+class StubModel:
+    """The parts of genai.GenerativeModel the askbot cog uses, streaming from the stub server over aiohttp"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self._session = None
+
+    def session(self):
+        if self._session is None:
+            import aiohttp
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=64))
+        return self._session
+
+    async def generate_content_async(self, question, stream=True):
+        return StubResponse(self, question)
+
+    def start_chat(self, history=None):
+        return StubChat(self, list(history or []))
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
@@ -0,0 +1,108 @@
+"""XP awards per second for a synthetic message stream: one sqlite write per message vs XPStore batching.
+
+The batched run paces the stream at --rate messages per second, so the store's flush task writes behind
+every --flush-interval the way it would in production. Its capacity is messages over the event loop time
+spent awarding them.
+
+Run from the Discordbot folder: python -m benchmarks.xp_throughput --messages 200000 --rate 20000 --guilds 500
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from Utils.database import Database
+from Utils.xp_store import UPSERT_SQL, XPStore
+
+
+def message_stream(count, guilds, users_per_guild, rng):
+    for _ in range(count):
+        yield rng.randrange(guilds), rng.randrange(users_per_guild), rng.randint(15, 25)
+
+
+async def per_message(db, messages):
+    """Every message does its own upsert and commit on the database thread"""
+    for guild_id, user_id, xp in messages:
+        await db.execute(UPSERT_SQL, (guild_id, user_id, xp, 1))
+
+
+async def batched(db, messages, flush_interval, rate):
+    store = XPStore(db, flush_interval=flush_interval)
+    await store.load()
+    tick = 0.01
+    per_tick = max(1, round(rate * tick))
+    busy = 0.0
+    deadline = time.perf_counter()
+    for i in range(0, len(messages), per_tick):
+        start = time.perf_counter()
+        for guild_id, user_id, xp in messages[i:i + per_tick]:
+            await store.award(guild_id, user_id, xp)
+        busy += time.perf_counter() - start
+        # Sleeping hands the loop to the flush task, as the gaps between gateway events would
+        deadline += tick
+        await asyncio.sleep(max(0, deadline - time.perf_counter()))
+    stats = store.stats()
+    await store.shutdown()
+    return stats, busy
+
+
+async def run(mode, args):
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(os.path.join(directory, 'bench.db'))
+        await db.execute("""
+            CREATE TABLE levels (
+                guild_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                xp INTEGER NOT NULL DEFAULT 0,
+                messages INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (guild_id, user_id)
+            )
+        """)
+        messages = list(message_stream(args.messages, args.guilds, args.users, random.Random(0)))
+
+        start = time.perf_counter()
+        stats = None
+        if mode == 'per-message':
+            await per_message(db, messages)
+            busy = time.perf_counter() - start
+        else:
+            stats, busy = await batched(db, messages, args.flush_interval, args.rate)
+        elapsed = time.perf_counter() - start
+
+        total, = await db.fetchone('SELECT SUM(messages) FROM levels')
+        db.close()
+
+    result = {
+        'mode': mode,
+        'messages': len(messages),
+        'elapsed_s': round(elapsed, 2),
+        'messages_per_s': round(len(messages) / elapsed),
+        'capacity_per_s': round(len(messages) / busy),
+        'rows_checked': total == len(messages),
+    }
+    if stats:
+        # Counted before shutdown's last flush, so these are the periodic write-behind flushes alone
+        assert stats['flushes'] > 0, "the flush task never ran, the stream did not yield to it"
+        result.update(flushes=stats['flushes'], rows_written=stats['rows_written'])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--guilds', type=int, default=500)
+    parser.add_argument('--users', type=int, default=200, help="Users per guild")
+    parser.add_argument('--rate', type=int, default=20000, help="Messages per second in batched mode")
+    parser.add_argument('--flush-interval', type=float, default=0.5)
+    parser.add_argument('--per-message-limit', type=int, default=20000,
+                        help="Messages replayed in per-message mode, which is much slower")
+    args = parser.parse_args()
+
+    print(asyncio.run(run('batched', args)))
+    args.messages = min(args.messages, args.per_message_limit)
+    print(asyncio.run(run('per-message', args)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Event loop lag while N /play searches are in flight against a local stub server.
+
+Run from the Discordbot folder: python -m benchmarks.youtube_search_lag --searches 50
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from Utils.youtube_search import YouTubeSearch
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0.2
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query).get('q', [''])[0]
+        body = json.dumps({'items': [{'id': {'videoId': (query * 11)[:11]}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubSearch(YouTubeSearch):
+    def __init__(self, base_url, **kwargs):
+        super().__init__(youtube=None, **kwargs)
+        self.base_url = base_url
+
+    def _search_blocking(self, query):
+        url = f"{self.base_url}/youtube/v3/search?{urllib.parse.urlencode({'q': query})}"
+        with urllib.request.urlopen(url) as response:
+            items = json.load(response).get('items')
+        return items[0]['id']['videoId'] if items else None
+
+
+async def sample_lag(samples, stop, interval=0.01):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append((loop.time() - start - interval) * 1000)
+
+
+async def run(mode, searcher, count):
+    samples = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_lag(samples, stop))
+    await asyncio.sleep(0.05)
+
+    start = time.perf_counter()
+    if mode == 'blocking':
+        # What /play used to do: the HTTP round trip runs on the loop itself
+        for i in range(count):
+            searcher._search_blocking(f"song {i}")
+            await asyncio.sleep(0)
+    else:
+        await asyncio.gather(*(searcher.search(f"song {i}") for i in range(count)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await sampler
+    samples.sort()
+    return {
+        'mode': mode,
+        'elapsed_s': round(elapsed, 2),
+        'lag_p50_ms': round(statistics.median(samples), 2),
+        'lag_p99_ms': round(samples[int(len(samples) * 0.99) - 1], 2),
+        'lag_max_ms': round(samples[-1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--searches', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--delay', type=float, default=0.2, help="Stub server response time in seconds")
+    args = parser.parse_args()
+
+    StubHandler.delay = args.delay
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    async def bench():
+        searcher = StubSearch(base_url, max_concurrency=args.concurrency, timeout=30)
+        try:
+            for mode in ('blocking', 'async'):
+                print(await run(mode, searcher, args.searches))
+        finally:
+            searcher.close()
+
+    asyncio.run(bench())
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,39 @@
-import discord 
-import os 
-from dotenv import load_dotenv
-
-load_dotenv() 
-bot = discord.Bot(help_command=None)
-
-intents = discord.Intents.all()
-intents=intents
-
-
-for fn in os.listdir("./Events"):
-    if fn.endswith(".py"):
-        bot.load_extension(f"Events.{fn[:-3]}")
-
-for fn in os.listdir("./General"): 
-    if fn.endswith(".py"):
-        bot.load_extension(f"General.{fn[: -3]}")
-
-
-bot.run(os.getenv('TOKEN')) 
\ No newline at end of file
+from Utils.loader import find_extensions, install_shutdown, install_warmup, load_extensions, print_load_timings
+from Utils.intents import client_options, describe, required_intents
+from Utils.cluster import identify_hook, recommended_shard_count, run_clusters
+import discord 
+import os 
+from dotenv import load_dotenv
+
+load_dotenv() 
+
+
+def run_bot(cluster_id=None, shard_ids=None, shard_count=None, identify_lock=None):
+    """Runs one bot process, all shards when shard_ids is None, otherwise just that range of them"""
+    extensions = find_extensions()
+
+    # INTENTS_PROFILE (minimal, default, all) plus whatever the loaded cogs declare in REQUIRED_INTENTS
+    options = client_options(required_intents(intents for _, intents in extensions))
+    print(describe(options))
+    bot = discord.AutoShardedBot(help_command=None, shard_ids=shard_ids, shard_count=shard_count, **options)
+    bot.cluster_id = cluster_id  # offsets per-process ports such as the metrics endpoint's
+    if identify_lock is not None:
+        bot.before_identify_hook = identify_hook(identify_lock)
+
+    print_load_timings(load_extensions(bot, extensions))
+    install_warmup(bot)
+    install_shutdown(bot)
+
+    bot.run(os.getenv('TOKEN')) 
+
+
+# Guarded so extractor worker and cluster processes can import this module without starting another bot
+if __name__ == "__main__":
+    # SHARD_COUNT defaults to Discord's recommendation, CLUSTERS spreads the shards over that many processes
+    shard_count = int(os.getenv('SHARD_COUNT', 0)) or None
+    clusters = int(os.getenv('CLUSTERS', 1))
+
+    if clusters > 1:
+        run_clusters(run_bot, shard_count or recommended_shard_count(os.getenv('TOKEN')), clusters)
+    else:
+        run_bot(shard_count=shard_count)